@@ -1,5 +1,10 @@
 from rdfframes.client.sparql_endpoint_client import SPARQLEndpointClient
 from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.async_http_client import AsyncHttpClient
+from rdfframes.client.replica_http_client import ReplicaHttpClient
+from rdfframes.client.rdflib_client import RDFLibClient
+from rdfframes.client.file_sinks import FileFormat
+from rdfframes.client.result_cache import ResultCache
 from rdfframes.knowledge_graph import KnowledgeGraph
 from rdfframes.dataset.dataset import Dataset
 from rdfframes.dataset.expandable_dataset import ExpandableDataset
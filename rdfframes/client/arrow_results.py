@@ -0,0 +1,259 @@
+"""
+Reading of query results into Apache Arrow tables. Every page is parsed by the multithreaded Arrow CSV or JSON reader
+instead of pandas, and the pages are concatenated into one table whose uri columns are dictionary encoded. Requires
+the pyarrow package
+"""
+
+import json
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.csv
+    import pyarrow.json
+except ImportError:
+    pa = None
+
+from rdfframes.client.result_parsers import URI, BNODE, _RDF_LANG_STRING, _INTEGER_TYPES, _FLOAT_TYPES, \
+    _BOOLEAN_TYPE, _DATETIME_TYPES
+
+URI_PATTERN = r'^(?:http|ftp)s?://\S+$'
+# the key of the schema metadata keeping the common datatype and language tag of the columns
+METADATA_KEY = b'rdfframes'
+
+
+def require_pyarrow():
+    """
+    raises an exception if pyarrow is not installed
+    :return: None
+    """
+    if pa is None:
+        raise Exception("Arrow results require the pyarrow package. Install it with: pip install pyarrow")
+
+
+def read_csv_page(chunks):
+    """
+    parses one page of CSV results with the Arrow CSV reader
+    :param chunks: the text chunks of the page
+    :return: pyarrow Table or None if the page is empty
+    """
+    data = _page_bytes(chunks)
+    if len(data.strip()) == 0:
+        return None
+    return pa.csv.read_csv(pa.py_buffer(data))
+
+
+def read_json_page(chunks):
+    """
+    parses one page of SPARQL JSON results with the Arrow JSON reader. The values of each variable are typed after
+    their xsd datatype when all the values of the page have the same one, like SparqlJsonParser does
+    :param chunks: the text chunks of the page
+    :return: pyarrow Table or None if the page is empty
+    """
+    data = _page_bytes(chunks)
+    if len(data.strip()) == 0:
+        return None
+    # the result is a single json object, read as a table of one row
+    document = pa.json.read_json(pa.py_buffer(data), read_options=pa.json.ReadOptions(block_size=len(data) + 1),
+                                 parse_options=pa.json.ParseOptions(newlines_in_values=True))
+    names = document.column_names
+    columns = []
+    if 'head' in names and 'vars' in [f.name for f in document.schema.field('head').type]:
+        columns = pa.compute.struct_field(document.column('head'), 'vars').to_pylist()[0] or []
+    bindings = None
+    if 'results' in names:
+        results = document.column('results').combine_chunks()
+        if 'bindings' in [f.name for f in results.type]:
+            bindings = pa.compute.list_flatten(pa.compute.struct_field(results, 'bindings'))
+    if bindings is None or not pa.types.is_struct(bindings.type):
+        return _with_terms(pa.table({column: pa.array([], pa.string()) for column in columns}), {}, {})
+
+    variables = [field.name for field in bindings.type]
+    columns = columns + [variable for variable in variables if variable not in columns]
+    arrays, datatypes, languages = [], {}, {}
+    for column in columns:
+        if column not in variables:
+            arrays.append(pa.nulls(len(bindings), pa.string()))
+            continue
+        array, datatype, language = _typed_terms(pa.compute.struct_field(bindings, column))
+        arrays.append(array)
+        if datatype is not None:
+            datatypes[column] = datatype
+        if language is not None:
+            languages[column] = language
+    return _with_terms(pa.table(arrays, names=columns), datatypes, languages)
+
+
+def concat_pages(tables):
+    """
+    concatenates the pages of a result and dictionary encodes its uri columns. A column typed differently by two
+    pages is promoted to a common type, or to strings if there is none. The datatypes and the language tags are kept
+    for the columns all the pages agree on
+    :param tables: list of pyarrow Tables in offset order
+    :return: pyarrow Table
+    """
+    tables = [table for table in tables if table is not None]
+    if len(tables) == 0:
+        return pa.table({})
+    datatypes, languages = terms_of(tables[0])
+    for table in tables[1:]:
+        other_datatypes, other_languages = terms_of(table)
+        datatypes = {c: d for c, d in datatypes.items() if other_datatypes.get(c) == d}
+        languages = {c: l for c, l in languages.items() if other_languages.get(c) == l}
+    if len(tables) > 1:
+        tables = unify_types(tables)
+        table = pa.concat_tables([t.replace_schema_metadata(None) for t in tables], promote_options='permissive')
+    else:
+        table = tables[0]
+    return _with_terms(encode_uris(table, datatypes), datatypes, languages)
+
+
+def encode_uris(table, datatypes=None):
+    """
+    dictionary encodes the string columns of uris. All the chunks of a column share one dictionary
+    :param table: pyarrow Table
+    :param datatypes: the common datatypes of the columns. Columns whose datatype is known are encoded if they are
+        uris, the others if all their values look like uris
+    :return: pyarrow Table
+    """
+    datatypes = datatypes if datatypes is not None else {}
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            datatype = datatypes.get(name)
+            if datatype == URI or (datatype is None and column.null_count < len(column) and
+                                   pa.compute.all(pa.compute.match_substring_regex(column, URI_PATTERN)).as_py()):
+                column = pa.compute.dictionary_encode(column)
+        columns.append(column)
+    return pa.table(columns, names=table.column_names, metadata=table.schema.metadata).unify_dictionaries()
+
+
+def from_pandas(df):
+    """
+    converts a result dataframe to a pyarrow Table with dictionary encoded uri columns
+    :param df: pandas dataframe
+    :return: pyarrow Table
+    """
+    datatypes, languages = df.attrs.get('datatypes', {}), df.attrs.get('languages', {})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return _with_terms(encode_uris(table.replace_schema_metadata(None), datatypes), datatypes, languages)
+
+
+def to_pandas(table, arrow_dtypes=False):
+    """
+    converts a result table to a pandas dataframe without copying the data where possible. Dictionary encoded
+    columns become categorical columns sharing the dictionary's values
+    :param table: pyarrow Table
+    :param arrow_dtypes: if True, every column is backed by its Arrow array (pandas.ArrowDtype), which never copies.
+        Otherwise numeric columns without missing values are zero-copy views and the other columns are converted to
+        numpy
+    :return: pandas dataframe with the datatypes and language tags of the columns in its attrs
+    """
+    if arrow_dtypes:
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        df = table.to_pandas(split_blocks=True)
+    df.attrs['datatypes'], df.attrs['languages'] = terms_of(table)
+    return df
+
+
+def terms_of(table):
+    """
+    :return: (the common datatype of each column, the common language tag of each column) of a result table
+    """
+    metadata = table.schema.metadata or {}
+    terms = json.loads(metadata[METADATA_KEY].decode('utf-8')) if METADATA_KEY in metadata else {}
+    return terms.get('datatypes', {}), terms.get('languages', {})
+
+
+def _with_terms(table, datatypes, languages):
+    terms = json.dumps({'datatypes': datatypes, 'languages': languages}).encode('utf-8')
+    return table.replace_schema_metadata({METADATA_KEY: terms})
+
+
+def _page_bytes(chunks):
+    return ''.join(chunks).encode('utf-8')
+
+
+def _typed_terms(terms):
+    """
+    :param terms: struct array of the json terms of a variable
+    :return: (the values of the terms, their common datatype or None, their common language tag or None)
+    """
+    fields = [field.name for field in terms.type]
+
+    def field(name):
+        return pa.compute.struct_field(terms, name) if name in fields else pa.nulls(len(terms), pa.string())
+    values, term_types, datatypes, languages = field('value'), field('type'), field('datatype'), field('xml:lang')
+    datatypes = pa.compute.if_else(pa.compute.equal(term_types, 'uri'), URI,
+                                   pa.compute.if_else(pa.compute.equal(term_types, 'bnode'), BNODE,
+                                                      pa.compute.if_else(languages.is_valid(), _RDF_LANG_STRING,
+                                                                         datatypes)))
+    datatype = _common(datatypes)
+    language = _common(languages)
+    if datatype is None or datatypes.null_count != values.null_count:
+        # the plain literals have no datatype, the column is typed only if all its values have the same one
+        return values, datatype, language
+    return _convert(values, datatype), datatype, language
+
+
+def _common(array):
+    """
+    :return: the single distinct non null value of an array or None
+    """
+    distinct = pa.compute.unique(array.drop_null())
+    return distinct[0].as_py() if len(distinct) == 1 else None
+
+
+def _convert(values, datatype):
+    """
+    converts the lexical values of literals of one datatype, keeping the strings if one of them is invalid
+    """
+    if datatype == _BOOLEAN_TYPE:
+        booleans = pa.compute.is_in(pa.compute.utf8_trim_whitespace(values), value_set=pa.array(['true', '1']))
+        return pa.compute.if_else(values.is_valid(), booleans, pa.scalar(None, pa.bool_()))
+    if datatype in _INTEGER_TYPES:
+        targets = [pa.int64(), pa.float64()]
+    elif datatype in _FLOAT_TYPES:
+        targets = [pa.float64()]
+    elif datatype in _DATETIME_TYPES:
+        targets = [pa.timestamp('us'), pa.timestamp('us', tz='UTC')]
+    else:
+        return values
+    for target in targets:
+        try:
+            return pa.compute.cast(values, target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return values
+
+
+def unify_types(tables):
+    """
+    casts the columns that two pages typed incompatibly, e.g. numbers in one page and strings in the other, to strings
+    :return: list of pyarrow Tables
+    """
+    names = []
+    for table in tables:
+        names.extend(name for name in table.column_names if name not in names)
+    conflicts = []
+    for name in names:
+        types = {table.schema.field(name).type for table in tables if name in table.column_names}
+        types = {t for t in types if not pa.types.is_null(t)}
+        if len(types) > 1 and not all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            conflicts.append(name)
+    if len(conflicts) == 0:
+        return tables
+    unified = []
+    for table in tables:
+        for name in conflicts:
+            if name in table.column_names:
+                i = table.column_names.index(name)
+                column = table.column(i)
+                if pa.types.is_dictionary(column.type):
+                    column = column.cast(column.type.value_type)
+                table = table.set_column(i, name, column.cast(pa.string()))
+        unified.append(table)
+    return unified
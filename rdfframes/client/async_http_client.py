@@ -0,0 +1,258 @@
+"""
+asyncio http client that executes sparql queries without blocking a thread for the whole paging loop. Many queries can
+be kept in flight on one event loop, the number of concurrent http requests is capped by a semaphore.
+Requires the aiohttp package
+"""
+
+import asyncio
+import functools
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from rdfframes.client.compression import ACCEPT_ENCODING, IDENTITY_ENCODING, ChunkDecoder, charset_of
+from rdfframes.client.file_sinks import sink_for
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.result_parsers import concat_batches
+from rdfframes.client.retry_policy import RetryPolicy, CircuitBreaker, TransientError
+from rdfframes.utils.constants import _TIMEOUT, _MAX_ROWS, _POOL_SIZE, _HEALTH_CHECK_TTL, _MAX_CONCURRENCY, \
+    _CHUNK_SIZE, _MAX_RETRIES
+
+# failures of a request that may succeed if it is sent again
+if aiohttp is not None:
+    TRANSIENT_ERRORS = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+else:
+    TRANSIENT_ERRORS = (asyncio.TimeoutError,)
+
+
+class AsyncHttpClient(HttpClient):
+    """
+    Submits SPARQL queries via asynchronous http requests. execute_query is a coroutine:
+        df = await client.execute_query(query, return_format=HttpClientDataFormat.PANDAS_DF)
+    """
+    def __init__(self,
+                 endpoint_url,
+                 port=8890,
+                 return_format=HttpClientDataFormat.DEFAULT,
+                 timeout=120,
+                 default_graph_uri='',
+                 max_rows=_MAX_ROWS,
+                 pool_size=_POOL_SIZE,
+                 health_check_ttl=_HEALTH_CHECK_TTL,
+                 compression=True,
+                 max_concurrency=_MAX_CONCURRENCY,
+                 max_retries=_MAX_RETRIES):
+        """
+        Initializes a client object with the URI of the RDF engine SPARQL endpoint and the port number
+        :param endpoint_url: the url of the RDF engine or SPARQL endpoint
+        :param port: the endpoint's port number
+        :param timeout: the http request timeout in seconds
+        :param default_graph_uri: the absolute url of the default graph
+        :param max_rows: the maximum number of rows retrieved in a single http request
+        :param return_format: the query results format
+        :param pool_size: the maximum number of keep-alive connections kept open to the endpoint
+        :param health_check_ttl: number of seconds the result of is_alive() is cached
+        :param compression: if True, ask the endpoint for gzip/deflate compressed responses
+        :param max_concurrency: the maximum number of http requests in flight at the same time
+        :param max_retries: the number of times a page failing with a transient error is fetched again
+        """
+        if aiohttp is None:
+            raise Exception("AsyncHttpClient requires the aiohttp package. Install it with: pip install aiohttp")
+        super(AsyncHttpClient, self).__init__(endpoint_url, port=port, return_format=return_format, timeout=timeout,
+                                              default_graph_uri=default_graph_uri, max_rows=max_rows,
+                                              pool_size=pool_size, health_check_ttl=health_check_ttl,
+                                              compression=compression, max_retries=max_retries)
+        self.max_concurrency = None
+        self.set_max_concurrency(max_concurrency)
+        self.__session = None
+        self.__semaphore = None
+        self.__loop = None
+
+    def set_max_concurrency(self, max_concurrency=_MAX_CONCURRENCY):
+        """
+        setter for the maximum number of http requests in flight. Takes effect on the next event loop
+        :param max_concurrency: number of concurrent requests
+        :return: None
+        """
+        if max_concurrency >= 1:
+            self.max_concurrency = max_concurrency
+
+    async def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None,
+                            file_format=None):
+        """
+        submits the provided SPARQL query to the registered endpoint to be executed, fetching its pages one after
+        another without blocking the event loop
+        :param query: the SPARQL query as string
+        :param return_format: the format of the retrieved data. Options from HttpClientDataFormat. JSON and TSV
+            results are parsed as they are received into typed pandas dataframes
+        :param output_file: if provided, the data will be saved to the pass file path
+        :param file_format: the format of output_file, one of FileFormat. If None, it is chosen by the file extension
+        :return: the result of the query in the requested format. Failed pages are retried and results are cached
+            as in HttpClient
+        """
+        return_format = return_format if return_format is not None else self.return_format
+        typed = HttpClientDataFormat.result_parser(return_format) is not None
+        if return_format != HttpClientDataFormat.PANDAS_DF and output_file is None and not typed:
+            raise Exception("return format {} is unimplemented".format(return_format))
+        cache_key, df = await self.__blocking(self._cached_result, query, *self._cache_parts(return_format))
+        if df is not None:
+            if output_file is None:
+                return df
+            return await self.__blocking(HttpClient._write_cached, df, output_file, file_format)
+        retries = self._start_query()
+
+        sink = await self.__blocking(sink_for, output_file, file_format) if output_file is not None else None
+        try:
+            frames = await self.__fetch_pages(query, return_format, typed, sink, retries)
+        except BaseException:
+            if sink is not None:
+                await self.__blocking(sink.abort)
+            raise
+
+        if sink is not None:
+            return await self.__blocking(sink.commit)
+        df = concat_batches(frames) if typed else HttpClient._pages_to_dataframe(frames)
+        await self.__blocking(self._cache_result, cache_key, query, df)
+        return HttpClient._report_retries(df, retries)
+
+    @staticmethod
+    async def __blocking(function, *args):
+        """
+        runs a function doing file i/o, e.g. reading or writing the result cache or an output file, in the default
+        executor so it doesn't block the event loop
+        :return: the result of the function
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args))
+
+    async def __fetch_pages(self, query, return_format, typed, sink, retries):
+        """
+        fetches the pages of the query one after another, writing them to the sink if there is one
+        :param retries: the list the pages of the query fetched more than once are recorded in
+        :return: list of the pages as pandas dataframes if there is no sink
+        """
+        sizer = self._page_sizer(query)
+        offset, remaining = self._query_range(query)
+        loop = asyncio.get_event_loop()
+        frames = []
+        columns = None
+        while remaining is None or remaining > 0:
+            size = sizer.next_size(remaining)
+            started = loop.time()
+            page, parser, size = await self.__fetch_with_retries(query, offset, return_format, size, sizer, typed,
+                                                                 retries)
+            if typed:
+                rows = parser.rows
+                pages = page
+            elif sink is not None and sink.accepts_text:
+                rows = await self.__blocking(sink.write_chunks, [page])
+                pages = []
+            else:
+                df = HttpClient._parse_page(page, columns) if page.strip() else None
+                rows = 0 if df is None else len(df)
+                if rows > 0:
+                    columns = list(df.columns)
+                pages = [df]
+            self._record_page(sizer, size, rows, loop.time() - started)
+            if rows == 0:
+                break
+            for df in pages:
+                if sink is not None:
+                    await self.__blocking(sink.write_frame, df)
+                else:
+                    frames.append(df)
+            offset += rows
+            if remaining is not None:
+                remaining -= rows
+        return frames
+
+    async def __fetch_with_retries(self, query, offset, return_format, size, sizer, typed, retries=None):
+        """
+        fetches a page, fetching it again after a jittered exponential backoff if it fails with a transient error.
+        The page size is reduced after a timeout or a server error
+        :return: (the response text or the parsed dataframes, the result parser or None, the size actually requested)
+        """
+        requested = [size]
+
+        async def attempt():
+            size = requested[0]
+            parser = HttpClientDataFormat.result_parser(return_format, batch_rows=size) if typed else None
+            try:
+                status, reason, headers, page = await self.__fetch_page(query, offset, return_format, size, parser)
+            except TRANSIENT_ERRORS as e:
+                raise TransientError(e, overloaded=isinstance(e, asyncio.TimeoutError))
+            if status == 200:
+                return page, parser, size
+            error = Exception("HTTP {} {}".format(status, reason))
+            if not RetryPolicy.is_retryable_status(status):
+                raise Exception("the page at offset {} failed with {}".format(offset, error))
+            raise TransientError(error, overloaded=status >= 500, retry_after=RetryPolicy.retry_after(headers))
+
+        def shrink(error):
+            if error.overloaded and sizer.shrink():
+                self.stats.add('pages_shrunk')
+                requested[0] = min(requested[0], sizer.next_size())
+
+        return await self.retry_policy.call_async(attempt, CircuitBreaker.for_endpoint(self.full_endpoint_url),
+                                                  offset, retries, self.stats, shrink)
+
+    async def close(self):
+        """
+        closes the connections of the client's session
+        :return: None
+        """
+        if self.__session is not None:
+            await self.__session.close()
+        self.__session = None
+        self.__semaphore = None
+        self.__loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def __fetch_page(self, query, offset, return_format, max_rows, parser=None):
+        """
+        sends the query of a single page to the endpoint, waiting for a free slot if max_concurrency requests are
+        already in flight
+        :param parser: if provided, the response is fed to this result parser as it is received
+        :return: (http status, reason, response headers, response text) or (http status, reason, response headers,
+            list of parsed dataframes) if a parser is given
+        """
+        params = self._page_params(query, offset, max_rows)
+        params['format'] = HttpClientDataFormat.return_format(return_format)
+        headers = {'Accept-Encoding': ACCEPT_ENCODING if self.compression else IDENTITY_ENCODING}
+        session, semaphore = self.__loop_resources()
+        async with semaphore:
+            async with session.post(self.full_endpoint_url, data=params, headers=headers) as response:
+                self.stats.add('pages')
+                decoder = ChunkDecoder(response.headers.get('Content-Encoding'),
+                                       charset_of(response.headers.get('Content-Type')), stats=self.stats)
+                if parser is not None and response.status == 200:
+                    frames = []
+                    async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                        frames.extend(parser.feed(decoder.decode(chunk)))
+                    frames.extend(parser.feed(decoder.flush()))
+                    frames.extend(parser.close())
+                    return response.status, response.reason, response.headers, frames
+                body = await response.read()
+                return response.status, response.reason, response.headers, decoder.decode(body) + decoder.flush()
+
+    def __loop_resources(self):
+        """
+        the aiohttp session and the semaphore belong to the running event loop, they are created on first use and
+        recreated if the client is used from another loop
+        :return: (aiohttp.ClientSession, asyncio.Semaphore)
+        """
+        loop = asyncio.get_event_loop()
+        if self.__loop is not loop or self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=max(self.pool_size, self.max_concurrency))
+            # bodies are decompressed by the client to count the bytes received on the wire
+            self.__session = aiohttp.ClientSession(connector=connector, auto_decompress=False,
+                                                   timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.__loop = loop
+        return self.__session, self.__semaphore
@@ -1,3 +1,7 @@
+from rdfframes.client import arrow_results
+from rdfframes.client.client_stats import ClientStats
+from rdfframes.client.result_cache import ResultCache
+from rdfframes.client.vocabulary import Vocabulary
 from rdfframes.utils.constants import _TIMEOUT, ReturnFormat, _MAX_ROWS
 from rdfframes.utils.helper_functions import is_uri
 
@@ -12,12 +16,15 @@ class Client:
     def __init__(self, endpoint):
         """
         Constructs an instance of the client class
-        :param endpoint: string of the SPARQL endpoint's URI hostname:port
+        :param endpoint: string of the SPARQL endpoint's URI hostname:port. None for a local RDF engine
         :type endpoint: string
         """
-        if not is_uri(endpoint):
+        if endpoint is not None and not is_uri(endpoint):
             raise Exception("endpoint is not a valid URI")
         self.endpoint_url = None
+        self.stats = ClientStats()
+        self.cache = None
+        self.materialized = {}  # results of the cached datasets executed with this client, by query
         self.set_endpoint(endpoint)
 
     def is_alive(self, endpoint=None):
@@ -30,6 +37,116 @@ class Client:
         """
         pass
 
+    def get_stats(self):
+        """
+        :return: dictionary of the client's counters, e.g. pages fetched, bytes_on_wire and bytes_decoded
+        """
+        return self.stats.as_dict()
+
+    def set_cache(self, cache):
+        """
+        attaches a result cache to the client. The results of the queries returned as dataframes are stored in the
+        cache and a repeated query is answered from it without contacting the endpoint
+        :param cache: a ResultCache or None to disable caching
+        :return: None
+        """
+        self.cache = cache
+
+    def cached_result(self, query, return_format=None):
+        """
+        looks a query up in the client's cache without contacting the endpoint
+        :param query: the SPARQL query as string
+        :param return_format: the return format the query would be executed with
+        :return: the cached pandas dataframe or None
+        """
+        if self.cache is None:
+            return None
+        endpoint, default_graph = self._cache_scope()
+        return self.cache.get(self.cache.key(query, endpoint, default_graph, *self._cache_parts(return_format)))
+
+    def is_cached(self, query, return_format=None):
+        """
+        :param query: the SPARQL query as string
+        :param return_format: the return format the query would be executed with
+        :return: True if the result of the query is in the client's cache, without reading it
+        """
+        if self.cache is None:
+            return False
+        endpoint, default_graph = self._cache_scope()
+        return self.cache.key(query, endpoint, default_graph, *self._cache_parts(return_format)) in self.cache
+
+    def materialized_result(self, query, return_format=None):
+        """
+        :param query: the SPARQL query of a cached dataset
+        :param return_format: the return format the query would be executed with
+        :return: a copy of the result materialized by materialize() or None
+        """
+        df = self.materialized.get(self.__materialized_key(query, return_format))
+        if df is None:
+            return None
+        self.stats.add('materialized_hits')
+        return df.copy()
+
+    def materialize(self, query, df, return_format=None):
+        """
+        keeps the result of a cached dataset in memory, so the datasets derived from it are computed from the result
+        instead of executing the shared part of their query again
+        :param query: the SPARQL query of the cached dataset
+        :param df: pandas dataframe of the result
+        :param return_format: the return format the query was executed with
+        :return: None
+        """
+        self.materialized[self.__materialized_key(query, return_format)] = df.copy()
+
+    def release_materialized(self):
+        """
+        drops all the materialized results
+        :return: None
+        """
+        self.materialized = {}
+
+    def __materialized_key(self, query, return_format):
+        return (ResultCache.normalize_query(query),) + tuple(self._cache_parts(return_format))
+
+    def _cache_parts(self, return_format=None):
+        """
+        :param return_format: the return format of the query
+        :return: tuple of the values other than the query, the endpoint and the default graph a cached result depends on
+        """
+        return ()
+
+    def _cache_scope(self):
+        """
+        :return: (the endpoint url, the default graph uri) a cached result depends on
+        """
+        return self.get_endpoint(), ''
+
+    def _cached_result(self, query, *parts):
+        """
+        looks a query up in the client's cache
+        :param query: the sparql query string
+        :param parts: other values the result depends on, e.g. its format
+        :return: (the cache key, the cached dataframe or None). The key is None if the client has no cache
+        """
+        if self.cache is None:
+            return None, None
+        endpoint, default_graph = self._cache_scope()
+        key = self.cache.key(query, endpoint, default_graph, *parts)
+        df = self.cache.get(key)
+        self.stats.add('cache_hits' if df is not None else 'cache_misses')
+        return key, df
+
+    def _cache_result(self, key, query, df):
+        """
+        stores a query result in the client's cache. Categorical columns are stored as their values, and are
+        encoded again with the vocabulary of the result they are read into
+        :param key: the key returned by _cached_result()
+        :return: None
+        """
+        if self.cache is not None and key is not None:
+            endpoint, default_graph = self._cache_scope()
+            self.cache.put(key, Vocabulary.decode(df), query=query, endpoint=endpoint, default_graph=default_graph)
+
     def get_endpoint(self):
         """
         :return a string of the endpont URI
@@ -52,3 +169,26 @@ class Client:
         :return:
         """
         pass
+
+    def execute_arrow(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, **kwargs):
+        """
+        executes the query and returns its result as a pyarrow Table with dictionary encoded uri columns. Clients that
+        can't read the results with Arrow convert the dataframe returned by execute_query()
+        :param query: the SPARQL query as string
+        :param timeout: the query timeout in seconds
+        :param limit: the maximum number of rows
+        :return: pyarrow Table
+        """
+        arrow_results.require_pyarrow()
+        return arrow_results.from_pandas(self.execute_query(query, timeout=timeout, limit=limit, **kwargs))
+
+    def iter_batches(self, query, batch_rows=None, timeout=_TIMEOUT, **kwargs):
+        """
+        executes the query and yields its result in batches of rows as pandas dataframes. Clients that can't stream
+        the result return it as one batch
+        :param query: the SPARQL query as string
+        :param batch_rows: the number of rows per batch
+        :param timeout: the query timeout in seconds
+        :return: generator of pandas dataframes
+        """
+        yield self.execute_query(query, timeout=timeout, **kwargs)
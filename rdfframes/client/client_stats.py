@@ -0,0 +1,50 @@
+"""
+Counters of the data transferred by a client
+"""
+
+import threading
+
+
+class ClientStats:
+    """
+    Thread safe counters kept by a client, e.g. the number of pages fetched and the number of bytes received on the wire
+    and after decompression
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counters = {}
+
+    def add(self, name, value=1):
+        """
+        increments a counter
+        :param name: the counter name
+        :param value: the increment
+        :return: None
+        """
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def get(self, name, default=0):
+        with self.__lock:
+            return self.__counters.get(name, default)
+
+    def reset(self):
+        """
+        sets all the counters back to zero
+        :return: None
+        """
+        with self.__lock:
+            self.__counters = {}
+
+    def as_dict(self):
+        """
+        :return: a copy of the counters as a dictionary
+        """
+        with self.__lock:
+            return dict(self.__counters)
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __repr__(self):
+        return 'ClientStats({})'.format(self.as_dict())
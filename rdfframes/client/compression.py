@@ -0,0 +1,133 @@
+"""
+Incremental decoding of compressed (gzip/deflate) http response bodies
+"""
+
+import codecs
+import zlib
+
+
+ACCEPT_ENCODING = 'gzip, deflate'
+IDENTITY_ENCODING = 'identity'
+
+
+class StreamDecompressor:
+    """
+    Decompresses a response body chunk by chunk according to its Content-Encoding header
+    """
+    def __init__(self, content_encoding=None):
+        """
+        :param content_encoding: the value of the Content-Encoding header. None or identity for uncompressed bodies
+        """
+        self.encoding = (content_encoding or IDENTITY_ENCODING).strip().lower()
+        if self.encoding == 'gzip' or self.encoding == 'x-gzip':
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self.decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+        elif self.encoding == IDENTITY_ENCODING:
+            self.decompressor = None
+        else:
+            raise Exception("unsupported content encoding {}".format(content_encoding))
+        self.first_chunk = True
+
+    def decompress(self, chunk):
+        """
+        :param chunk: bytes as received on the wire
+        :return: the decompressed bytes
+        """
+        if self.decompressor is None:
+            return chunk
+        if self.first_chunk and self.encoding == 'deflate':
+            self.first_chunk = False
+            try:
+                return self.decompressor.decompress(chunk)
+            except zlib.error:
+                # some servers send raw deflate data without the zlib header
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.first_chunk = False
+        return self.decompressor.decompress(chunk)
+
+    def flush(self):
+        """
+        :return: the remaining decompressed bytes
+        """
+        if self.decompressor is None:
+            return b''
+        return self.decompressor.flush()
+
+
+class ChunkDecoder:
+    """
+    Decompresses and decodes the chunks of one response body to text, keeping the bytes of a character split
+    between two chunks for the next one
+    """
+    def __init__(self, content_encoding=None, charset='utf-8', stats=None):
+        """
+        :param content_encoding: the value of the Content-Encoding header
+        :param charset: the character set of the body
+        :param stats: optional ClientStats updated with bytes_on_wire and bytes_decoded
+        """
+        self.decompressor = StreamDecompressor(content_encoding)
+        self.decoder = codecs.getincrementaldecoder(charset or 'utf-8')(errors='replace')
+        self.stats = stats
+
+    def decode(self, chunk):
+        """
+        :param chunk: bytes as received on the wire
+        :return: the decoded text
+        """
+        if self.stats is not None:
+            self.stats.add('bytes_on_wire', len(chunk))
+        data = self.decompressor.decompress(chunk)
+        if self.stats is not None:
+            self.stats.add('bytes_decoded', len(data))
+        return self.decoder.decode(data)
+
+    def flush(self):
+        """
+        :return: the rest of the decoded text
+        """
+        data = self.decompressor.flush()
+        if self.stats is not None:
+            self.stats.add('bytes_decoded', len(data))
+        return self.decoder.decode(data, final=True)
+
+
+def decode_chunks(chunks, content_encoding=None, charset='utf-8', stats=None):
+    """
+    decompresses and decodes a stream of response body chunks
+    :param chunks: iterable of bytes as received on the wire
+    :param content_encoding: the value of the Content-Encoding header
+    :param charset: the character set of the body
+    :param stats: optional ClientStats updated with bytes_on_wire and bytes_decoded
+    :return: generator of decoded text chunks
+    """
+    decoder = ChunkDecoder(content_encoding, charset, stats)
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.flush()
+    if text:
+        yield text
+
+
+def decode_body(body, content_encoding=None, charset='utf-8', stats=None):
+    """
+    decompresses and decodes a complete response body
+    :param body: the body bytes as received on the wire
+    :return: the decoded text
+    """
+    return ''.join(decode_chunks([body], content_encoding, charset, stats))
+
+
+def charset_of(content_type, default='utf-8'):
+    """
+    :param content_type: the value of the Content-Type header
+    :return: the charset parameter of the header or the default charset
+    """
+    if content_type:
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'charset' and value.strip():
+                return value.strip().strip('"')
+    return default
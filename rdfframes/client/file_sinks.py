@@ -0,0 +1,341 @@
+"""
+Streaming writers of query results to files. The results are written page by page to a temporary file next to the
+output file, which is renamed to the output path once all the pages are written, so readers never see a partial file.
+Parquet and Feather sinks require the pyarrow package
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from rdfframes.client.arrow_results import unify_types
+from rdfframes.client.text_stream import TextChunkReader, CsvRecordCounter
+from rdfframes.utils.constants import _CHUNK_SIZE, _SPOOL_SIZE
+
+
+class FileFormat:
+    CSV = 'csv'
+    CSV_GZIP = 'csv.gz'
+    PARQUET = 'parquet'
+    FEATHER = 'feather'
+
+    @staticmethod
+    def from_path(path):
+        """
+        :param path: the output file path
+        :return: the file format matching the extension of the path, CSV by default
+        """
+        path = path.lower()
+        if path.endswith('.parquet') or path.endswith('.pq'):
+            return FileFormat.PARQUET
+        if path.endswith('.feather') or path.endswith('.arrow'):
+            return FileFormat.FEATHER
+        if path.endswith('.gz'):
+            return FileFormat.CSV_GZIP
+        return FileFormat.CSV
+
+
+def sink_for(path, file_format=None):
+    """
+    creates the sink writing a file in the given format
+    :param path: the output file path
+    :param file_format: one of FileFormat. If None, the format is chosen by the extension of the path
+    :return: FileSink
+    """
+    file_format = file_format if file_format is not None else FileFormat.from_path(path)
+    if file_format == FileFormat.CSV:
+        return CsvSink(path)
+    elif file_format == FileFormat.CSV_GZIP:
+        return CsvSink(path, compress=True)
+    elif file_format == FileFormat.PARQUET:
+        return ParquetSink(path)
+    elif file_format == FileFormat.FEATHER:
+        return FeatherSink(path)
+    raise Exception("file format {} is unimplemented".format(file_format))
+
+
+class FileSink:
+    """
+    Base class of the sinks. A sink receives the pages of a result either as CSV text chunks or as pandas dataframes
+    and is committed once all the pages are written, or aborted to remove the temporary file
+    """
+    accepts_text = False
+
+    def __init__(self, path):
+        """
+        :param path: the output file path
+        """
+        self.path = path
+        self.rows = 0
+        directory, name = os.path.split(os.path.abspath(path))
+        self.temp_path = os.path.join(directory, '.{}.{}.part'.format(name, uuid.uuid4().hex[:12]))
+
+    def write_chunks(self, chunks):
+        """
+        writes one page of CSV results received as text chunks
+        :param chunks: iterable of the text chunks of the page, starting with the header line
+        :return: the number of rows written
+        """
+        try:
+            df = pd.read_csv(TextChunkReader(chunks), sep=',')
+        except pd.errors.EmptyDataError:
+            return 0
+        return self.write_frame(df)
+
+    def write_frame(self, df):
+        """
+        writes one page of results
+        :param df: pandas dataframe of the page
+        :return: the number of rows written
+        """
+        raise NotImplementedError("Every sink must implement write_frame()")
+
+    def commit(self):
+        """
+        closes the temporary file and moves it to the output path
+        :return: the output path
+        """
+        self._close()
+        os.replace(self.temp_path, self.path)
+        return self.path
+
+    def abort(self):
+        """
+        closes and removes the temporary file, leaving the output path untouched
+        :return: None
+        """
+        try:
+            self._close()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+    def _close(self):
+        raise NotImplementedError("Every sink must implement _close()")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class CsvSink(FileSink):
+    """
+    Buffered CSV writer, optionally gzip compressed. CSV pages are copied as they are received, only the header line
+    of the first page is kept
+    """
+    accepts_text = True
+
+    def __init__(self, path, compress=False):
+        """
+        :param path: the output file path
+        :param compress: if True, the file is gzip compressed
+        """
+        super(CsvSink, self).__init__(path)
+        self.compress = compress
+        if compress:
+            self.file = gzip.open(self.temp_path, 'wt', encoding='utf-8', newline='')
+        else:
+            self.file = open(self.temp_path, 'w', encoding='utf-8', newline='', buffering=_CHUNK_SIZE)
+        self.has_header = False
+
+    def write_chunks(self, chunks):
+        """
+        copies one page of CSV results. A page that fails while it is received leaves no partial rows in the file,
+        so it can be fetched again
+        """
+        has_header = self.has_header
+        if self.compress:
+            # a gzip stream can't be truncated, the page is spooled until it is complete
+            with tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE, mode='w+') as spool:
+                try:
+                    rows = self.__copy_page(chunks, spool)
+                except BaseException:
+                    self.has_header = has_header
+                    raise
+                spool.seek(0)
+                shutil.copyfileobj(spool, self.file, _CHUNK_SIZE)
+        else:
+            position = self.file.tell()
+            try:
+                rows = self.__copy_page(chunks, self.file)
+            except BaseException:
+                self.file.seek(position)
+                self.file.truncate()
+                self.has_header = has_header
+                raise
+        self.rows += rows
+        return rows
+
+    def __copy_page(self, chunks, target):
+        """
+        :return: the number of rows copied
+        """
+        header = ''
+        in_header = True
+        counter = CsvRecordCounter()
+        for chunk in chunks:
+            if in_header:
+                end = chunk.find('\n')
+                if end < 0:
+                    header += chunk
+                    continue
+                header += chunk[:end + 1]
+                chunk = chunk[end + 1:]
+                in_header = False
+                if not chunk:
+                    continue
+            # the header is held back until the first row, so nothing is written for an empty page
+            if not self.has_header:
+                target.write(header)
+                self.has_header = True
+            target.write(chunk)
+            # a quoted value may span several lines, the records are counted instead of the line breaks
+            counter.feed(chunk)
+        if counter.last not in ('', '\n'):
+            target.write('\n')
+        return counter.close()
+
+    def write_frame(self, df):
+        if len(df) == 0:
+            return 0
+        df.to_csv(self.file, index=False, header=not self.has_header)
+        self.has_header = True
+        self.rows += len(df)
+        return len(df)
+
+    def _close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class ArrowSink(FileSink):
+    """
+    Base class of the sinks writing arrow tables. The schema is taken from the first page, the later pages are
+    converted to it. A page that can't be converted, e.g. with strings in a column that had only missing values so
+    far, promotes the schema to a type holding both, or to strings, and the pages already written are rewritten
+    """
+    def __init__(self, path):
+        if pa is None:
+            raise Exception("{} requires the pyarrow package. Install it with: pip install pyarrow".format(
+                self.__class__.__name__))
+        super(ArrowSink, self).__init__(path)
+        self.writer = None
+        self.schema = None
+
+    def write_frame(self, df):
+        if len(df) == 0:
+            return 0
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self._open_writer(self.schema)
+        else:
+            table = self.__conform(table)
+        self._write_table(table)
+        self.rows += len(df)
+        return len(df)
+
+    def __conform(self, table):
+        """
+        casts a page to the schema of the file, promoting the schema if the page doesn't fit in it
+        :param table: pyarrow Table of the page
+        :return: pyarrow Table with the schema of the file
+        """
+        try:
+            return table.cast(self.schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, ValueError) as e:
+            if table.column_names != self.schema.names:
+                raise Exception("the page starting at row {} does not have the columns of the first page: {}".format(
+                    self.rows, e))
+        written, table = unify_types([self.schema.empty_table(), table])
+        schema = pa.unify_schemas([written.schema, table.schema], promote_options='permissive').remove_metadata()
+        self.__rewrite(schema)
+        return table.cast(schema)
+
+    def __rewrite(self, schema):
+        """
+        rewrites the pages already written with a promoted schema, keeping one row group or batch per page
+        :param schema: the new schema of the file
+        :return: None
+        """
+        self.writer.close()
+        self.writer = None
+        previous = self.temp_path + '.previous'
+        os.replace(self.temp_path, previous)
+        try:
+            self.schema = schema
+            self.writer = self._open_writer(schema)
+            for table in self._read_tables(previous):
+                self._write_table(table.cast(schema))
+        finally:
+            os.remove(previous)
+
+    def _close(self):
+        if self.writer is None:
+            # no rows. Write a valid file without columns
+            self.schema = pa.schema([])
+            self.writer = self._open_writer(self.schema)
+        self.writer.close()
+
+    def _open_writer(self, schema):
+        raise NotImplementedError("Every arrow sink must implement _open_writer()")
+
+    def _write_table(self, table):
+        raise NotImplementedError("Every arrow sink must implement _write_table()")
+
+    def _read_tables(self, path):
+        """
+        :param path: a file written by this sink
+        :return: generator of the pages of the file as pyarrow Tables
+        """
+        raise NotImplementedError("Every arrow sink must implement _read_tables()")
+
+
+class ParquetSink(ArrowSink):
+    """
+    Parquet writer. Every page is written as one row group
+    """
+    def _open_writer(self, schema):
+        return pa.parquet.ParquetWriter(self.temp_path, schema)
+
+    def _write_table(self, table):
+        self.writer.write_table(table, row_group_size=max(table.num_rows, 1))
+
+    def _read_tables(self, path):
+        with open(path, 'rb') as source:
+            parquet_file = pa.parquet.ParquetFile(source)
+            for i in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(i)
+
+
+class FeatherSink(ArrowSink):
+    """
+    Feather (arrow IPC file) writer. Every page is written as one record batch
+    """
+    def _open_writer(self, schema):
+        return pa.ipc.new_file(self.temp_path, schema)
+
+    def _write_table(self, table):
+        self.writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+    def _read_tables(self, path):
+        with pa.OSFile(path, 'rb') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield pa.Table.from_batches([reader.get_batch(i)])
@@ -3,20 +3,44 @@ Http client that handles the execution of the sparql query on the server, retrie
 the required format
 """
 
-import requests
-import socket
+import tempfile
+import time
+import warnings
+
 import pandas as pd
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 from urllib.parse import urlparse
 from io import StringIO
-import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from rdfframes.client import arrow_results
 from rdfframes.client.client import Client
-from rdfframes.utils.constants import _TIMEOUT, ReturnFormat, _MAX_ROWS
+from rdfframes.client.file_sinks import sink_for
+from rdfframes.client.compression import ACCEPT_ENCODING, IDENTITY_ENCODING, decode_chunks, charset_of
+from rdfframes.client.http_session_pool import HttpSessionPool
+from rdfframes.client.keyset_pagination import KeysetPagination
+from rdfframes.client.memory_budget import MemoryBudget
+from rdfframes.client.page_sizer import AdaptivePageSizer
+from rdfframes.client.prefetch import PrefetchIterator
+from rdfframes.client.result_parsers import SparqlJsonParser, SparqlTsvParser, concat_batches, downcast_columns
+from rdfframes.client.retry_policy import RetryPolicy, CircuitBreaker, TransientError
+from rdfframes.client.spill import SpillWriter
+from rdfframes.client.text_stream import TextChunkReader, CsvRecordCounter
+from rdfframes.client.vocabulary import Vocabulary
+from rdfframes.utils.constants import _TIMEOUT, ReturnFormat, _MAX_ROWS, _POOL_SIZE, _HEALTH_CHECK_TTL, _CHUNK_SIZE, \
+    _SPOOL_SIZE, _INITIAL_PAGE_SIZE, _SORTED_PAGE_SIZE, _TARGET_PAGE_LATENCY, _MAX_RETRIES
+
+# failures of a request that may succeed if it is sent again
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, ProtocolError, ReadTimeoutError)
 
 
 class HttpClientDataFormat:
     CSV = "CSV"
     JSON = "JSON"
+    TSV = "TSV"
     TURTLE = "TURTLE"
     HTML = "HTML"
     PANDAS_DF = "PANDAS_DF"
@@ -28,7 +52,9 @@ class HttpClientDataFormat:
            comm_format == HttpClientDataFormat.PANDAS_DF:
             return "text/csv"
         elif comm_format == HttpClientDataFormat.JSON:
-            return "application/json"
+            return "application/sparql-results+json"
+        elif comm_format == HttpClientDataFormat.TSV:
+            return "text/tab-separated-values"
         elif comm_format == HttpClientDataFormat.HTML:
             return "text/html"
         elif comm_format == HttpClientDataFormat.TURTLE:
@@ -36,6 +62,20 @@ class HttpClientDataFormat:
         else:
             return HttpClientDataFormat.return_format(HttpClientDataFormat.DEFAULT)
 
+    @staticmethod
+    def result_parser(comm_format, batch_rows=10000, downcast=False):
+        """
+        :param comm_format: the format of the results
+        :param batch_rows: the number of rows in each parsed batch
+        :param downcast: if True, the parser gives the columns the smallest dtypes holding their values
+        :return: an incremental typed parser of the format or None if the format is parsed as CSV
+        """
+        if comm_format == HttpClientDataFormat.JSON:
+            return SparqlJsonParser(batch_rows, downcast)
+        elif comm_format == HttpClientDataFormat.TSV:
+            return SparqlTsvParser(batch_rows, downcast)
+        return None
+
 
 class HttpClient(Client):
     """
@@ -47,7 +87,12 @@ class HttpClient(Client):
                  return_format=HttpClientDataFormat.DEFAULT,
                  timeout=120,
                  default_graph_uri='',
-                 max_rows=_MAX_ROWS):
+                 max_rows=_MAX_ROWS,
+                 pool_size=_POOL_SIZE,
+                 health_check_ttl=_HEALTH_CHECK_TTL,
+                 compression=True,
+                 target_latency=_TARGET_PAGE_LATENCY,
+                 max_retries=_MAX_RETRIES):
         """
         Initializes a client object with the URI of the RDF engine SPARQL endpoint and the port number
         :param endpoint_url: the url of the RDF engine or SPARQL endpoint
@@ -56,22 +101,43 @@ class HttpClient(Client):
         :param default_graph_uri: the absolute url of the default graph
         :param max_rows: the maximum number of rows retrieved in a single http request
         :param return_format: the query results format
+        :param pool_size: the maximum number of keep-alive connections kept open to the endpoint
+        :param health_check_ttl: number of seconds the result of is_alive() is cached
+        :param compression: if True, ask the endpoint for gzip/deflate compressed responses
+        :param target_latency: the number of seconds a page should take. The page size of each query grows while its
+            pages are faster and shrinks while they are slower. None for a fixed page size of max_rows
+        :param max_retries: the number of times a page failing with a transient error is fetched again
         """
-        super(HttpClient, self).__init__(endpoint_url)
-
         self.port = None
         self.full_endpoint_url = None
+
+        super(HttpClient, self).__init__(endpoint_url)
+
         self.return_format = None
         self.timeout = None
         self.default_graph_uri = None
         self.max_rows = None
+        self.pool_size = None
+        self.health_check_ttl = None
+        self.compression = None
+        self.target_latency = None
+        # the maximum number of rows the endpoint returns per request, detected from truncated pages
+        self.server_cap = None
+        self.retry_policy = None
+        # the pages of the last query started that had to be fetched more than once. Every query records its
+        # retries in its own list, returned in the attrs of its result
+        self.retried_pages = []
 
         self.set_port(port)
-        self.__build_full_url()
         self.set_return_format(return_format)
         self.set_timeout(timeout)
         self.set_graph_uri(default_graph_uri)
         self.set_max_rows(max_rows)
+        self.set_pool_size(pool_size)
+        self.set_health_check_ttl(health_check_ttl)
+        self.set_compression(compression)
+        self.set_target_latency(target_latency)
+        self.set_retry_policy(max_retries)
 
     def set_endpoint(self, endpoint_url):
         """
@@ -80,7 +146,7 @@ class HttpClient(Client):
         :return: None
         """
         self.endpoint_url = endpoint_url
-        self.__endpoint_liveness_check()
+        self.__build_full_url()
 
     def set_port(self, port):
         """
@@ -89,7 +155,80 @@ class HttpClient(Client):
         :return: None
         """
         self.port = port
-        self.__endpoint_liveness_check()
+        self.__build_full_url()
+
+    def set_pool_size(self, pool_size=_POOL_SIZE):
+        """
+        setter for the maximum number of keep-alive connections kept open to the endpoint. The connections are shared
+        by all clients of the same endpoint
+        :param pool_size: number of pooled connections
+        :return: None
+        """
+        if pool_size >= 1:
+            self.pool_size = pool_size
+
+    def set_health_check_ttl(self, health_check_ttl=_HEALTH_CHECK_TTL):
+        """
+        setter for the number of seconds the result of the endpoint liveness check is reused
+        :param health_check_ttl: time to live of the liveness check result in seconds
+        :return: None
+        """
+        self.health_check_ttl = health_check_ttl
+
+    def set_compression(self, compression=True):
+        """
+        setter for the response compression. If enabled, the endpoint is asked for gzip or deflate compressed results
+        which are decompressed page by page as they are received. The bytes received on the wire and after
+        decompression are counted in the client's stats
+        :param compression: True to negotiate compressed responses
+        :return: None
+        """
+        self.compression = compression
+
+    def set_target_latency(self, target_latency=_TARGET_PAGE_LATENCY):
+        """
+        setter for the number of seconds one page of results should take. Page sizes are tuned per query between
+        the minimum page size and max_rows to stay close to this latency
+        :param target_latency: latency in seconds or None to always request pages of max_rows rows
+        :return: None
+        """
+        self.target_latency = target_latency
+
+    def set_retry_policy(self, max_retries=_MAX_RETRIES, base_delay=None, max_delay=None):
+        """
+        setter for the retries of failed pages. A page failing with a connection error, a timeout, 429 or 5xx is
+        fetched again after a random delay that doubles with every attempt, without fetching the completed pages again
+        :param max_retries: the number of retries of a page. 0 to fail on the first error
+        :param base_delay: the delay in seconds before the first retry. If None, the default is used
+        :param max_delay: the longest delay in seconds between two attempts. If None, the default is used
+        :return: None
+        """
+        policy = RetryPolicy(max_retries)
+        if base_delay is not None:
+            policy.base_delay = base_delay
+        if max_delay is not None:
+            policy.max_delay = max_delay
+        self.retry_policy = policy
+
+    def is_alive(self, endpoint=None):
+        """
+        checks if the endpoint accepts connections. The check result is cached for health_check_ttl seconds
+        :param endpoint: the url of the endpoint to check. If None, the client's endpoint is checked
+        :return: True if alive, False if not
+        """
+        endpoint = endpoint if endpoint is not None else self.endpoint_url
+        host, port = self.__endpoint_address(endpoint)
+        if host and port:
+            return HttpSessionPool.is_alive(host, port, ttl=self.health_check_ttl)
+        print('missing endpoint data: endpoint {}, port {}'.format(endpoint, port))
+        return False
+
+    def close(self):
+        """
+        closes the pooled connections to the endpoint
+        :return: None
+        """
+        HttpSessionPool.close_session(self.full_endpoint_url)
 
     def set_return_format(self, return_format=HttpClientDataFormat.CSV):
         """
@@ -124,43 +263,482 @@ class HttpClient(Client):
         if max_rows >= 1:
             self.max_rows = max_rows
 
-    def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None):
+    def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None,
+                      max_workers=1, key_column=None, file_format=None, memory_budget=None, scratch_dir=None,
+                      categorical=None, downcast=False):
         """
         submits the provided SPARQL query to the registered endpoint to be executed.
         The result is retrieved in the requested format (return_format)
         :param query: the SPARQL query as string
-        :param return_format: the format of the retrieved data. Options from HttpClientDataFormat
-        :param export_file: if provided, the data will be saved to the pass file path
-        :return: the result of the query in the requested format
+        :param return_format: the format of the retrieved data. Options from HttpClientDataFormat. JSON and TSV
+            results are parsed as they are received into a pandas dataframe whose columns are typed after the xsd
+            datatypes of the values
+        :param output_file: if provided, the data will be saved to the pass file path. The file is written to a
+            temporary path and moved to output_file once complete
+        :param max_workers: number of pages fetched in parallel. Pages are reassembled in offset order
+        :param key_column: if provided, the pages are ordered by this column and each page continues after the last
+            key of the previous one instead of using OFFSET. Falls back to OFFSET paging if the query can't be paged
+            by this column. Keyset pages are parsed as CSV, so the JSON and TSV formats ignore key_column with a
+            warning and are paged with OFFSET to keep their typed columns
+        :param file_format: the format of output_file, one of FileFormat (CSV, CSV_GZIP, PARQUET or FEATHER). If None,
+            it is chosen by the file extension. Parquet files get one row group per page
+        :param memory_budget: the number of bytes the pages of the result may take in memory. No more pages are
+            requested while the pages fetched ahead take more, and once the result takes more, its pages are spilled
+            to memory-mapped Arrow files and a SpilledResult is returned instead of a dataframe. Spilled results are
+            not cached. Requires pyarrow. If None, the result is always kept in memory
+        :param scratch_dir: the directory the spilled files are created in. If None, the system's temporary directory
+        :param categorical: the columns returned as pandas categorical columns: Vocabulary.URIS for the uri columns,
+            Vocabulary.TERMS for all the columns of uris and strings, or a list of column names. Every page is encoded
+            as it is received with a vocabulary of the result, so the pages share the same codes and the categories of
+            a column are its own values. Spilled results and output files keep the values. If None, no column is
+            categorical
+        :param downcast: if True, every page is given the smallest dtypes holding its values as it is received: the
+            JSON and TSV columns of xsd:int, xsd:short, xsd:float, etc. get the matching dtype, integer columns the
+            smallest integer dtype and float columns float32 where no value changes. The string columns of the result
+            with few distinct values are made categorical
+        :return: the result of the query in the requested format. A failed page is fetched again up to max_retries
+            times, the pages that needed it are listed in the dataframe's attrs['retried_pages'], and in the client's
+            retried_pages until another query starts. An exception is raised if a page still fails. If the client has
+            a cache, a cached result is returned or written to output_file without contacting the endpoint, and
+            results returned as dataframes are cached
         """
         self.return_format = return_format if return_format is not None else self.return_format
-        final_result = []
-        for res in self._execute_query(query, return_format=return_format, export_file=output_file):
-            if return_format == HttpClientDataFormat.PANDAS_DF:
-                if len(final_result) <= 0:
-                    final_result = [res]
+        return_format = self.return_format
+        typed = HttpClientDataFormat.result_parser(return_format) is not None
+        if output_file is None and return_format != HttpClientDataFormat.PANDAS_DF and not typed:
+            raise Exception("return format {} is unimplemented".format(return_format))
+        cache_key, df = self._cached_result(query, *self._cache_parts(return_format))
+        if df is not None:
+            if output_file is not None:
+                return HttpClient._write_cached(df, output_file, file_format)
+            if categorical is not None:
+                df = Vocabulary().encode_frame(df, categorical)
+            return downcast_columns(df) if downcast else df
+        retries = self._start_query()
+
+        sink = sink_for(output_file, file_format) if output_file is not None else None
+        budget = MemoryBudget(memory_budget, self.stats) if memory_budget is not None else None
+        keyset = self.__keyset(query, key_column, typed)
+        # the pages parsed as CSV are downcast here, the typed parsers downcast their batches
+        downcast_pages = downcast and (keyset is not None or not typed)
+        if keyset is not None:
+            pages = self.__keyset_pages(keyset, self._page_sizer(query), budget, retries)
+        elif typed:
+            pages = self.__typed_pages(query, return_format, None, max_workers, budget, downcast, retries)
+        else:
+            # each page is parsed or written to the file while it is received
+            pages = self._execute_query(query, return_format=return_format, sink=sink, max_workers=max_workers,
+                                        budget=budget, retries=retries)
+
+        vocabulary = Vocabulary() if categorical is not None else None
+        frames = []
+        spill = None
+        buffered = 0
+        try:
+            for page in pages:
+                page_bytes = budget.release(page) if budget is not None else 0
+                if sink is not None:
+                    if page is not sink:
+                        sink.write_frame(page)
+                elif spill is not None:
+                    spill.write_frame(page)
                 else:
-                    final_result.append(res)
-            else:
-                raise Exception("return format {} is unimplemented".format(return_format))
-        if return_format == HttpClientDataFormat.PANDAS_DF:
-            string = ''.join(final_result)
-            stringio = StringIO(string)
-            stringio.seek(0)
-            df = pd.read_csv(stringio, sep=',')
-            return df
+                    if downcast_pages:
+                        page = downcast_columns(page, categorical=False)
+                    frames.append(vocabulary.encode_frame(page, categorical) if vocabulary is not None else page)
+                    if memory_budget is not None:
+                        buffered += page_bytes
+                        if buffered > memory_budget:
+                            spill = SpillWriter(scratch_dir)
+                            for frame in frames:
+                                spill.write_frame(frame)
+                            frames = []
+        except BaseException:
+            if sink is not None:
+                sink.abort()
+            if spill is not None:
+                spill.abort()
+            raise
+        finally:
+            pages.close()
+
+        if sink is not None:
+            return sink.commit()
+        if spill is not None:
+            self.stats.add('spilled_results')
+            self.stats.add('spilled_bytes', spill.bytes)
+            return HttpClient._report_retries(spill.close(), retries)
+        if vocabulary is not None:
+            # the pages encoded before the vocabulary grew are moved to its final categories
+            frames = [vocabulary.align(frame) for frame in frames]
+        df = concat_batches(frames) if typed else HttpClient._pages_to_dataframe(frames)
+        if downcast:
+            df = downcast_columns(df)
+        self._cache_result(cache_key, query, df)
+        return HttpClient._report_retries(df, retries)
+
+    def execute_arrow(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, max_workers=1):
+        """
+        executes the query and returns its result as a pyarrow Table built page by page. Every page is parsed by the
+        Arrow CSV reader, or by the Arrow JSON reader for JSON results whose columns are typed after their xsd
+        datatypes. The other formats are fetched as CSV
+        :param query: the SPARQL query as string
+        :param timeout: the query timeout in seconds
+        :param limit: the maximum number of rows
+        :param return_format: JSON for typed columns. If None, the client's return format is used
+        :param max_workers: number of pages fetched in parallel
+        :return: pyarrow Table whose uri columns are dictionary encoded. A cached result is converted without
+            contacting the endpoint
+        """
+        arrow_results.require_pyarrow()
+        return_format = return_format if return_format is not None else self.return_format
+        _, df = self._cached_result(query, *self._cache_parts(return_format))
+        if df is not None:
+            return arrow_results.from_pandas(df)
+        retries = self._start_query()
+        page_format = HttpClientDataFormat.JSON if return_format == HttpClientDataFormat.JSON else \
+            HttpClientDataFormat.CSV
+        read_page = arrow_results.read_json_page if page_format == HttpClientDataFormat.JSON else \
+            arrow_results.read_csv_page
+
+        def fetch(page_query, offset, size):
+            params = self._page_params(page_query, offset, size)
+            params['format'] = HttpClientDataFormat.return_format(page_format)
+            response, table = self.__post(params, read_page)
+            if response.status_code != 200 or table is None:
+                return response, None, 0
+            return response, table, table.num_rows
+
+        responses = self.__page_responses(query, fetch, None, max_workers, retries=retries)
+        tables = []
+        try:
+            for response, table, rows in responses:
+                # an empty page still gives the columns of an empty result
+                if table is not None and (rows > 0 or len(tables) == 0):
+                    tables.append(table)
+                if rows == 0:
+                    break
+        finally:
+            responses.close()
+        return arrow_results.concat_pages(tables)
+
+    def iter_batches(self, query, batch_rows=None, timeout=_TIMEOUT, max_workers=1, key_column=None,
+                     return_format=None, memory_budget=None, categorical=None, downcast=False):
+        """
+        executes the query and yields its result one page at a time as a pandas dataframe. The next page is fetched
+        and parsed in the background while the caller processes the current one. Fetching stops when the caller stops
+        iterating
+        :param query: the SPARQL query as string
+        :param batch_rows: number of rows per page. If None, the client's max_rows is used
+        :param timeout: the query timeout in seconds
+        :param max_workers: number of pages fetched in parallel
+        :param key_column: if provided, the pages are fetched with keyset pagination on this column. Ignored with a
+            warning for JSON and TSV, see execute_query()
+        :param return_format: JSON or TSV to retrieve typed batches. If None, the client's return format is used
+        :param memory_budget: the number of bytes the batches fetched ahead of the caller may take. Page requests are
+            paused while they take more and resumed as the caller consumes them. If None, up to max_workers pages
+            are fetched ahead
+        :param categorical: the columns returned as categorical columns, see execute_query(). Every batch is encoded
+            with its own vocabulary, so the categories of a column are the values of the batch, and the batches are
+            given common categories when they are concatenated or joined, e.g. with align_categories()
+        :param downcast: if True, the columns of every batch get the smallest numeric dtypes holding their values, see
+            execute_query()
+        :return: generator of pandas dataframes
+        """
+        return_format = return_format if return_format is not None else self.return_format
+        _, df = self._cached_result(query, *self._cache_parts(return_format))
+        if df is not None:
+            if categorical is not None:
+                df = Vocabulary().encode_frame(df, categorical)
+            if downcast:
+                df = downcast_columns(df, categorical=False)
+            step = batch_rows if batch_rows is not None else max(len(df), 1)
+            for start in range(0, len(df), step):
+                yield df.iloc[start:start + step]
+            return
+        retries = self._start_query()
+        typed = HttpClientDataFormat.result_parser(return_format) is not None
+        budget = MemoryBudget(memory_budget, self.stats) if memory_budget is not None else None
+        keyset = self.__keyset(query, key_column, typed)
+        downcast_pages = downcast and (keyset is not None or not typed)
+        if keyset is not None:
+            pages = self.__keyset_pages(keyset, self._page_sizer(query, batch_rows), budget, retries)
+        elif typed:
+            pages = self.__typed_pages(query, return_format, batch_rows, max_workers, budget, downcast, retries)
         else:
-            return final_result
+            pages = self.__dataframe_pages(query, batch_rows, max_workers, budget, retries)
+        batches = PrefetchIterator(pages, depth=1)
+        try:
+            for page in batches:
+                batch = downcast_columns(page, categorical=False) if downcast_pages else page
+                yield Vocabulary().encode_frame(batch, categorical) if categorical is not None else batch
+                # the caller is done with the batch once it asks for the next one
+                if budget is not None:
+                    budget.release(page)
+        finally:
+            if budget is not None:
+                budget.close()
+            batches.close()
+
+    def __dataframe_pages(self, query, page_size, max_workers, budget=None, retries=None):
+        """
+        :return: generator of the pages of the query parsed into pandas dataframes
+        """
+        return self._execute_query(query, return_format=HttpClientDataFormat.PANDAS_DF, max_workers=max_workers,
+                                   page_size=page_size, budget=budget, retries=retries)
+
+    def __typed_pages(self, query, return_format, page_size, max_workers, budget=None, downcast=False, retries=None):
+        """
+        fetches the pages of the query in a typed format (JSON or TSV). The response of each page is parsed as it is
+        received
+        :return: generator of pandas dataframes
+        """
+        def fetch(page_query, offset, size):
+            params = self._page_params(page_query, offset, size)
+            params['format'] = HttpClientDataFormat.return_format(return_format)
+            parser = HttpClientDataFormat.result_parser(return_format, batch_rows=size, downcast=downcast)
+            response, frames = self.__post(params, lambda chunks: list(parser.parse(chunks)))
+            return response, frames, parser.rows
+
+        responses = self.__page_responses(query, fetch, page_size, max_workers, budget, retries)
+
+        try:
+            for response, frames, rows in responses:
+                if rows == 0:
+                    break
+                for frame in frames:
+                    yield frame
+        finally:
+            responses.close()
+
+    def __keyset(self, query, key_column, typed=False):
+        """
+        :param typed: True if the result is parsed from JSON or TSV, whose typed columns the CSV keyset pages lack
+        :return: the KeysetPagination of the query or None if the query has to be paged with OFFSET
+        """
+        if key_column is None:
+            return None
+        if typed:
+            warnings.warn("key_column is ignored for typed results, which are paged with OFFSET to keep the xsd "
+                          "datatypes of their columns")
+            self.stats.add('keyset_fallbacks')
+            return None
+        keyset = KeysetPagination(query, key_column)
+        if keyset.is_applicable():
+            return keyset
+        self.stats.add('keyset_fallbacks')
+        return None
+
+    def __keyset_pages(self, keyset, sizer, budget=None, retries=None):
+        """
+        :param retries: the list the retried pages of the query are recorded in
+        :param budget: the MemoryBudget of the query or None. The pages yielded are filtered or concatenated from the
+            pages fetched, the bytes held for the fetched pages are moved to them
+        :return: generator of the pages of the query fetched with keyset pagination as pandas dataframes
+        """
+        fetched = [0]
+        # the pages fetched since the last page was yielded
+        held = []
+
+        def request(page_query, offset, size):
+            params = self.__query_params(page_query, size)
+            params['format'] = HttpClientDataFormat.return_format(HttpClientDataFormat.CSV)
+            response, page = self.__post(params, keyset.parse_page)
+            return response, page, 0 if page is None or response.status_code != 200 else len(page)
+
+        def fetch(page_query, size):
+            if budget is not None:
+                # the rows of one key may take several pages, which are only released together
+                budget.admit(block=len(held) == 0)
+            started = time.time()
+            _, page, rows, _ = self.__fetch_with_retries(request, page_query, fetched[0], size, retries=retries)
+            # a keyset page starts again at the last key of the previous one, a short page followed by rows is not
+            # a truncated page
+            sizer.record_page(size, rows, time.time() - started, detect_cap=False)
+            fetched[0] += rows
+            if budget is not None:
+                budget.hold(page)
+                if page is not None:
+                    held.append(page)
+            return page
+
+        if budget is None:
+            return keyset.pages(fetch, sizer)
+        return HttpClient.__transferred(keyset.pages(fetch, sizer), held, budget)
+
+    @staticmethod
+    def __transferred(pages, held, budget):
+        """
+        :return: generator of the pages, each one holding the bytes of the pages fetched to build it
+        """
+        try:
+            for page in pages:
+                budget.transfer(held, page)
+                del held[:]
+                yield page
+        finally:
+            pages.close()
+
+    @staticmethod
+    def _result_kind(return_format):
+        """
+        :return: the part of the cache key telling the results of a return format apart. Untyped formats all give the
+            same dataframe parsed from CSV
+        """
+        if HttpClientDataFormat.result_parser(return_format) is not None:
+            return return_format
+        return HttpClientDataFormat.CSV
+
+    @staticmethod
+    def _write_cached(df, output_file, file_format):
+        """
+        writes a cached result to the output file
+        :return: the output file path
+        """
+        sink = sink_for(output_file, file_format)
+        try:
+            sink.write_frame(df)
+        except BaseException:
+            sink.abort()
+            raise
+        return sink.commit()
+
+    def _cache_scope(self):
+        return self.full_endpoint_url, self.default_graph_uri
+
+    def _cache_parts(self, return_format=None):
+        return_format = return_format if return_format is not None else self.return_format
+        return HttpClient._result_kind(return_format),
 
-    def _execute_query(self, query, return_format=None, export_file=None):
+    @staticmethod
+    def _parse_page(page, columns=None):
+        """
+        parses one page of CSV results. Every page starts with a header line
+        :param page: the text of the page
+        :param columns: the column names taken from the first page. If None, the page's header is used
+        :return: pandas dataframe of the page
+        """
+        if columns is None:
+            return pd.read_csv(StringIO(page), sep=',')
+        return pd.read_csv(StringIO(page), sep=',', header=0, names=columns)
+
+    @staticmethod
+    def _pages_to_dataframe(frames):
+        """
+        :param frames: list of the parsed pages in offset order
+        :return: pandas dataframe of all the pages
+        """
+        if len(frames) == 0:
+            return pd.DataFrame()
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True, copy=False)
+
+    def _execute_query(self, query, return_format=None, sink=None, max_workers=1, page_size=None, budget=None,
+                       retries=None):
+        """
+        fetches the pages of the query. Every response is read in chunks straight into the CSV parser or the file
+        sink, so a page is never held in memory as one string
+        :param query: the sparql query string
+        :param return_format: the format of the retrieved data
+        :param sink: the FileSink if the results should be exported to a file. Sinks that don't accept CSV text get
+            the parsed pages from the caller
+        :param max_workers: number of pages fetched in parallel
+        :param page_size: number of rows per page
+        :param budget: the MemoryBudget pausing the page requests while the pages not consumed yet take too much
+            memory, or None
+        :param retries: the list the pages fetched more than once are recorded in, returned by _start_query()
+        :return: generator of the pages as pandas dataframes, or of the sink after each page is written to it
+        """
         self.return_format = return_format if return_format is not None else self.return_format
+
+        text_sink = sink is not None and sink.accepts_text
+        if not text_sink:
+            fetch = self.__fetch_frame
+        elif max_workers > 1:
+            # pages fetched out of order are spooled until they can be written in order
+            fetch = self.__fetch_spooled
+        else:
+            def fetch(page_query, offset, size):
+                # a page failing while it is written is rolled back by the sink, so it can be fetched again
+                response, rows = self.__post(self._page_params(page_query, offset, size), sink.write_chunks)
+                return response, sink, rows if response.status_code == 200 else 0
+
+        responses = self.__page_responses(query, fetch, page_size, max_workers, budget, retries)
+
+        columns = None
+        try:
+            for response, page, rows in responses:
+                if rows == 0:
+                    if text_sink and max_workers > 1:
+                        page.close()
+                    break
+                if text_sink:
+                    if max_workers > 1:
+                        with page:
+                            sink.write_chunks(iter(lambda: page.read(_CHUNK_SIZE), ''))
+                    yield sink
+                    continue
+                if columns is None:
+                    columns = list(page.columns)
+                elif list(page.columns) != columns and len(page.columns) == len(columns):
+                    page.columns = columns
+                yield page
+        finally:
+            responses.close()
+
+    def _page_size(self, query):
+        """
+        :param query: the sparql query string
+        :return: the number of rows to retrieve in the first page. Sorted queries start with smaller pages
+        """
         if HttpClient.__find_clause(query, 'ORDER BY')[0] >= 0:
-            self.set_max_rows(1000)
+            return min(_SORTED_PAGE_SIZE, self.max_rows)
+        return min(_INITIAL_PAGE_SIZE, self.max_rows)
+
+    def _page_sizer(self, query, page_size=None):
+        """
+        creates the page sizer of one query execution. The client itself is not modified, except for remembering
+        the server cap once it is detected
+        :param query: the sparql query string
+        :param page_size: a fixed number of rows per page. If None, the page size is tuned to the target latency
+        :return: AdaptivePageSizer
+        """
+        if page_size is not None:
+            return AdaptivePageSizer(page_size, page_size, server_cap=self.server_cap, adaptive=False)
+        return AdaptivePageSizer(self._page_size(query), self.max_rows, target_latency=self.target_latency,
+                                 server_cap=self.server_cap, adaptive=self.target_latency is not None)
+
+    def _record_page(self, sizer, requested, returned, elapsed):
+        """
+        updates the page size of the query after a page and remembers the server cap if this page revealed it
+        :return: None
+        """
+        sizer.record_page(requested, returned, elapsed)
+        self._record_cap(sizer)
 
+    def _record_cap(self, sizer, cap=None):
+        """
+        records a server cap in the page sizer and remembers it for the next queries
+        :param sizer: the AdaptivePageSizer of the query
+        :param cap: the number of rows of a page truncated by the endpoint. If None, the cap known by the sizer is
+            copied to the client
+        :return: None
+        """
+        if cap is not None:
+            sizer.record_cap(cap)
+        if sizer.server_cap is not None and sizer.server_cap != self.server_cap:
+            self.server_cap = sizer.server_cap
+            self.stats.add('server_cap_detected')
 
+    def _query_range(self, query):
+        """
+        :param query: the sparql query string
+        :return: (the offset of the query, its limit or None if it has no LIMIT)
+        """
         limit_start, limit_end = HttpClient.__find_clause(query, 'LIMIT')
 
-        query_limit = -1
+        query_limit = None
 
         if limit_start != -1:
             try:
@@ -178,98 +756,351 @@ class HttpClient(Client):
             except ValueError:
                 pass
 
-        offsets = None
+        return query_offset, query_limit
 
-        if limit_start != -1:
-            offsets = []
-
-            if offset_start != -1:
-                offsets.append(query_offset)
-            else:
-                offsets.append(0)
-
-            if query_limit > self.max_rows:
-                query_limit -= self.max_rows
-                current_offset = offsets[0]
-
-                while query_limit > 0:
-                    current_offset += self.max_rows
-                    query_limit -= self.max_rows
-                    offsets.append(current_offset)
-
-        offset_index = 0
-        current_offset = -1 * self.max_rows
-
-        first_query_flag = True
-        while offsets is None or offset_index < len(offsets):
-            modified_query = query
-            current_offset = offsets[offset_index] if offsets is not None else current_offset + self.max_rows
-            offset_index += 1
-            modified_query = HttpClient.__remove_clause(modified_query, 'LIMIT')
-            modified_query = HttpClient.__remove_clause(modified_query, 'OFFSET')
-            modified_query = HttpClient.__append_clause(modified_query, 'OFFSET', current_offset)
-            modified_query = HttpClient.__append_clause(modified_query, 'LIMIT', _MAX_ROWS)
-            params = {
-                'query': modified_query,
-                'format': HttpClientDataFormat.return_format(self.return_format),
-                'default-graph-uri': self.default_graph_uri,
-                'maxrows': self.max_rows
-            }
-            response = requests.post(self.full_endpoint_url, data=params, timeout=self.timeout)
+    def __page_responses(self, query, fetch, page_size, max_workers, budget=None, retries=None):
+        """
+        :param budget: the MemoryBudget of the query. Every page fetched is held in it until the consumer releases it
+        :param retries: the list the pages fetched more than once are recorded in
+        :return: generator of (http response, page, number of rows) of all the pages of the query in offset order
+        """
+        sizer = self._page_sizer(query, page_size)
+        start, limit = self._query_range(query)
+        if budget is not None:
+            fetch = HttpClient.__held(fetch, budget)
+        if max_workers > 1:
+            return self.__fetch_pages_concurrently(query, sizer, start, limit, max_workers, fetch, budget, retries)
+        return self.__fetch_pages(query, sizer, start, limit, fetch, budget=budget, retries=retries)
+
+    @staticmethod
+    def __held(fetch, budget):
+        """
+        :return: the fetch function holding the successful pages in the memory budget
+        """
+        def fetch_held(query, offset, size):
+            response, page, rows = fetch(query, offset, size)
             if response.status_code == 200:
-                data = self.__handle_http_response(response, export_file, first_query_flag=first_query_flag)
-                if data is not None:
-                    yield data
-                else:
+                budget.hold(page)
+            return response, page, rows
+        return fetch_held
+
+    def __fetch_pages(self, query, sizer, start, limit, fetch, until_full_page=False, budget=None, retries=None):
+        """
+        fetches the pages of the query one after another. Every page starts after the rows actually returned by the
+        previous one, so no rows are skipped if the endpoint truncates the pages. The size of a page that fails with
+        a server error or times out is reduced and the page is requested again
+        :param query: the sparql query string
+        :param sizer: the AdaptivePageSizer of the query
+        :param start: the offset of the first page
+        :param limit: the number of rows to fetch or None to fetch until an empty page
+        :param fetch: the function fetching one page
+        :param until_full_page: if True, stop after the first page that has as many rows as requested
+        :param budget: if provided, every page waits until the pages not consumed yet fit in this MemoryBudget
+        :param retries: the list the pages fetched more than once are recorded in
+        :return: generator of (http response, page, number of rows) in offset order
+        """
+        offset = start
+        remaining = limit
+        while remaining is None or remaining > 0:
+            if budget is not None:
+                budget.admit()
+            size = sizer.next_size(remaining)
+            started = time.time()
+            response, page, rows, size = self.__fetch_with_retries(fetch, query, offset, size, sizer, retries)
+            self._record_page(sizer, size, rows, time.time() - started)
+            yield response, page, rows
+            if rows == 0:
+                return
+            offset += rows
+            if remaining is not None:
+                remaining -= rows
+            if until_full_page and rows >= size:
+                return
+
+    def __fetch_pages_concurrently(self, query, sizer, start, limit, max_workers, fetch, budget=None, retries=None):
+        """
+        fetches the pages of the query from a pool of threads and yields them back in offset order. The first pages
+        are fetched one by one to settle the page size and the server cap. Then pages are fetched ahead
+        speculatively until a page shorter than requested is seen. If such a page was truncated by the endpoint, the
+        rows it missed are fetched before the next page is yielded, and pages are fetched ahead again once a page
+        of the reduced size is full
+        :param query: the sparql query string
+        :param sizer: the AdaptivePageSizer of the query
+        :param start: the offset of the first page
+        :param limit: the number of rows to fetch or None to fetch until an empty page
+        :param max_workers: number of pages fetched in parallel
+        :param fetch: the function fetching one page
+        :param budget: if provided, no more pages are requested while the pages not consumed yet take more memory
+            than this MemoryBudget allows
+        :param retries: the list the pages fetched more than once are recorded in
+        :return: generator of (http response, page, number of rows) in offset order
+        """
+        next_offset = start
+        remaining = limit
+        for response, page, rows in self.__fetch_pages(query, sizer, start, limit, fetch, until_full_page=True,
+                                                       budget=budget, retries=retries):
+            yield response, page, rows
+            if rows == 0:
+                return
+            next_offset += rows
+            if remaining is not None:
+                remaining -= rows
+        if remaining is not None and remaining <= 0:
+            return
+
+        end = next_offset + remaining if remaining is not None else None
+        page_size = sizer.next_size()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = deque()
+        window = max_workers
+        gap = None
+        try:
+            while True:
+                while len(pending) < window and (end is None or next_offset < end):
+                    # the pages already requested are yielded before waiting for the consumer to free memory
+                    if budget is not None and not budget.admit(block=len(pending) == 0):
+                        break
+                    size = page_size if end is None else min(page_size, end - next_offset)
+                    pending.append((next_offset, size, executor.submit(self.__fetch_with_retries, fetch, query,
+                                                                       next_offset, size, None, retries)))
+                    next_offset += size
+                if len(pending) == 0:
                     break
-            else:
-                print("HTTP Response is:\n{}".format(response))
-                break
-            first_query_flag = False
-
-    def __handle_http_response(self, response, export_file, first_query_flag=False):
-        """
-        Given a valid http response, this methods wraps the response text up in the requested format
-        and returns it to the caller
-        :param response: http response object
-        :param export_file: the file path if the results should be exported to a file
-        :return: file name if export to file or the data in the requested format
-        """
-        data = response.text
-        #first_nl = data.find('\n')
-        # header = data[:first_nl]
-        body = data.split("\n", 1)[1]
-
-        if len(body) > 0:
-            if export_file is not None:
-                # In order to skip the header line before appending to file
-                if os.path.exists(export_file):
-                    data = body
-                with open(export_file, 'a+') as exp_file:
-                    exp_file.write(data)
-                    return export_file
-            elif self.return_format == HttpClientDataFormat.PANDAS_DF:
-                #stringio = StringIO(response.text)
-                #return pd.read_csv(stringio, sep=',')
-                if first_query_flag:
-                    return data
+                offset, size, future = pending.popleft()
+                response, page, rows, _ = future.result()
+                if gap is not None and rows > 0:
+                    # the previous page was truncated by the endpoint
+                    gap_offset, gap_rows, truncated_rows = gap
+                    self._record_cap(sizer, truncated_rows)
+                    for missed in self.__fetch_pages(query, sizer, gap_offset, gap_rows, fetch, budget=budget,
+                                                     retries=retries):
+                        yield missed
+                        if missed[2] == 0:
+                            break
+                    page_size = sizer.next_size()
+                gap = None
+                if 0 < rows < size:
+                    # either the end of the results is near or the endpoint truncated the page. stop fetching ahead
+                    window = 1
+                    gap = (offset + rows, size - rows, rows)
+                elif rows >= size:
+                    # the pages fit in the server cap again, fetch ahead
+                    window = max_workers
+                yield response, page, rows
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _start_query(self):
+        """
+        fails fast if the circuit of the endpoint is open
+        :return: the list the pages of this query fetched more than once are recorded in. Queries running at the same
+            time on the client each have their own list
+        """
+        self._breaker().before_request()
+        retries = []
+        self.retried_pages = retries
+        return retries
+
+    @staticmethod
+    def _report_retries(result, retries):
+        """
+        :param result: the result of a query, a dataframe or a SpilledResult
+        :param retries: the list of the query returned by _start_query()
+        :return: the result with the pages that had to be retried in its attrs['retried_pages']
+        """
+        if len(retries) > 0:
+            result.attrs['retried_pages'] = list(retries)
+        return result
+
+    def __fetch_with_retries(self, fetch, query, offset, size, sizer=None, retries=None):
+        """
+        fetches a page, fetching it again after a jittered exponential backoff if it fails with a transient error.
+        Every attempt is admitted by and reported to the circuit breaker of the endpoint, see RetryPolicy.call()
+        :param fetch: the function fetching one page
+        :param query: the sparql query string
+        :param offset: the offset of the page
+        :param size: number of rows of the page
+        :param sizer: if provided, the page size is reduced after a timeout or a server error
+        :param retries: the list the page is recorded in if it is fetched more than once
+        :return: (http response, page, number of rows, the size of the page actually requested)
+        """
+        requested = [size]
+
+        def attempt():
+            size = requested[0]
+            try:
+                response, page, rows = fetch(query, offset, size)
+            except TRANSIENT_ERRORS as e:
+                raise TransientError(e, overloaded=isinstance(e, (requests.exceptions.Timeout, ReadTimeoutError)))
+            if response.status_code == 200:
+                return response, page, rows, size
+            if hasattr(page, 'close'):
+                page.close()
+            error = Exception("HTTP {} {}".format(response.status_code, response.reason))
+            if not RetryPolicy.is_retryable_status(response.status_code):
+                raise Exception("the page at offset {} failed with {}".format(offset, error))
+            raise TransientError(error, overloaded=response.status_code >= 500,
+                                 retry_after=RetryPolicy.retry_after(response.headers))
+
+        def shrink(error):
+            if error.overloaded and sizer is not None and sizer.shrink():
+                # a smaller page is less likely to time out again
+                self.stats.add('pages_shrunk')
+                requested[0] = min(requested[0], sizer.next_size())
+
+        return self.retry_policy.call(attempt, self._breaker(), offset, retries, self.stats, shrink)
+
+    def __fetch_frame(self, query, offset, page_size):
+        """
+        fetches a single page of the query and parses it while it is received
+        :param query: the sparql query string
+        :param offset: the offset of the page
+        :param page_size: number of rows per page
+        :return: (http response, pandas dataframe or None, number of rows)
+        """
+        response, df = self.__post(self._page_params(query, offset, page_size), HttpClient.__read_frame)
+        if response.status_code != 200 or df is None:
+            return response, None, 0
+        return response, df, len(df)
+
+    def __fetch_spooled(self, query, offset, page_size):
+        """
+        fetches a single page of the query into a temporary file that is kept in memory up to _SPOOL_SIZE bytes
+        :return: (http response, temporary file positioned at its start, number of rows)
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE, mode='w+')
+
+        def copy(chunks):
+            # the records are counted, a quoted value may span several lines. The header is one of them
+            counter = CsvRecordCounter()
+            for chunk in chunks:
+                spool.write(chunk)
+                counter.feed(chunk)
+            return max(counter.close() - 1, 0)
+
+        response, rows = self.__post(self._page_params(query, offset, page_size), copy)
+        spool.seek(0)
+        return response, spool, rows if response.status_code == 200 else 0
+
+    @staticmethod
+    def __read_frame(chunks):
+        """
+        parses the CSV text chunks of one page as they are received
+        :return: pandas dataframe or None if the page has no rows
+        """
+        try:
+            df = pd.read_csv(TextChunkReader(chunks), sep=',')
+        except pd.errors.EmptyDataError:
+            return None
+        return df if len(df) > 0 else None
+
+    def __post(self, params, consume=None):
+        """
+        sends a query to the endpoint and reads the response
+        :param params: the http request parameters
+        :param consume: if provided, the function reading the decoded text chunks of a successful response
+        :return: (http response, the result of consume) or (http response, response text) if consume is None or the
+            request failed
+        """
+        headers = {'Accept-Encoding': ACCEPT_ENCODING if self.compression else IDENTITY_ENCODING}
+        endpoint_url = self._acquire_endpoint()
+        started = time.time()
+        succeeded = False
+        try:
+            response = self.__session(endpoint_url).post(endpoint_url, data=params, headers=headers,
+                                                         timeout=self.timeout, stream=True)
+            try:
+                chunks = self.__response_chunks(response)
+                if consume is not None and response.status_code == 200:
+                    result = response, consume(chunks)
                 else:
-                    return body
-            else:
-                return response.text
+                    result = response, ''.join(chunks)
+            finally:
+                response.close()
+            succeeded = not RetryPolicy.is_retryable_status(response.status_code)
+            return result
+        finally:
+            self._release_endpoint(endpoint_url, time.time() - started, succeeded)
+
+    def _acquire_endpoint(self):
+        """
+        chooses the endpoint the next request is sent to
+        :return: the full url of the endpoint
+        """
+        return self.full_endpoint_url
+
+    def _release_endpoint(self, endpoint_url, elapsed, succeeded):
+        """
+        called once a request to an endpoint returned by _acquire_endpoint() is complete
+        :param endpoint_url: the full url of the endpoint
+        :param elapsed: the time the request took in seconds
+        :param succeeded: False if the request failed with a transient error
+        :return: None
+        """
+        pass
+
+    def __response_chunks(self, response):
+        """
+        reads the body of a streamed response, decompressing it chunk by chunk
+        :param response: http response object created with stream=True
+        :return: generator of the decoded text chunks
+        """
+        self.stats.add('pages')
+        chunks = response.raw.stream(_CHUNK_SIZE, decode_content=False)
+        return decode_chunks(chunks, response.headers.get('Content-Encoding'),
+                             charset_of(response.headers.get('Content-Type')), stats=self.stats)
+
+    def _page_params(self, query, offset, page_size):
+        """
+        builds the http request parameters of a single page of the query
+        :param query: the sparql query string
+        :param offset: the offset of the page
+        :param page_size: number of rows per page
+        :return: dict of the request parameters
+        """
+        modified_query = query
+        modified_query = HttpClient.__remove_clause(modified_query, 'LIMIT')
+        modified_query = HttpClient.__remove_clause(modified_query, 'OFFSET')
+        modified_query = HttpClient.__append_clause(modified_query, 'OFFSET', offset)
+        modified_query = HttpClient.__append_clause(modified_query, 'LIMIT', page_size)
+        return self.__query_params(modified_query, page_size)
+
+    def __query_params(self, query, page_size):
+        """
+        :param query: the sparql query string of one page
+        :param page_size: number of rows per page
+        :return: dict of the http request parameters
+        """
+        return {
+            'query': query,
+            'format': HttpClientDataFormat.return_format(self.return_format),
+            'default-graph-uri': self.default_graph_uri,
+            'maxrows': page_size
+        }
 
     def __build_full_url(self):
         """
         if the port number is missing from the url, this method adds it and prepare the full url in one string
         :return: None
         """
-        if self.endpoint_url:
-            url_comps = urlparse(self.endpoint_url)
-            netlocs = url_comps.netloc.split(':')
-            netloc = netlocs[0]
-            port = netlocs[1] if len(netlocs) > 1 else self.port
+        if self.endpoint_url and self.port:
+            self.full_endpoint_url = HttpClient._full_url(self.endpoint_url, self.port)
 
-            self.full_endpoint_url = '{}://{}:{}{}'.format(url_comps.scheme, netloc, port, url_comps.path)
+    @staticmethod
+    def _full_url(endpoint_url, port):
+        """
+        :param endpoint_url: the url of the endpoint
+        :param port: the port number used if the url has none
+        :return: the url of the endpoint including its port number
+        """
+        url_comps = urlparse(endpoint_url)
+        netlocs = url_comps.netloc.split(':')
+        netloc = netlocs[0]
+        port = netlocs[1] if len(netlocs) > 1 else port
+
+        return '{}://{}:{}{}'.format(url_comps.scheme, netloc, port, url_comps.path)
 
     @staticmethod
     def __find_clause(query, clause):
@@ -315,25 +1146,27 @@ class HttpClient(Client):
         query = query.strip(' ;\n')
         return '{} {} {}'.format(query, clause, value)
 
-    def __endpoint_liveness_check(self):
+    def __session(self, endpoint_url):
         """
-        checks if the endpoint is alive
-        :return: True if alive, False if not
+        :return: the keep-alive session shared by all the clients of this endpoint
+        """
+        return HttpSessionPool.get_session(endpoint_url, pool_size=self.pool_size)
+
+    def _breaker(self):
+        """
+        :return: the circuit breaker shared by all the clients of this endpoint
+        """
+        return CircuitBreaker.for_endpoint(self.full_endpoint_url)
+
+    def __endpoint_address(self, endpoint_url):
+        """
+        extracts the host and the port number of an endpoint url. The client's port is used if the url has none
+        :param endpoint_url: the endpoint url
+        :return: (host, port)
         """
-        url_comps = urlparse(self.endpoint_url)
+        url_comps = urlparse(endpoint_url)
         netloc_comps = url_comps.netloc.split(':')
 
         url_port = int(netloc_comps[1]) if len(netloc_comps) == 2 else None
         port = url_port if url_port else self.port
-        url = netloc_comps[0]
-
-        is_valid = False
-
-        if self.endpoint_url and port:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            result = sock.connect_ex((url, port))
-            is_valid = (result == 0)
-
-        if not is_valid:
-            print('missing endpoint data: endpoint {}, port {}'.format(self.endpoint_url, port))
-
+        return netloc_comps[0], port
@@ -0,0 +1,111 @@
+"""
+Shared pool of keep-alive http sessions. One session is kept per endpoint (scheme, host and port) so that all the pages
+of a query, and all the clients talking to the same endpoint, reuse the same sockets instead of opening a new
+connection for every request
+"""
+
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rdfframes.utils.constants import _POOL_SIZE, _HEALTH_CHECK_TTL
+
+
+class HttpSessionPool:
+    """
+    Process-wide registry of keep-alive sessions and cached endpoint health checks
+    """
+    _sessions = {}      # endpoint key: (requests.Session, pool size)
+    _health = {}        # (host, port): (is alive, time of the check)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_session(endpoint_url, pool_size=_POOL_SIZE):
+        """
+        returns the shared session of the endpoint, creating it on first use. If a client asks for a bigger pool than
+        the one already mounted, the pool is enlarged
+        :param endpoint_url: the full url of the sparql endpoint
+        :param pool_size: maximum number of connections kept open to the endpoint
+        :return: requests.Session object
+        """
+        key = HttpSessionPool.endpoint_key(endpoint_url)
+        with HttpSessionPool._lock:
+            session, current_size = HttpSessionPool._sessions.get(key, (None, 0))
+            if session is None:
+                session = requests.Session()
+            if current_size < pool_size:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount('{}://'.format(urlparse(endpoint_url).scheme or 'http'), adapter)
+                current_size = pool_size
+            HttpSessionPool._sessions[key] = (session, current_size)
+            return session
+
+    @staticmethod
+    def close_session(endpoint_url):
+        """
+        closes the sockets of the endpoint's session and removes it from the pool
+        :param endpoint_url: the full url of the sparql endpoint
+        :return: None
+        """
+        key = HttpSessionPool.endpoint_key(endpoint_url)
+        with HttpSessionPool._lock:
+            session, _ = HttpSessionPool._sessions.pop(key, (None, 0))
+        if session is not None:
+            session.close()
+
+    @staticmethod
+    def close_all():
+        """
+        closes all the pooled sessions
+        :return: None
+        """
+        with HttpSessionPool._lock:
+            sessions = list(HttpSessionPool._sessions.values())
+            HttpSessionPool._sessions = {}
+        for session, _ in sessions:
+            session.close()
+
+    @staticmethod
+    def is_alive(host, port, ttl=_HEALTH_CHECK_TTL, timeout=5):
+        """
+        checks if a tcp connection can be opened to the endpoint. The result is cached for ttl seconds
+        :param host: endpoint host name or ip
+        :param port: endpoint port number
+        :param ttl: number of seconds a previous check result is reused
+        :param timeout: connection timeout in seconds
+        :return: True if alive, False if not
+        """
+        key = (host, port)
+        now = time.time()
+        with HttpSessionPool._lock:
+            cached = HttpSessionPool._health.get(key)
+        if cached is not None and now - cached[1] < ttl:
+            return cached[0]
+
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                is_valid = True
+        except (OSError, ValueError):
+            is_valid = False
+
+        with HttpSessionPool._lock:
+            HttpSessionPool._health[key] = (is_valid, time.time())
+        return is_valid
+
+    @staticmethod
+    def invalidate_health(host, port):
+        """
+        forgets the cached health check result of an endpoint
+        :return: None
+        """
+        with HttpSessionPool._lock:
+            HttpSessionPool._health.pop((host, port), None)
+
+    @staticmethod
+    def endpoint_key(endpoint_url):
+        url_comps = urlparse(endpoint_url)
+        return '{}://{}'.format(url_comps.scheme, url_comps.netloc)
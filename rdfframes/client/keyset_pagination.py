@@ -0,0 +1,242 @@
+"""
+Keyset (cursor) pagination of sparql queries. Instead of paging with a growing OFFSET, which makes the endpoint rescan
+all the previous rows for every page, the query is ordered by a key column and every page continues after the last key
+seen with FILTER(str(?key) > "last key")
+"""
+
+import re
+from io import StringIO
+
+import pandas as pd
+
+from rdfframes.client.text_stream import TextChunkReader
+
+
+class KeysetPagination:
+    """
+    Rewrites a SELECT query into pages ordered by one of its columns
+    """
+    _where_regex = re.compile(r'\bWHERE\s*\{', re.IGNORECASE)
+    _select_regex = re.compile(r'\bSELECT\b(.*?)(\bFROM\b|\bWHERE\b|\{)', re.IGNORECASE | re.DOTALL)
+    _limit_regex = re.compile(r'\bLIMIT\s+(\d+)', re.IGNORECASE)
+    _unsafe_modifiers = ('GROUP BY', 'HAVING', 'ORDER BY', 'OFFSET')
+
+    def __init__(self, query, key_column):
+        """
+        :param query: the sparql query string
+        :param key_column: the column (variable name without ?) to order the pages by
+        """
+        self.key_column = key_column.lstrip('?')
+        self.query = query.strip(' \n;')
+        self.body_start, self.body_end = KeysetPagination.__outer_block(self.query)
+        self.tail = self.query[self.body_end + 1:] if self.body_end >= 0 else ''
+        limit = KeysetPagination._limit_regex.search(self.tail)
+        self.limit = int(limit.group(1)) if limit is not None else None
+
+    def is_applicable(self):
+        """
+        checks if the result of the query can be paged by the key column without changing it. This requires that the
+        key is a plain variable projected by the outer query that is always bound, and that the outer query is not
+        grouped, sorted or offset
+        :return: True if keyset pagination is safe for the query, False if OFFSET paging has to be used
+        """
+        if self.body_start < 0 or self.body_end < 0:
+            return False
+        tail = ' '.join(self.tail.upper().split())
+        if any(modifier in tail for modifier in KeysetPagination._unsafe_modifiers):
+            return False
+
+        key_regex = re.compile(r'\?{}\b'.format(re.escape(self.key_column)))
+        select = KeysetPagination._select_regex.search(self.query[:self.body_start + 1])
+        if select is None:
+            return False
+        projection = select.group(1)
+        if re.search(r'\bAS\s+\?{}\b'.format(re.escape(self.key_column)), projection, re.IGNORECASE):
+            return False
+        if key_regex.search(projection) is None and projection.strip().upper() not in ('*', 'DISTINCT *',
+                                                                                       'REDUCED *'):
+            return False
+
+        body = self.query[self.body_start + 1: self.body_end]
+        if re.search(r'\bUNION\b', body, re.IGNORECASE):
+            return False
+        # the key has to be bound by a pattern outside of the OPTIONAL blocks
+        required_body = KeysetPagination.__remove_optionals(body)
+        return key_regex.search(required_body) is not None
+
+    def page_query(self, last_key=None, inclusive=False, page_size=None):
+        """
+        builds the query of the page that continues after last_key
+        :param last_key: the key of the last row of the previous page. None for the first page
+        :param inclusive: if True the page starts at last_key instead of after it
+        :param page_size: the maximum number of rows in the page
+        :return: the query string of the page
+        """
+        condition = None
+        if last_key is not None:
+            condition = 'str(?{}) {} {}'.format(self.key_column, '>=' if inclusive else '>',
+                                               KeysetPagination.__string_literal(last_key))
+        return self.__build(condition, page_size)
+
+    def key_query(self, key, offset, page_size):
+        """
+        builds the query of the rows that have the same key, used when one key has more rows than a page
+        :param key: the key value
+        :param offset: the offset inside the rows of this key
+        :param page_size: the maximum number of rows in the page
+        :return: the query string
+        """
+        condition = 'str(?{}) = {}'.format(self.key_column, KeysetPagination.__string_literal(key))
+        return self.__build(condition, page_size, offset)
+
+    def pages(self, fetch, sizer):
+        """
+        fetches the result of the query page by page
+        :param fetch: callable (query string, page size) returning the page as a pandas dataframe parsed by
+            parse_page, or None if the page is empty
+        :param sizer: the AdaptivePageSizer giving the number of rows of each page
+        :return: generator of pandas dataframes
+        """
+        remaining = self.limit
+        last_key = None
+        inclusive = False
+        # the length of the last page shorter than requested. It is either the last page or the server cap
+        short_page = None
+        while remaining is None or remaining > 0:
+            size = sizer.next_size(remaining)
+            page = fetch(self.page_query(last_key, inclusive, size), size)
+            if page is None or len(page) == 0:
+                return
+            if len(page) < size:
+                capped = sizer.server_cap is not None and size > sizer.server_cap
+                if (short_page is not None and len(page) < short_page) or \
+                        (not capped and sizer.server_cap is not None):
+                    # the page was not truncated by the endpoint, it is the last one
+                    yield self.__restore_key_type(page)
+                    return
+                short_page = len(page)
+
+            keys = page[self.key_column]
+            boundary = keys.iloc[-1]
+            if keys.iloc[0] == boundary:
+                # all the rows of the page have the same key, retrieve all the rows of this key
+                page = self.__key_rows(fetch, boundary, sizer)
+                inclusive = False
+            else:
+                # the rows of the last key may continue in the next page, they are fetched again with it
+                page = page[keys != boundary]
+                inclusive = True
+            last_key = boundary
+            if remaining is not None:
+                page = page.iloc[:remaining]
+                remaining -= len(page)
+            yield self.__restore_key_type(page)
+
+    def parse_page(self, page):
+        """
+        parses a page of CSV results keeping the key column as strings, so the last key is sent back to the endpoint
+        exactly as it was received
+        :param page: the text of the page including the header line, or an iterable of its text chunks
+        :return: pandas dataframe of the page or None if the page is empty
+        """
+        source = StringIO(page) if isinstance(page, str) else TextChunkReader(page)
+        try:
+            df = pd.read_csv(source, sep=',', dtype={self.key_column: str})
+        except pd.errors.EmptyDataError:
+            return None
+        return df if len(df) > 0 else None
+
+    def __restore_key_type(self, page):
+        """
+        converts the key column to numbers if all its values are numeric, as it would be parsed in OFFSET mode
+        """
+        try:
+            keys = pd.to_numeric(page[self.key_column])
+        except (ValueError, TypeError):
+            return page
+        page = page.copy()
+        page[self.key_column] = keys
+        return page
+
+    def __key_rows(self, fetch, key, sizer):
+        frames = []
+        offset = 0
+        while True:
+            size = sizer.next_size()
+            page = fetch(self.key_query(key, offset, size), size)
+            if page is None or len(page) == 0:
+                break
+            frames.append(page)
+            offset += len(page)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def __build(self, condition, page_size=None, offset=None):
+        body = self.query[:self.body_end]
+        if condition is not None:
+            body += '\n\tFILTER ( {} )\n\t'.format(condition)
+        tail = KeysetPagination._limit_regex.sub('', self.tail).rstrip()
+        query = '{}}}{} ORDER BY str(?{})'.format(body, tail, self.key_column)
+        if offset:
+            query += ' OFFSET {}'.format(offset)
+        if page_size is not None:
+            query += ' LIMIT {}'.format(page_size)
+        return query
+
+    @staticmethod
+    def __outer_block(query):
+        """
+        finds the braces of the outer WHERE block
+        :return: (position of the opening brace, position of the closing brace) or (-1, -1)
+        """
+        match = KeysetPagination._where_regex.search(query)
+        if match is None:
+            return -1, -1
+        start = match.end() - 1
+        end = KeysetPagination.__matching_brace(query, start)
+        return start, end
+
+    @staticmethod
+    def __matching_brace(text, start):
+        """
+        :return: the position of the brace closing the one at start, skipping string literals
+        """
+        depth = 0
+        i = start
+        quote = None
+        while i < len(text):
+            c = text[i]
+            if quote is not None:
+                if c == '\\':
+                    i += 1
+                elif c == quote:
+                    quote = None
+            elif c == '"' or c == "'":
+                quote = c
+            elif c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+                if depth == 0:
+                    return i
+            i += 1
+        return -1
+
+    @staticmethod
+    def __remove_optionals(body):
+        """
+        :return: the graph pattern without its OPTIONAL blocks
+        """
+        optional_regex = re.compile(r'\bOPTIONAL\s*\{', re.IGNORECASE)
+        match = optional_regex.search(body)
+        while match is not None:
+            end = KeysetPagination.__matching_brace(body, match.end() - 1)
+            if end < 0:
+                return body[:match.start()]
+            body = body[:match.start()] + body[end + 1:]
+            match = optional_regex.search(body)
+        return body
+
+    @staticmethod
+    def __string_literal(value):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+        return '"{}"'.format(value)
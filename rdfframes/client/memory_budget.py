@@ -0,0 +1,142 @@
+"""
+Backpressure between the pages fetched for a query and their consumer. The pages fetched but not consumed yet are
+counted in bytes, and no more pages are requested while they take more memory than the budget
+"""
+
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class MemoryBudget:
+    """
+    Bounds the memory taken by the pages of one query that are fetched but not consumed yet. Every fetched page is
+    held until the consumer releases it, and admit() pauses the page requests while the held pages and the pages
+    already requested, estimated from the largest page so far, would take more bytes than the budget. A slow consumer
+    slows the fetching down instead of letting the pages pile up. A single page larger than the budget is always
+    admitted once nothing else is held or requested
+    """
+    def __init__(self, max_bytes, stats=None):
+        """
+        :param max_bytes: the number of bytes the held pages may take
+        :param stats: the ClientStats counting the pauses and the time spent waiting
+        """
+        self.max_bytes = max_bytes
+        self.stats = stats
+        self.held_bytes = 0
+        self.peak_bytes = 0
+        self.requested = 0  # pages admitted but not fetched yet
+        self.page_bytes = 0  # the size of the largest page fetched
+        self.closed = False
+        self.__sizes = {}
+        self.__condition = threading.Condition()
+
+    @staticmethod
+    def size_of(page):
+        """
+        :param page: a pandas dataframe, a pyarrow Table or a list of them
+        :return: the number of bytes the page takes in memory
+        """
+        if isinstance(page, (list, tuple)):
+            return sum(MemoryBudget.size_of(frame) for frame in page)
+        if isinstance(page, pd.DataFrame):
+            return int(page.memory_usage(index=False, deep=True).sum())
+        if pa is not None and isinstance(page, pa.Table):
+            return page.nbytes
+        return 0
+
+    def hold(self, page):
+        """
+        counts a fetched page until it is released
+        :param page: a pandas dataframe, a pyarrow Table or a list of them, released one by one. None for a page
+            without rows
+        :return: None
+        """
+        frames = page if isinstance(page, (list, tuple)) else [page]
+        with self.__condition:
+            page_bytes = 0
+            for frame in frames:
+                size = MemoryBudget.size_of(frame)
+                if size > 0:
+                    self.__sizes[id(frame)] = self.__sizes.get(id(frame), 0) + size
+                    page_bytes += size
+            self.held_bytes += page_bytes
+            self.page_bytes = max(self.page_bytes, page_bytes)
+            self.peak_bytes = max(self.peak_bytes, self.held_bytes)
+            self.requested = max(self.requested - 1, 0)
+            self.__condition.notify_all()
+
+    def release(self, page):
+        """
+        uncounts a page once it is consumed and wakes up the page requests waiting for memory
+        :param page: a page or a frame of a page passed to hold()
+        :return: the number of bytes released
+        """
+        frames = page if isinstance(page, (list, tuple)) else [page]
+        with self.__condition:
+            released = sum(self.__sizes.pop(id(frame), 0) for frame in frames)
+            self.held_bytes -= released
+            self.__condition.notify_all()
+        return released
+
+    def transfer(self, held, page):
+        """
+        moves the bytes counted for fetched frames to the frame built from them, e.g. a page filtered or concatenated
+        before it is consumed, so the consumer releases the frame it receives
+        :param held: the list of frames passed to hold()
+        :param page: the frame the consumer will release, or None
+        :return: None
+        """
+        with self.__condition:
+            released = sum(self.__sizes.pop(id(frame), 0) for frame in held)
+            size = MemoryBudget.size_of(page) if page is not None else 0
+            if size > 0:
+                self.__sizes[id(page)] = self.__sizes.get(id(page), 0) + size
+            self.held_bytes += size - released
+            self.peak_bytes = max(self.peak_bytes, self.held_bytes)
+            self.__condition.notify_all()
+
+    def admit(self, block=True):
+        """
+        called before a page is requested. An admitted page is counted as requested until it is passed to hold()
+        :param block: if True, wait until the page fits in the budget. Otherwise return at once
+        :return: True if the page may be requested
+        """
+        with self.__condition:
+            if not self.__fits():
+                self.__count('backpressure_pauses')
+                if not block:
+                    return False
+                started = time.time()
+                while not self.__fits():
+                    self.__condition.wait()
+                self.__count('backpressure_seconds', time.time() - started)
+            self.requested += 1
+            return True
+
+    def close(self):
+        """
+        stops pausing the page requests, e.g. once the consumer stopped iterating
+        :return: None
+        """
+        with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+    def __fits(self):
+        """
+        :return: True if one more page fits in the budget
+        """
+        if self.closed or (self.held_bytes == 0 and self.requested == 0):
+            return True
+        return self.held_bytes + (self.requested + 1) * self.page_bytes <= self.max_bytes
+
+    def __count(self, name, value=1):
+        if self.stats is not None:
+            self.stats.add(name, value)
@@ -0,0 +1,86 @@
+"""
+Per query tuning of the number of rows requested in each page
+"""
+
+from rdfframes.utils.constants import _MIN_PAGE_SIZE, _TARGET_PAGE_LATENCY
+
+
+class AdaptivePageSizer:
+    """
+    Chooses the size of the next page of a query. The size grows while the pages are fetched well under the target
+    latency and shrinks when they take longer or when the endpoint fails or times out. The size never exceeds the
+    result cap of the endpoint once it is known, e.g. Virtuoso's ResultSetMaxRows which silently truncates the pages
+    """
+    def __init__(self, initial_size, max_size, min_size=_MIN_PAGE_SIZE, target_latency=_TARGET_PAGE_LATENCY,
+                 server_cap=None, adaptive=True):
+        """
+        :param initial_size: the size of the first page
+        :param max_size: the largest page size
+        :param min_size: the smallest page size the size shrinks to on failures
+        :param target_latency: the number of seconds a page should take
+        :param server_cap: the maximum number of rows the endpoint returns per request if already known
+        :param adaptive: if False, the size only changes to respect the server cap or on failures
+        """
+        self.max_size = max(max_size, 1)
+        self.min_size = max(min(min_size, self.max_size), 1)
+        self.target_latency = target_latency
+        self.server_cap = server_cap
+        self.adaptive = adaptive
+        self.size = self.__clamp(initial_size)
+        self.__short_page = None
+
+    def next_size(self, remaining=None):
+        """
+        :param remaining: the number of rows left to fetch if the query has a LIMIT
+        :return: the number of rows to request in the next page
+        """
+        if remaining is not None:
+            return max(min(self.size, remaining), 0)
+        return self.size
+
+    def record_page(self, requested, returned, elapsed, detect_cap=True):
+        """
+        updates the page size after a page was fetched. A page shorter than requested is either the last one or was
+        truncated by the endpoint. It was truncated if the page after it still has rows, which reveals the server cap
+        :param requested: the number of rows requested
+        :param returned: the number of rows returned
+        :param elapsed: the time the page took in seconds
+        :param detect_cap: False if the pages don't follow each other, e.g. keyset pages fetching the rows of the
+            last key again, so a short page followed by rows doesn't reveal a cap
+        :return: None
+        """
+        if detect_cap and self.__short_page is not None and returned > 0:
+            self.record_cap(self.__short_page)
+        self.__short_page = returned if detect_cap and 0 < returned < requested else None
+        if not self.adaptive or returned < requested or self.target_latency is None:
+            return
+        if elapsed < self.target_latency / 2.0:
+            self.size = self.__clamp(self.size * 2)
+        elif elapsed > self.target_latency:
+            self.size = self.__clamp(int(self.size * self.target_latency / elapsed))
+
+    def record_cap(self, cap):
+        """
+        records the maximum number of rows the endpoint returns per request
+        :param cap: the number of rows of a truncated page
+        :return: None
+        """
+        if cap >= 1:
+            self.server_cap = cap if self.server_cap is None else min(self.server_cap, cap)
+            self.size = self.__clamp(self.size)
+
+    def shrink(self):
+        """
+        halves the page size after a failed or timed out page
+        :return: True if the size was reduced and the page can be retried, False if it is already the minimum
+        """
+        if self.size <= self.min_size:
+            return False
+        self.size = max(self.size // 2, self.min_size)
+        return True
+
+    def __clamp(self, size):
+        size = max(min(size, self.max_size), self.min_size)
+        if self.server_cap is not None:
+            size = min(size, self.server_cap)
+        return max(size, 1)
@@ -0,0 +1,89 @@
+"""
+Runs a generator in a background thread and keeps a few of its items ready ahead of the consumer
+"""
+
+import queue
+import threading
+
+
+class PrefetchIterator:
+    """
+    Iterator over the items of a generator that is advanced by a background thread. Up to depth items are produced
+    ahead of the consumer. Closing the iterator (or garbage collecting it) stops the producer and closes the
+    generator, so no more items are produced once the consumer stops iterating
+    """
+    _DONE = object()
+
+    def __init__(self, generator, depth=1):
+        """
+        starts producing items of the generator in a background thread
+        :param generator: the generator to advance in the background
+        :param depth: the number of items produced ahead of the consumer
+        """
+        self.generator = generator
+        self.items = queue.Queue(maxsize=max(depth, 1))
+        self.stopped = threading.Event()
+        self.finished = False
+        self.thread = threading.Thread(target=self.__produce, daemon=True)
+        self.thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+        item, error = self.items.get()
+        if item is PrefetchIterator._DONE:
+            self.finished = True
+            self.thread.join()
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    def close(self):
+        """
+        stops the producer thread and closes the generator
+        :return: None
+        """
+        self.stopped.set()
+        self.finished = True
+        # unblock the producer if it is waiting for a free slot
+        while self.thread.is_alive():
+            try:
+                self.items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.thread.join()
+
+    def __del__(self):
+        if not self.finished:
+            self.stopped.set()
+
+    def __produce(self):
+        error = None
+        try:
+            for item in self.generator:
+                if not self.__put(item):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(self.generator, 'close'):
+                self.generator.close()
+        self.__put((PrefetchIterator._DONE, error), wrapped=True)
+
+    def __put(self, item, wrapped=False):
+        """
+        waits for a free slot in the queue unless the consumer stopped
+        :return: True if the item was queued, False if the consumer stopped
+        """
+        entry = item if wrapped else (item, None)
+        while not self.stopped.is_set():
+            try:
+                self.items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
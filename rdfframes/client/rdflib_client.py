@@ -0,0 +1,138 @@
+"""
+Client executing the queries in process with rdflib, on a graph in memory or on RDF files parsed once when the client
+is created. No SPARQL endpoint is needed, e.g. for tests, offline work and small graphs. The results have the same
+columns and types as the results of HttpClient. Requires the rdflib package
+"""
+
+import os
+import re
+from io import BytesIO
+
+import pandas as pd
+
+try:
+    import rdflib
+    from rdflib.graph import ReadOnlyGraphAggregate
+except ImportError:
+    rdflib = None
+
+from rdfframes.client.client import Client
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.result_parsers import SparqlJsonParser, concat_batches
+from rdfframes.utils.constants import _TIMEOUT, _MAX_ROWS
+
+# a FROM or FROM NAMED clause. The query builder separates the graphs of one FROM clause with commas
+FROM_CLAUSE = re.compile(r'\bFROM\s+(NAMED\s+)?(<[^>]*>(?:\s*,\s*<[^>]*>)*)', re.IGNORECASE)
+IRI = re.compile(r'<([^>]*)>')
+GRAPH_PATTERN = re.compile(r'\bGRAPH\s*[<?$]', re.IGNORECASE)
+
+
+class RDFLibClient(Client):
+    """
+    Executes the queries on an rdflib Graph or Dataset in the same process. The FROM clauses of a query select the
+    named graphs of a Dataset it runs on, the graphs the store doesn't have are ignored, so the queries of a
+    KnowledgeGraph run on files that don't name their graph. The FROM clauses are never loaded from the web
+    """
+    def __init__(self, graph_or_files, file_format=None, graph_uri=None,
+                 return_format=HttpClientDataFormat.PANDAS_DF):
+        """
+        :param graph_or_files: an rdflib Graph, ConjunctiveGraph or Dataset, or the path of an RDF file or a list of
+            paths. The files are parsed once into an rdflib Dataset whose default graph is the union of its graphs
+        :param file_format: the rdflib format of the files, e.g. turtle, nt or trig. If None, it is guessed from the
+            file extensions
+        :param graph_uri: the named graph the triples of the files are parsed into, e.g. the graph_uri of the
+            KnowledgeGraph, for queries with GRAPH clauses. If None, the default graph
+        :param return_format: the default format of the results. Options from HttpClientDataFormat: JSON and TSV
+            results are typed after the xsd datatypes of the values, the others are parsed from CSV
+        """
+        if rdflib is None:
+            raise Exception("RDFLibClient requires the rdflib package. Install it with: pip install rdflib")
+        super(RDFLibClient, self).__init__(None)
+        self.return_format = return_format
+        if isinstance(graph_or_files, rdflib.Graph):
+            self.graph = graph_or_files
+            self.endpoint = 'rdflib:{}'.format(graph_or_files.identifier)
+        else:
+            paths = [graph_or_files] if isinstance(graph_or_files, (str, os.PathLike)) else list(graph_or_files)
+            self.graph = rdflib.Dataset(default_union=True)
+            target = self.graph if graph_uri is None else self.graph.graph(rdflib.URIRef(graph_uri))
+            for path in paths:
+                target.parse(os.fspath(path), format=file_format)
+            self.endpoint = 'file:' + ','.join(os.path.abspath(path) for path in paths)
+
+    def get_endpoint(self):
+        """
+        :return: a string identifying the graph or the files the queries run on
+        """
+        return self.endpoint
+
+    def is_alive(self, endpoint=None):
+        """
+        :return: True, the graph is in memory
+        """
+        return True
+
+    def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None,
+                      file_format=None):
+        """
+        executes a SELECT query on the graph. rdflib has no query timeout, timeout and limit are ignored
+        :param query: the SPARQL query as string
+        :param return_format: the format of the result, see HttpClient.execute_query(). If None, the client's
+            return format
+        :param output_file: if provided, the result is saved to this file path instead of being returned
+        :param file_format: the format of output_file, one of FileFormat. If None, it is chosen by the file extension
+        :return: pandas dataframe of the result, or the path of output_file. If the client has a cache, a cached
+            result is returned without executing the query
+        """
+        return_format = return_format if return_format is not None else self.return_format
+        cache_key, df = self._cached_result(query, *self._cache_parts(return_format))
+        if df is None:
+            df = self.__select(query, return_format)
+            self._cache_result(cache_key, query, df)
+        if output_file is not None:
+            return HttpClient._write_cached(df, output_file, file_format)
+        return df
+
+    def _cache_parts(self, return_format=None):
+        return_format = return_format if return_format is not None else self.return_format
+        return HttpClient._result_kind(return_format),
+
+    def __select(self, query, return_format):
+        """
+        :return: pandas dataframe of the result of a SELECT query, parsed from the SPARQL JSON or CSV results like
+            HttpClient does
+        """
+        graph, query = self.__graph_of(query)
+        result = graph.query(query)
+        if result.type != 'SELECT':
+            raise Exception("RDFLibClient only executes SELECT queries, got a {} query".format(result.type))
+        if HttpClientDataFormat.result_parser(return_format) is not None:
+            # rdflib has no TSV results serializer, the TSV results are typed the same way from JSON
+            return concat_batches(list(SparqlJsonParser().parse([result.serialize(format='json').decode('utf-8')])))
+        data = result.serialize(format='csv')
+        if len(data.strip()) == 0:
+            return pd.DataFrame()
+        return pd.read_csv(BytesIO(data), sep=',')
+
+    def __graph_of(self, query):
+        """
+        removes the FROM clauses of a query
+        :return: (the graph to run the query on, the query without FROM clauses)
+        """
+        brace = query.find('{')
+        head, body = (query[:brace], query[brace:]) if brace >= 0 else (query, '')
+        graphs = []
+
+        def remove(match):
+            if match.group(1) is None:
+                graphs.extend(IRI.findall(match.group(2)))
+            return ''
+        query = FROM_CLAUSE.sub(remove, head) + body
+        if len(graphs) == 0 or not hasattr(self.graph, 'contexts') or GRAPH_PATTERN.search(body):
+            # GRAPH clauses are matched against all the named graphs
+            return self.graph, query
+        named_graphs = self.graph.graphs() if isinstance(self.graph, rdflib.Dataset) else self.graph.contexts()
+        contexts = [context for context in named_graphs if str(context.identifier) in graphs]
+        if len(contexts) == 0:
+            return self.graph, query
+        return (contexts[0] if len(contexts) == 1 else ReadOnlyGraphAggregate(contexts)), query
@@ -0,0 +1,121 @@
+"""
+Http client that spreads the pages of a query across several equivalent SPARQL endpoints, e.g. read replicas of the
+same store
+"""
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.http_session_pool import HttpSessionPool
+from rdfframes.client.replica_pool import ReplicaPool
+from rdfframes.client.retry_policy import CircuitBreaker
+from rdfframes.utils.constants import _TIMEOUT, _MAX_ROWS, _POOL_SIZE, _HEALTH_CHECK_TTL, _TARGET_PAGE_LATENCY, \
+    _MAX_RETRIES, _REPLICA_MAX_FAILURES, _REPLICA_EJECTION_TIME, _REPLICA_SLOW_FACTOR
+
+
+class ReplicaHttpClient(HttpClient):
+    """
+    Submits SPARQL queries to a pool of equivalent endpoints. Every page is sent to the replica with the fewest
+    requests in flight, so the pages fetched in parallel are spread over the replicas. Replicas failing their health
+    check, failing several requests in a row or much slower than the others are ejected for a while, and a failed page
+    is retried on another replica
+    """
+    def __init__(self,
+                 endpoint_urls,
+                 port=8890,
+                 return_format=HttpClientDataFormat.DEFAULT,
+                 timeout=120,
+                 default_graph_uri='',
+                 max_rows=_MAX_ROWS,
+                 pool_size=_POOL_SIZE,
+                 health_check_ttl=_HEALTH_CHECK_TTL,
+                 compression=True,
+                 target_latency=_TARGET_PAGE_LATENCY,
+                 max_retries=_MAX_RETRIES,
+                 max_failures=_REPLICA_MAX_FAILURES,
+                 ejection_time=_REPLICA_EJECTION_TIME,
+                 slow_factor=_REPLICA_SLOW_FACTOR):
+        """
+        Initializes a client object with the URIs of the replicas
+        :param endpoint_urls: list of the urls of the equivalent endpoints
+        :param port: the port number of the endpoints whose url has none
+        :param max_failures: the number of consecutive failed requests that eject a replica
+        :param ejection_time: the number of seconds an ejected replica receives no requests
+        :param slow_factor: a replica is ejected if its average page time is this many times the average of the
+            other replicas. None to never eject slow replicas
+        The other parameters are the ones of HttpClient
+        """
+        if isinstance(endpoint_urls, str):
+            endpoint_urls = [endpoint_urls]
+        if len(endpoint_urls) == 0:
+            raise Exception("ReplicaHttpClient needs at least one endpoint url")
+        self.replica_pool = None
+        self.endpoint_urls = list(endpoint_urls)
+        super(ReplicaHttpClient, self).__init__(endpoint_urls[0], port=port, return_format=return_format,
+                                                timeout=timeout, default_graph_uri=default_graph_uri,
+                                                max_rows=max_rows, pool_size=pool_size,
+                                                health_check_ttl=health_check_ttl, compression=compression,
+                                                target_latency=target_latency, max_retries=max_retries)
+        self.replica_pool = ReplicaPool([HttpClient._full_url(url, port) for url in self.endpoint_urls],
+                                        health_check_ttl=health_check_ttl, max_failures=max_failures,
+                                        ejection_time=ejection_time, slow_factor=slow_factor)
+        # the pool as a whole is suspended only when the requests keep failing on all the replicas
+        self.breaker = CircuitBreaker()
+
+    def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None,
+                      max_workers=None, key_column=None, file_format=None, memory_budget=None, scratch_dir=None,
+                      categorical=None, downcast=False):
+        """
+        submits the provided SPARQL query to the replicas. See HttpClient.execute_query
+        :param max_workers: number of pages fetched in parallel. If None, one per active replica
+        """
+        return super(ReplicaHttpClient, self).execute_query(query, timeout=timeout, limit=limit,
+                                                            return_format=return_format, output_file=output_file,
+                                                            max_workers=self.__workers(max_workers),
+                                                            key_column=key_column, file_format=file_format,
+                                                            memory_budget=memory_budget, scratch_dir=scratch_dir,
+                                                            categorical=categorical, downcast=downcast)
+
+    def iter_batches(self, query, batch_rows=None, timeout=_TIMEOUT, max_workers=None, key_column=None,
+                     return_format=None, memory_budget=None, categorical=None, downcast=False):
+        """
+        executes the query and yields its result one page at a time. See HttpClient.iter_batches
+        :param max_workers: number of pages fetched in parallel. If None, one per active replica
+        """
+        return super(ReplicaHttpClient, self).iter_batches(query, batch_rows=batch_rows, timeout=timeout,
+                                                           max_workers=self.__workers(max_workers),
+                                                           key_column=key_column, return_format=return_format,
+                                                           memory_budget=memory_budget, categorical=categorical,
+                                                           downcast=downcast)
+
+    def is_alive(self, endpoint=None):
+        """
+        :param endpoint: the url of the endpoint to check. If None, checks if any replica accepts connections
+        :return: True if alive, False if not
+        """
+        if endpoint is not None or self.replica_pool is None:
+            return super(ReplicaHttpClient, self).is_alive(endpoint)
+        return any(super(ReplicaHttpClient, self).is_alive(url) for url in self.replica_pool.urls())
+
+    def close(self):
+        """
+        closes the pooled connections to all the replicas
+        :return: None
+        """
+        for url in self.replica_pool.urls():
+            HttpSessionPool.close_session(url)
+
+    def _acquire_endpoint(self):
+        return self.replica_pool.acquire()
+
+    def _release_endpoint(self, endpoint_url, elapsed, succeeded):
+        self.replica_pool.release(endpoint_url, elapsed, succeeded)
+
+    def _breaker(self):
+        return self.breaker
+
+    def __workers(self, max_workers):
+        """
+        :return: the number of pages fetched in parallel
+        """
+        if max_workers is not None:
+            return max_workers
+        return max(self.replica_pool.active_count(), 1)
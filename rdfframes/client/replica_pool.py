@@ -0,0 +1,146 @@
+"""
+Load balancing of requests across equivalent SPARQL endpoints (read replicas of the same store). Each request goes to
+the replica with the fewest requests in flight. Replicas that fail their health check, fail several requests in a row
+or answer much slower than the others are ejected for a while
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+from rdfframes.client.http_session_pool import HttpSessionPool
+from rdfframes.utils.constants import _HEALTH_CHECK_TTL, _REPLICA_MAX_FAILURES, _REPLICA_EJECTION_TIME, \
+    _REPLICA_SLOW_FACTOR
+
+
+class Replica:
+    """
+    State of one endpoint of the pool
+    """
+    def __init__(self, url):
+        """
+        :param url: the full url of the endpoint
+        """
+        self.url = url
+        self.outstanding = 0
+        self.latency = None      # moving average of the request time in seconds
+        self.failures = 0        # consecutive failed requests
+        self.ejected_until = 0
+        self.requests = 0
+
+    def is_ejected(self, now):
+        return self.ejected_until > now
+
+    def __repr__(self):
+        return 'Replica({}, outstanding={}, latency={}, failures={})'.format(self.url, self.outstanding, self.latency,
+                                                                            self.failures)
+
+
+class ReplicaPool:
+    """
+    Least-outstanding-requests balancer over a list of equivalent endpoints
+    """
+    def __init__(self, endpoint_urls, health_check_ttl=_HEALTH_CHECK_TTL, max_failures=_REPLICA_MAX_FAILURES,
+                 ejection_time=_REPLICA_EJECTION_TIME, slow_factor=_REPLICA_SLOW_FACTOR):
+        """
+        :param endpoint_urls: list of the full urls of the endpoints
+        :param health_check_ttl: number of seconds a health check result is reused
+        :param max_failures: the number of consecutive failed requests that eject a replica
+        :param ejection_time: the number of seconds an ejected replica receives no requests
+        :param slow_factor: a replica is ejected if its average request time is this many times the average of the
+            other replicas. None to never eject slow replicas
+        """
+        if len(endpoint_urls) == 0:
+            raise Exception("a replica pool needs at least one endpoint")
+        self.replicas = [Replica(url) for url in endpoint_urls]
+        self.health_check_ttl = health_check_ttl
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self.slow_factor = slow_factor
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """
+        chooses the replica of the next request: the healthy replica with the fewest requests in flight, the fastest
+        one on ties. If all the replicas are ejected, the one whose ejection ends first is used
+        :return: the url of the replica
+        """
+        healthy = self.__healthy_urls()
+        with self.__lock:
+            now = time.time()
+            candidates = [r for r in self.replicas if not r.is_ejected(now) and r.url in healthy]
+            if len(candidates) == 0:
+                candidates = [min(self.replicas, key=lambda r: r.ejected_until)]
+            replica = min(candidates, key=lambda r: (r.outstanding, r.latency if r.latency is not None else 0,
+                                                     r.requests))
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica.url
+
+    def release(self, url, elapsed, succeeded):
+        """
+        records the outcome of a request sent to a replica
+        :param url: the url returned by acquire()
+        :param elapsed: the time the request took in seconds
+        :param succeeded: False if the request failed with a transient error
+        :return: None
+        """
+        with self.__lock:
+            replica = self.__replica(url)
+            replica.outstanding = max(replica.outstanding - 1, 0)
+            now = time.time()
+            if not succeeded:
+                replica.failures += 1
+                if replica.failures >= self.max_failures:
+                    self.__eject(replica, now)
+                return
+            replica.failures = 0
+            replica.latency = elapsed if replica.latency is None else 0.8 * replica.latency + 0.2 * elapsed
+            if self.slow_factor is not None and self.__is_slow(replica, now):
+                self.__eject(replica, now)
+
+    def active_count(self):
+        """
+        :return: the number of replicas that are not ejected
+        """
+        healthy = self.__healthy_urls()
+        with self.__lock:
+            now = time.time()
+            return sum(1 for r in self.replicas if not r.is_ejected(now) and r.url in healthy)
+
+    def urls(self):
+        return [r.url for r in self.replicas]
+
+    def __is_slow(self, replica, now):
+        """
+        :return: True if the replica is much slower than the average of the other active replicas
+        """
+        others = [r.latency for r in self.replicas
+                  if r is not replica and r.latency is not None and not r.is_ejected(now)]
+        if len(others) == 0:
+            return False
+        return replica.latency > self.slow_factor * (sum(others) / len(others))
+
+    def __eject(self, replica, now):
+        replica.ejected_until = now + self.ejection_time
+        replica.failures = 0
+        # the replica starts over once it is back, its old request times are not relevant anymore
+        replica.latency = None
+
+    def __replica(self, url):
+        for replica in self.replicas:
+            if replica.url == url:
+                return replica
+        raise Exception("{} is not a replica of the pool".format(url))
+
+    def __healthy_urls(self):
+        """
+        :return: the set of the urls of the replicas accepting connections. The checks are cached by HttpSessionPool
+        """
+        healthy = set()
+        for replica in self.replicas:
+            url_comps = urlparse(replica.url)
+            if url_comps.port is None or HttpSessionPool.is_alive(url_comps.hostname, url_comps.port,
+                                                                  ttl=self.health_check_ttl):
+                healthy.add(replica.url)
+        return healthy
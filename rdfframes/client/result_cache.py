@@ -0,0 +1,398 @@
+"""
+Persistent cache of query results on disk. The results are stored as Feather or Parquet files in a directory together
+with an index recording when every entry expires and when it was last used. The cache is bounded in bytes, the least
+recently used entries are evicted first. Several processes can share a cache directory: the index is written under a
+lock of the directory. A lookup only reads the index and the file of its entry, the times the entries were used are
+kept in memory and written to the index with the next result, or after ACCESS_FLUSH_INTERVAL seconds. Requires the
+pyarrow package
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from rdfframes.utils.constants import _CACHE_MAX_BYTES, _CACHE_TTL
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+# the number of seconds after which a temporary file is considered left behind by a writer that crashed
+ORPHAN_AGE = 3600
+# the number of seconds the last uses of the entries are kept in memory before they are written to the index
+ACCESS_FLUSH_INTERVAL = 60
+GRAPH_PATTERN = re.compile(r'(?:FROM(?:\s+NAMED)?|GRAPH)\s*<([^>]*)>', re.IGNORECASE)
+
+
+class CacheFormat:
+    FEATHER = 'feather'
+    PARQUET = 'parquet'
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of query results with a time to live per entry. An entry is keyed by the hash of the
+    normalized query text, the endpoint, the default graph and the format of the result
+    """
+    def __init__(self, directory, max_bytes=_CACHE_MAX_BYTES, ttl=_CACHE_TTL, file_format=CacheFormat.FEATHER):
+        """
+        :param directory: the directory of the cache files. Created if it does not exist
+        :param max_bytes: the maximum total size of the cached files
+        :param ttl: the default number of seconds an entry is valid. None for entries that never expire
+        :param file_format: the format of the cached files, one of CacheFormat
+        """
+        if pyarrow is None:
+            raise Exception("ResultCache requires the pyarrow package. Install it with: pip install pyarrow")
+        if file_format not in (CacheFormat.FEATHER, CacheFormat.PARQUET):
+            raise Exception("cache format {} is unimplemented".format(file_format))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.file_format = file_format
+        self.__lock = threading.Lock()
+        # the times the entries were used since the index was last written, by key
+        self.__accessed = {}
+        self.__accessed_lock = threading.Lock()
+        self.__flushed = time.time()
+        os.makedirs(directory, exist_ok=True)
+        with self.__locked_index() as index:
+            self.__sweep(index, time.time())
+
+    @staticmethod
+    def normalize_query(query):
+        """
+        collapses the white space of a query outside of its string literals and removes the trailing
+        separator, so that formatting differences don't change the cache key
+        :param query: the sparql query string
+        :return: the normalized query string
+        """
+        normalized = []
+        quote = None
+        escaped = False
+        space = False
+        for char in query.strip(' \t\r\n;'):
+            if quote is not None:
+                normalized.append(char)
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == quote:
+                    quote = None
+                continue
+            if char.isspace():
+                space = True
+                continue
+            if space and len(normalized) > 0:
+                normalized.append(' ')
+            space = False
+            normalized.append(char)
+            if char in ('"', "'"):
+                quote = char
+        return ''.join(normalized)
+
+    @staticmethod
+    def key(query, endpoint, default_graph='', *parts):
+        """
+        :param query: the sparql query string
+        :param endpoint: the url of the endpoint
+        :param default_graph: the default graph uri of the requests
+        :param parts: other values the result depends on, e.g. its format
+        :return: the cache key of the query result
+        """
+        values = [ResultCache.normalize_query(query), endpoint or '', default_graph or ''] + [str(p) for p in parts]
+        return hashlib.sha256('\x00'.join(values).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        :param key: the cache key
+        :return: the cached pandas dataframe or None if the key is missing or expired
+        """
+        entry = self.__load_index().get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if self.__is_expired(entry, now):
+            with self.__locked_index() as index:
+                self.__remove(index, key, entry['file'])
+            return None
+        try:
+            df = self.__read(os.path.join(self.directory, entry['file']))
+        except (OSError, pyarrow.ArrowException):
+            # the file was removed or is corrupt. Drop the entry and let the query run again
+            with self.__locked_index() as index:
+                self.__remove(index, key, entry['file'])
+            return None
+        with self.__accessed_lock:
+            self.__accessed[key] = now
+            flush = now - self.__flushed >= ACCESS_FLUSH_INTERVAL
+        if flush:
+            with self.__locked_index() as index:
+                self.__flush_accesses(index)
+        df.attrs.update(entry.get('attrs', {}))
+        return df
+
+    def put(self, key, df, query=None, endpoint=None, default_graph=None, ttl=None):
+        """
+        stores a query result, evicting the least recently used entries if the cache gets over max_bytes
+        :param key: the cache key
+        :param df: pandas dataframe of the result
+        :param query: the sparql query string, used to find the graphs it reads for invalidate()
+        :param endpoint: the url of the endpoint
+        :param default_graph: the default graph uri of the requests
+        :param ttl: the number of seconds this entry is valid. If None, the cache's ttl is used
+        :return: None
+        """
+        name = '{}.{}'.format(key, self.file_format)
+        temp_path = os.path.join(self.directory, '.{}.{}.part'.format(name, uuid.uuid4().hex[:12]))
+        try:
+            self.__write(df, temp_path)
+        except (pyarrow.ArrowException, ValueError, TypeError):
+            # columns that arrow can't store, e.g. mixed objects. The result is just not cached
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        ttl = ttl if ttl is not None else self.ttl
+        graphs = set(GRAPH_PATTERN.findall(query)) if query is not None else set()
+        if default_graph:
+            graphs.add(default_graph)
+        # the file is moved in place and indexed together, so it is never seen unlisted by another process
+        with self.__locked_index() as index:
+            now = time.time()
+            os.replace(temp_path, os.path.join(self.directory, name))
+            index[key] = {
+                'file': name,
+                'size': os.path.getsize(os.path.join(self.directory, name)),
+                'created': now,
+                'expires': now + ttl if ttl is not None else None,
+                'last_access': now,
+                'endpoint': endpoint,
+                'graphs': sorted(graphs),
+                'attrs': ResultCache.__serializable_attrs(df.attrs)
+            }
+            self.__flush_accesses(index)
+            # the entries whose file was removed are dropped before the size of the cache is counted
+            self.__sweep(index, now)
+            self.__evict(index, now)
+
+    def invalidate(self, graph=None, endpoint=None):
+        """
+        removes the entries of a graph or of an endpoint. With no arguments the whole cache is cleared
+        :param graph: the uri of a graph. Removes the entries of the queries reading this graph
+        :param endpoint: the url of an endpoint. Removes the entries of the queries sent to this endpoint
+        :return: the number of entries removed
+        """
+        with self.__locked_index() as index:
+            keys = [key for key, entry in index.items()
+                    if (graph is None or graph in entry['graphs']) and
+                    (endpoint is None or entry['endpoint'] == endpoint)]
+            for key in keys:
+                self.__remove(index, key)
+        return len(keys)
+
+    def clear(self):
+        """
+        removes all the entries
+        :return: None
+        """
+        self.invalidate()
+
+    def size(self):
+        """
+        :return: the total size of the cached files in bytes
+        """
+        return sum(entry['size'] for entry in self.__existing_entries())
+
+    def __len__(self):
+        return len(self.__existing_entries())
+
+    def __contains__(self, key):
+        entry = self.__load_index().get(key)
+        return entry is not None and not self.__is_expired(entry, time.time()) and \
+            os.path.exists(os.path.join(self.directory, entry['file']))
+
+    def __existing_entries(self):
+        """
+        :return: the entries of the index whose file exists
+        """
+        names = set(os.listdir(self.directory))
+        return [entry for entry in self.__load_index().values() if entry['file'] in names]
+
+    def __flush_accesses(self, index):
+        """
+        writes the times the entries were used since the last flush to the index
+        """
+        with self.__accessed_lock:
+            accessed, self.__accessed = self.__accessed, {}
+            self.__flushed = time.time()
+        for key, last_access in accessed.items():
+            if key in index:
+                index[key]['last_access'] = max(index[key]['last_access'], last_access)
+
+    def __evict(self, index, now):
+        """
+        removes the expired entries, then the least recently used ones until the cache fits in max_bytes
+        """
+        for key in [key for key, entry in index.items() if self.__is_expired(entry, now)]:
+            self.__remove(index, key)
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]['size']
+            self.__remove(index, key)
+
+    def __sweep(self, index, now):
+        """
+        removes the entries whose file is missing, the result files the index doesn't list, e.g. left by a process
+        that crashed before indexing them, and the temporary files of writes that never completed
+        """
+        names = os.listdir(self.directory)
+        present = set(names)
+        for key in [key for key, entry in index.items() if entry['file'] not in present]:
+            del index[key]
+        listed = {entry['file'] for entry in index.values()}
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.part'):
+                    if os.path.getmtime(path) < now - ORPHAN_AGE:
+                        os.remove(path)
+                elif name.endswith(('.' + CacheFormat.FEATHER, '.' + CacheFormat.PARQUET)) and name not in listed:
+                    os.remove(path)
+            except OSError:
+                # removed by another process in the meantime
+                pass
+
+    def __remove(self, index, key, file_name=None):
+        """
+        removes an entry and its file
+        :param file_name: if provided, the entry is only removed if it still has this file
+        """
+        entry = index.get(key)
+        if entry is None or (file_name is not None and entry['file'] != file_name):
+            return
+        del index[key]
+        path = os.path.join(self.directory, entry['file'])
+        if os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def __is_expired(entry, now):
+        return entry['expires'] is not None and entry['expires'] <= now
+
+    def __read(self, path):
+        if self.file_format == CacheFormat.PARQUET:
+            return pd.read_parquet(path)
+        return pd.read_feather(path)
+
+    def __write(self, df, path):
+        # arrow files need string column names and no index
+        df = df.reset_index(drop=True)
+        df.columns = [str(c) for c in df.columns]
+        if self.file_format == CacheFormat.PARQUET:
+            df.to_parquet(path, index=False)
+        else:
+            df.to_feather(path)
+
+    @staticmethod
+    def __serializable_attrs(attrs):
+        """
+        :return: the dataframe attributes that can be saved in the index, e.g. the datatypes of typed results
+        """
+        serializable = {}
+        for name, value in attrs.items():
+            if name == 'retried_pages':
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            serializable[name] = value
+        return serializable
+
+    def __load_index(self):
+        """
+        :return: the index of the cache directory. The entries whose file is missing are dropped by __sweep()
+        """
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __save_index(self, index):
+        """
+        writes the index to a temporary file renamed over the old one, so a crash never leaves a partial index and
+        the readers without the lock always see a complete one
+        """
+        path = os.path.join(self.directory, INDEX_FILE)
+        temp_path = '{}.{}.part'.format(path, uuid.uuid4().hex[:12])
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(temp_path, path)
+
+    @contextlib.contextmanager
+    def __locked_index(self):
+        """
+        locks the cache directory against the other threads and processes and loads the current index, so the
+        changes of the other processes are merged instead of overwritten. The index is saved if it was changed
+        :return: context manager giving the index as a dictionary
+        """
+        with self.__lock, _DirectoryLock(os.path.join(self.directory, LOCK_FILE)):
+            index = self.__load_index()
+            loaded = json.dumps(index, sort_keys=True)
+            yield index
+            if json.dumps(index, sort_keys=True) != loaded:
+                self.__save_index(index)
+
+
+class _DirectoryLock:
+    """
+    Exclusive lock of a cache directory shared by the processes using it, taken on a lock file. Without fcntl or
+    msvcrt, only the threads of one process are synchronized
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
@@ -0,0 +1,446 @@
+"""
+Incremental parsers of the SPARQL JSON (application/sparql-results+json) and TSV (text/tab-separated-values) result
+formats. The parsers are fed the response text chunk by chunk and emit the rows in pandas dataframe batches, converting
+the values to python types according to their xsd datatypes while parsing
+"""
+
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+
+_XSD = 'http://www.w3.org/2001/XMLSchema#'
+_RDF_LANG_STRING = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#langString'
+
+_INTEGER_TYPES = {_XSD + t for t in ('integer', 'int', 'long', 'short', 'byte', 'nonNegativeInteger',
+                                     'nonPositiveInteger', 'negativeInteger', 'positiveInteger', 'unsignedLong',
+                                     'unsignedInt', 'unsignedShort', 'unsignedByte')}
+_FLOAT_TYPES = {_XSD + t for t in ('decimal', 'double', 'float')}
+_BOOLEAN_TYPE = _XSD + 'boolean'
+_DATETIME_TYPES = {_XSD + t for t in ('dateTime', 'date', 'dateTimeStamp')}
+# the dtypes of the datatypes whose values have a bounded size, the other integers are int64 and the other floats
+# float64
+_DATATYPE_DTYPES = {_XSD + 'long': 'int64', _XSD + 'int': 'int32', _XSD + 'short': 'int16', _XSD + 'byte': 'int8',
+                    _XSD + 'unsignedLong': 'uint64', _XSD + 'unsignedInt': 'uint32',
+                    _XSD + 'unsignedShort': 'uint16', _XSD + 'unsignedByte': 'uint8', _XSD + 'float': 'float32'}
+# string columns with at most this ratio of distinct values to rows are made categorical by downcast_columns()
+_CATEGORY_RATIO = 0.5
+
+URI = 'uri'
+BNODE = 'bnode'
+
+
+def convert_term(value, datatype=None):
+    """
+    converts the lexical value of a literal to a python value according to its datatype
+    :param value: the lexical form of the literal
+    :param datatype: the datatype IRI of the literal
+    :return: (converted value, kind) where kind is one of int, float, bool, datetime or str
+    """
+    try:
+        if datatype in _INTEGER_TYPES:
+            return int(value), 'int'
+        if datatype in _FLOAT_TYPES:
+            return float(value), 'float'
+        if datatype == _BOOLEAN_TYPE:
+            return value.strip() in ('true', '1'), 'bool'
+    except ValueError:
+        return value, 'str'
+    if datatype in _DATETIME_TYPES:
+        return value, 'datetime'
+    return value, 'str'
+
+
+class ResultParser:
+    """
+    Base class of the incremental result parsers. The rows are collected column by column and emitted as a pandas
+    dataframe every batch_rows rows. Each column is typed after the kind of its values: numeric literals give numeric
+    columns, dates give datetime columns and anything mixed is kept as python objects. The datatype IRI and the
+    language tag of each column, when they are the same for all its values, are kept in the dataframe's attrs under
+    'datatypes' and 'languages'
+    """
+    def __init__(self, batch_rows=10000, downcast=False):
+        """
+        :param batch_rows: the number of rows in each emitted dataframe
+        :param downcast: if True, the columns of a datatype of bounded size get its dtype, e.g. int32 for xsd:int and
+            float32 for xsd:float, and the numeric columns are downcast to the smallest dtype holding their values
+        """
+        self.batch_rows = batch_rows
+        self.downcast = downcast
+        self.columns = None
+        self.rows = 0
+        self.buffer = ''
+        self.__batches = []
+        self.__values = None
+        self.__kinds = None
+        self.__datatypes = None
+        self.__languages = None
+        self.__batch_size = 0
+
+    def feed(self, text):
+        """
+        parses a chunk of the response text
+        :param text: the next chunk of the response
+        :return: list of the pandas dataframes completed by this chunk
+        """
+        self.buffer += text
+        self._parse(final=False)
+        return self.__take_batches()
+
+    def close(self):
+        """
+        parses the rest of the response
+        :return: list of the remaining pandas dataframes
+        """
+        self._parse(final=True)
+        self.__flush()
+        return self.__take_batches()
+
+    def parse(self, chunks):
+        """
+        parses a whole response
+        :param chunks: iterable of the response text chunks
+        :return: generator of pandas dataframes
+        """
+        for chunk in chunks:
+            for batch in self.feed(chunk):
+                yield batch
+        for batch in self.close():
+            yield batch
+
+    def _parse(self, final):
+        """
+        consumes the complete rows at the start of self.buffer
+        :param final: True if no more text will be fed
+        :return: None
+        """
+        raise NotImplementedError("Every parser must implement _parse()")
+
+    def _set_columns(self, columns):
+        self.columns = list(columns)
+        self.__reset()
+
+    def _add_row(self, terms):
+        """
+        :param terms: dict of column name to (value, kind, datatype, language) of the bound columns of one row
+        :return: None
+        """
+        for column in terms:
+            if column not in self.__values:
+                # a variable missing from the head. Add it as an unbound column
+                self.columns.append(column)
+                self.__values[column] = [None] * self.__batch_size
+                self.__kinds[column] = None
+                self.__datatypes[column] = None
+                self.__languages[column] = None
+        for column in self.columns:
+            term = terms.get(column)
+            if term is None:
+                self.__values[column].append(None)
+                continue
+            value, kind, datatype, language = term
+            self.__values[column].append(value)
+            self.__kinds[column] = ResultParser.__merge(self.__kinds[column], kind)
+            self.__datatypes[column] = ResultParser.__merge(self.__datatypes[column], datatype)
+            self.__languages[column] = ResultParser.__merge(self.__languages[column], language)
+        self.__batch_size += 1
+        self.rows += 1
+        if self.__batch_size >= self.batch_rows:
+            self.__flush()
+
+    def __flush(self):
+        if self.columns is None or self.__batch_size == 0:
+            return
+        df = pd.DataFrame({column: ResultParser.__typed_column(self.__values[column], self.__kinds[column],
+                                                               self.__datatypes[column] if self.downcast else None)
+                           for column in self.columns}, columns=self.columns)
+        if self.downcast:
+            df = downcast_columns(df, categorical=False)
+        df.attrs['datatypes'] = {c: d for c, d in self.__datatypes.items() if d not in (None, '*')}
+        df.attrs['languages'] = {c: l for c, l in self.__languages.items() if l not in (None, '*')}
+        self.__batches.append(df)
+        self.__reset()
+
+    def __reset(self):
+        self.__values = {column: [] for column in self.columns}
+        self.__kinds = {column: None for column in self.columns}
+        self.__datatypes = {column: None for column in self.columns}
+        self.__languages = {column: None for column in self.columns}
+        self.__batch_size = 0
+
+    def __take_batches(self):
+        batches = self.__batches
+        self.__batches = []
+        return batches
+
+    @staticmethod
+    def __merge(current, new):
+        """
+        :return: the common value of a column attribute, '*' once two different values were seen
+        """
+        if new is None or current == new:
+            return current
+        if current is None:
+            return new
+        return '*'
+
+    @staticmethod
+    def __typed_column(values, kind, datatype=None):
+        """
+        :param values: the python values of the column
+        :param kind: the common kind of the values
+        :param datatype: the common datatype of the values, to give the column the dtype of a bounded datatype
+        :return: the typed values
+        """
+        has_missing = any(v is None for v in values)
+        dtype = _DATATYPE_DTYPES.get(datatype)
+        if kind == 'int':
+            dtype = dtype if dtype is not None and dtype.startswith(('int', 'uint')) else 'int64'
+            try:
+                return pd.array(values, dtype=dtype.capitalize() if has_missing else dtype)
+            except (OverflowError, TypeError, ValueError):
+                # a value out of the range of its datatype
+                return pd.array(values, dtype='Int64') if has_missing else pd.array(values, dtype='int64')
+        if kind == 'float':
+            return pd.array([float('nan') if v is None else v for v in values],
+                            dtype='float32' if dtype == 'float32' else 'float64')
+        if kind == 'bool':
+            return pd.array(values, dtype='boolean') if has_missing else pd.array(values, dtype='bool')
+        if kind == 'datetime':
+            try:
+                return pd.to_datetime(values, format='ISO8601')
+            except (ValueError, TypeError):
+                pass
+            try:
+                # values with different time zones are converted to UTC
+                return pd.to_datetime(values, format='ISO8601', utc=True)
+            except (ValueError, TypeError):
+                return pd.array(values, dtype=object)
+        if kind == '*':
+            return pd.array(values, dtype=object)
+        return values
+
+
+def downcast_columns(df, categorical=True, category_ratio=_CATEGORY_RATIO):
+    """
+    gives the columns of a result the smallest dtypes holding their values: integer columns the smallest integer
+    dtype, float columns float32 if no value changes and, if categorical is True, string columns with few distinct
+    values a categorical dtype
+    :param df: pandas dataframe
+    :param categorical: if True, string columns with at most category_ratio distinct values per row become categorical
+    :param category_ratio: the maximum ratio of distinct values to rows of a categorical column
+    :return: pandas dataframe with the same attrs
+    """
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        dtype = column.dtype
+        if pd.api.types.is_bool_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(dtype):
+            downcast_to = 'unsigned' if pd.api.types.is_unsigned_integer_dtype(dtype) else 'integer'
+            column = pd.to_numeric(column, downcast=downcast_to)
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float32:
+            values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            with np.errstate(over='ignore', invalid='ignore'):
+                narrow = values.astype(np.float32)
+            if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+                column = pd.Series(narrow, index=column.index, name=name)
+        elif categorical and (dtype == object or pd.api.types.is_string_dtype(dtype)) and len(column) > 1:
+            values = column.dropna()
+            if pd.api.types.infer_dtype(values, skipna=True) == 'string' and \
+                    values.nunique() <= category_ratio * len(column):
+                column = column.astype('category')
+        if column.dtype != dtype:
+            columns[name] = column
+    return df.assign(**columns) if len(columns) > 0 else df
+
+
+class SparqlJsonParser(ResultParser):
+    """
+    Incremental parser of application/sparql-results+json. Only the head and the binding being parsed are buffered,
+    every binding object is decoded as soon as it is complete
+    """
+    _vars_regex = re.compile(r'"vars"\s*:\s*\[')
+    _bindings_regex = re.compile(r'"bindings"\s*:\s*\[')
+    _whitespace = ' \t\r\n,'
+
+    def __init__(self, batch_rows=10000, downcast=False):
+        super(SparqlJsonParser, self).__init__(batch_rows, downcast)
+        self.__decoder = json.JSONDecoder()
+        self.__in_bindings = False
+        self.__done = False
+
+    def _parse(self, final):
+        if self.__done:
+            self.buffer = ''
+            return
+        if not self.__in_bindings:
+            self.__parse_head(final)
+            if not self.__in_bindings:
+                return
+        self.__parse_bindings(final)
+
+    def __parse_head(self, final):
+        bindings = SparqlJsonParser._bindings_regex.search(self.buffer)
+        if self.columns is None:
+            head = SparqlJsonParser._vars_regex.search(self.buffer)
+            if head is not None and (bindings is None or head.start() < bindings.start()):
+                try:
+                    columns, end = self.__decoder.raw_decode(self.buffer, head.end() - 1)
+                except ValueError:
+                    if final:
+                        raise Exception("incomplete SPARQL JSON result head")
+                    return
+                self._set_columns(columns)
+            elif bindings is None:
+                if final and self.buffer.strip():
+                    # e.g. the result of an ASK query
+                    self.__done = True
+                return
+        if bindings is None:
+            return
+        if self.columns is None:
+            # the head comes after the results, the columns are taken from the bindings
+            self._set_columns([])
+        self.buffer = self.buffer[bindings.end():]
+        self.__in_bindings = True
+
+    def __parse_bindings(self, final):
+        buffer = self.buffer
+        pos = 0
+        length = len(buffer)
+        while True:
+            while pos < length and buffer[pos] in SparqlJsonParser._whitespace:
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == ']':
+                self.__done = True
+                pos = length
+                break
+            try:
+                binding, pos_end = self.__decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if final:
+                    raise Exception("incomplete SPARQL JSON result at row {}".format(self.rows))
+                break
+            pos = pos_end
+            self._add_row({var: SparqlJsonParser.__term(term) for var, term in binding.items()})
+        self.buffer = buffer[pos:]
+
+    @staticmethod
+    def __term(term):
+        term_type = term.get('type')
+        value = term.get('value')
+        if term_type == 'uri':
+            return value, 'str', URI, None
+        if term_type == 'bnode':
+            return value, 'str', BNODE, None
+        language = term.get('xml:lang')
+        if language is not None:
+            return value, 'str', _RDF_LANG_STRING, language
+        datatype = term.get('datatype')
+        value, kind = convert_term(value, datatype)
+        return value, kind, datatype, None
+
+
+class SparqlTsvParser(ResultParser):
+    """
+    Incremental parser of text/tab-separated-values SPARQL results. Values are written in turtle syntax, so IRIs,
+    language tags and datatypes are kept unlike in CSV results
+    """
+    _integer_regex = re.compile(r'^[+-]?\d+$')
+    _decimal_regex = re.compile(r'^[+-]?\d*\.\d+$')
+    _double_regex = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)[eE][+-]?\d+$')
+    _escapes = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+    _escape_regex = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+
+    def _parse(self, final):
+        end = self.buffer.rfind('\n')
+        if end < 0 and not final:
+            return
+        if final:
+            text, self.buffer = self.buffer, ''
+        else:
+            text, self.buffer = self.buffer[:end], self.buffer[end + 1:]
+        for line in text.split('\n'):
+            line = line.rstrip('\r')
+            if self.columns is None:
+                if line:
+                    self._set_columns([var.strip().lstrip('?$') for var in line.split('\t')])
+                continue
+            if not line:
+                continue
+            fields = line.split('\t')
+            self._add_row({column: SparqlTsvParser.__term(field)
+                           for column, field in zip(self.columns, fields) if field})
+
+    @staticmethod
+    def __term(field):
+        if field[0] == '<' and field[-1] == '>':
+            return field[1:-1], 'str', URI, None
+        if field.startswith('_:'):
+            return field[2:], 'str', BNODE, None
+        if field[0] == '"' or field[0] == "'":
+            quote = field[0]
+            close = field.rfind(quote)
+            value = SparqlTsvParser.__unescape(field[1:close])
+            suffix = field[close + 1:]
+            if suffix.startswith('@'):
+                return value, 'str', _RDF_LANG_STRING, suffix[1:]
+            datatype = None
+            if suffix.startswith('^^'):
+                datatype = suffix[2:]
+                if datatype.startswith('<'):
+                    datatype = datatype[1:-1]
+                elif datatype.startswith('xsd:'):
+                    datatype = _XSD + datatype[4:]
+            value, kind = convert_term(value, datatype)
+            return value, kind, datatype, None
+        # turtle abbreviations of numbers and booleans
+        if SparqlTsvParser._integer_regex.match(field):
+            return int(field), 'int', _XSD + 'integer', None
+        if SparqlTsvParser._decimal_regex.match(field):
+            return float(field), 'float', _XSD + 'decimal', None
+        if SparqlTsvParser._double_regex.match(field):
+            return float(field), 'float', _XSD + 'double', None
+        if field == 'true' or field == 'false':
+            return field == 'true', 'bool', _BOOLEAN_TYPE, None
+        return field, 'str', None, None
+
+    @staticmethod
+    def __unescape(value):
+        if '\\' not in value:
+            return value
+
+        def replace(match):
+            escape = match.group(1)
+            if escape[0] in 'uU' and len(escape) > 1:
+                return chr(int(escape[1:], 16))
+            return SparqlTsvParser._escapes.get(escape, escape)
+        return SparqlTsvParser._escape_regex.sub(replace, value)
+
+
+def concat_batches(frames):
+    """
+    concatenates the batches emitted by the parsers keeping the column datatypes and languages they agree on
+    :param frames: list of pandas dataframes
+    :return: pandas dataframe
+    """
+    if len(frames) == 0:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    attrs = {}
+    for key in ('datatypes', 'languages'):
+        common = dict(frames[0].attrs.get(key, {}))
+        for frame in frames[1:]:
+            other = frame.attrs.get(key, {})
+            common = {c: v for c, v in common.items() if other.get(c) == v}
+        attrs[key] = common
+    df = pd.concat(frames, ignore_index=True)
+    df.attrs = attrs
+    return df
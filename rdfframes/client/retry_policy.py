@@ -0,0 +1,291 @@
+"""
+Retries of failed pages with jittered exponential backoff and a circuit breaker per endpoint. A page that fails with
+a transient error (connection error, timeout, 429 or 5xx) is fetched again after a random delay that doubles with
+every attempt. When an endpoint keeps failing, its circuit opens and requests fail fast until it cools down, instead of
+every client hammering an overloaded endpoint with retries
+"""
+
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from rdfframes.utils.constants import _MAX_RETRIES, _RETRY_BASE_DELAY, _RETRY_MAX_DELAY, _BREAKER_THRESHOLD, \
+    _BREAKER_COOLDOWN, _BREAKER_PROBE_WAIT
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class TransientError(Exception):
+    """
+    Raised by an attempt of RetryPolicy.call() that failed in a way that may succeed if it is made again
+    """
+    def __init__(self, error, overloaded=False, retry_after=None):
+        """
+        :param error: the failure, an exception or its message
+        :param overloaded: True if the endpoint timed out or failed with a server error, so a smaller page may help
+        :param retry_after: the delay in seconds asked by the endpoint in a Retry-After header, if any
+        """
+        super(TransientError, self).__init__(str(error))
+        self.error = error
+        self.overloaded = overloaded
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """
+    How many times a failed page is fetched again and how long to wait between the attempts
+    """
+    _retries_lock = threading.Lock()
+    def __init__(self, max_retries=_MAX_RETRIES, base_delay=_RETRY_BASE_DELAY, max_delay=_RETRY_MAX_DELAY):
+        """
+        :param max_retries: the number of times a page is fetched again after a transient failure. 0 disables retries
+        :param base_delay: the delay in seconds before the first retry
+        :param max_delay: the longest delay in seconds between two attempts
+        """
+        self.max_retries = max(max_retries, 0)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """
+        "full jitter" backoff: a random delay between 0 and base_delay * 2^(attempt-1), so the clients that failed
+        together don't retry together
+        :param attempt: the number of the retry, starting at 1
+        :param retry_after: the delay in seconds asked by the endpoint in a Retry-After header, if any
+        :return: the number of seconds to wait before the retry
+        """
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, backoff)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def call(self, attempt, breaker, offset, retries=None, stats=None, on_retry=None):
+        """
+        makes the attempts of one page until one succeeds. Every attempt is admitted by and reported to the circuit
+        breaker of the endpoint, and a failed attempt is made again after a jittered exponential backoff
+        :param attempt: callable making one attempt. It returns the result or raises TransientError. Other exceptions
+            are not retried
+        :param breaker: the CircuitBreaker of the endpoint
+        :param offset: the offset of the page, for the error messages and the retry records
+        :param retries: the list the page is recorded in if it takes more than one attempt, or None
+        :param stats: optional ClientStats updated with page_retries
+        :param on_retry: optional callable taking the TransientError, called before every retry, e.g. to shrink the
+            page
+        :return: the result of the successful attempt
+        """
+        failures, error = 0, None
+        while True:
+            probe = self.__admit(breaker, time.sleep)
+            try:
+                result = attempt()
+            except TransientError as e:
+                error = e
+                failures += 1
+                time.sleep(self.__failed(e, failures, breaker, offset, stats, on_retry))
+                continue
+            except BaseException:
+                breaker.release(probe)
+                raise
+            self.__succeeded(failures, error, breaker, offset, retries)
+            return result
+
+    async def call_async(self, attempt, breaker, offset, retries=None, stats=None, on_retry=None):
+        """
+        coroutine version of call(). attempt is a callable returning an awaitable
+        """
+        failures, error = 0, None
+        while True:
+            wait, probe = breaker.admit()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait, probe = breaker.admit()
+            try:
+                result = await attempt()
+            except TransientError as e:
+                error = e
+                failures += 1
+                await asyncio.sleep(self.__failed(e, failures, breaker, offset, stats, on_retry))
+                continue
+            except BaseException:
+                breaker.release(probe)
+                raise
+            self.__succeeded(failures, error, breaker, offset, retries)
+            return result
+
+    @staticmethod
+    def __admit(breaker, sleep):
+        """
+        waits until the breaker lets a request through
+        :return: True if the request is the probe of a half-open circuit
+        """
+        while True:
+            wait, probe = breaker.admit()
+            if wait == 0:
+                return probe
+            sleep(wait)
+
+    def __failed(self, error, attempts, breaker, offset, stats, on_retry):
+        """
+        reports a failed attempt
+        :return: the number of seconds to wait before the next attempt
+        """
+        breaker.record_failure()
+        if attempts > self.max_retries:
+            raise Exception("the page at offset {} failed after {} attempts: {}".format(offset, attempts,
+                                                                                       error.error))
+        if stats is not None:
+            stats.add('page_retries')
+        if on_retry is not None:
+            on_retry(error)
+        return self.delay(attempts, error.retry_after)
+
+    @staticmethod
+    def __succeeded(failures, error, breaker, offset, retries):
+        """
+        reports a successful attempt and records the page in retries if it took more than one
+        """
+        breaker.record_success()
+        if failures > 0 and retries is not None:
+            with RetryPolicy._retries_lock:
+                retries.append({'offset': offset, 'attempts': failures + 1, 'error': str(error.error)})
+
+    @staticmethod
+    def is_retryable_status(status):
+        """
+        :param status: http status code
+        :return: True if a request failing with this status may succeed if sent again
+        """
+        return status in RETRYABLE_STATUS
+
+    @staticmethod
+    def retry_after(headers):
+        """
+        :param headers: the http response headers
+        :return: the number of seconds in the Retry-After header or None if missing or given as a date
+        """
+        value = headers.get('Retry-After') if headers is not None else None
+        try:
+            return max(float(value), 0) if value is not None else None
+        except ValueError:
+            return None
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one endpoint, shared by all the clients of the endpoint. After threshold consecutive failures
+    the circuit opens and requests are refused for cooldown seconds. Then one request is let through as a probe while
+    the others wait: if it succeeds the circuit closes, otherwise it opens again
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    _breakers = {}      # endpoint key: CircuitBreaker
+    _registry_lock = threading.Lock()
+
+    def __init__(self, threshold=_BREAKER_THRESHOLD, cooldown=_BREAKER_COOLDOWN):
+        """
+        :param threshold: the number of consecutive failures that open the circuit
+        :param cooldown: the number of seconds the circuit stays open
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        # True while the probe of the half-open circuit is in flight
+        self.probing = False
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def for_endpoint(endpoint_url, threshold=_BREAKER_THRESHOLD, cooldown=_BREAKER_COOLDOWN):
+        """
+        returns the breaker of the endpoint, creating it on first use
+        :param endpoint_url: the url of the sparql endpoint
+        :return: CircuitBreaker
+        """
+        url_comps = urlparse(endpoint_url)
+        key = '{}://{}'.format(url_comps.scheme, url_comps.netloc)
+        with CircuitBreaker._registry_lock:
+            breaker = CircuitBreaker._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(threshold, cooldown)
+                CircuitBreaker._breakers[key] = breaker
+            return breaker
+
+    @staticmethod
+    def reset_all():
+        """
+        forgets the state of all the endpoints
+        :return: None
+        """
+        with CircuitBreaker._registry_lock:
+            CircuitBreaker._breakers = {}
+
+    def wait_time(self):
+        """
+        :return: the number of seconds before the circuit lets a request through, 0 if it can be sent now
+        """
+        with self.__lock:
+            if self.state == CircuitBreaker.OPEN:
+                remaining = self.opened_at + self.cooldown - time.time()
+                if remaining > 0:
+                    return remaining
+                self.state = CircuitBreaker.HALF_OPEN
+            return 0
+
+    def admit(self):
+        """
+        asks to send a request. Once the cooldown is over, the first request is the probe of the endpoint and the next
+        ones wait until it succeeds or fails
+        :return: (the number of seconds to wait before asking again, 0 if the request can be sent now, True if the
+            request is the probe of the half-open circuit)
+        """
+        remaining = self.wait_time()
+        if remaining > 0:
+            return remaining, False
+        with self.__lock:
+            if self.state != CircuitBreaker.HALF_OPEN:
+                return 0, False
+            if self.probing:
+                return _BREAKER_PROBE_WAIT, False
+            self.probing = True
+            return 0, True
+
+    def release(self, probe):
+        """
+        lets another request probe the circuit after the probe ended without telling if the endpoint is healthy
+        :param probe: the second value returned by admit()
+        :return: None
+        """
+        if probe:
+            with self.__lock:
+                self.probing = False
+
+    def before_request(self):
+        """
+        checks that the circuit lets the request through
+        :return: None
+        """
+        remaining = self.wait_time()
+        if remaining > 0:
+            raise Exception("the endpoint failed {} times in a row, requests are suspended for {:.1f} more seconds"
+                            .format(self.failures, remaining))
+
+    def record_success(self):
+        with self.__lock:
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.__lock:
+            self.failures += 1
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.threshold:
+                self.state = CircuitBreaker.OPEN
+                self.opened_at = time.time()
+                self.probing = False
@@ -1,11 +1,18 @@
-import sys
 import io
+import socket
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
 
 from SPARQLWrapper import SPARQLWrapper, CSV, JSON, TSV
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
 import pandas as pd
 
-from rdfframes.utils.constants import _TIMEOUT, ReturnFormat, _MAX_ROWS
+from rdfframes.utils.constants import _TIMEOUT, ReturnFormat, _MAX_ROWS, _MAX_RETRIES
 from rdfframes.client.client import Client
+from rdfframes.client.compression import ACCEPT_ENCODING, IDENTITY_ENCODING, decode_body, charset_of
+from rdfframes.client.keyset_pagination import KeysetPagination
+from rdfframes.client.page_sizer import AdaptivePageSizer
+from rdfframes.client.retry_policy import RetryPolicy, CircuitBreaker, TransientError
 
 __author__ = "Aisha Mohamed <ahmohamed@qf.org.qa>"
 
@@ -16,14 +23,22 @@ class SPARQLEndpointClient(Client):
     class for sparql client that handles communication with a sparql end-point
     over http using the sparql wrapper library.
     """
-    def __init__(self, endpoint):
+    def __init__(self, endpoint, compression=True, max_retries=_MAX_RETRIES):
         """
         Constructs an instance of the client class
         :param endpoint: string of the SPARQL endpoint's URI hostname:port
         :type endpoint: string
+        :param compression: if True, ask the endpoint for gzip/deflate compressed responses
+        :type compression: bool
+        :param max_retries: the number of times a page failing with a transient error is fetched again
+        :type max_retries: int
         """
         super(SPARQLEndpointClient, self).__init__(endpoint=endpoint)
         self.endpoint = endpoint
+        self.compression = compression
+        self.retry_policy = RetryPolicy(max_retries)
+        # the pages of the last query started that had to be fetched more than once
+        self.retried_pages = []
 
     def get_endpoint(self):
         """
@@ -38,16 +53,39 @@ class SPARQLEndpointClient(Client):
         """
         self.endpoint = endpoint
 
-    def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None):
+    def execute_query(self, query, timeout=_TIMEOUT, limit=_MAX_ROWS, return_format=None, output_file=None,
+                      key_column=None):
         """
         Connects to a sparql endpoint
         :param query:
         :param timeout:
         :param output_file:
-        :return:
+        :param key_column: if provided, the pages are ordered by this column and each page continues after the last
+            key of the previous one instead of using OFFSET. Falls back to OFFSET paging if the query can't be paged
+            by this column
+        :return: pandas dataframe of the results. A failed page is fetched again up to max_retries times, the pages
+            that needed it are listed in the dataframe's attrs['retried_pages'], and in retried_pages until another
+            query starts. An exception is
+            raised if a page still fails. If the client has a cache, a cached result is returned without contacting
+            the endpoint
         """
+        cache_key, df = self._cached_result(query)
+        if df is not None:
+            return df
+        CircuitBreaker.for_endpoint(self.endpoint).before_request()
+        # every query records its retries in its own list, so queries running at the same time don't mix them
+        retries = []
+        self.retried_pages = retries
         client = SPARQLWrapper(self.endpoint)
         client.setTimeout(_TIMEOUT)
+        client.addCustomHttpHeader('Accept-Encoding', ACCEPT_ENCODING if self.compression else IDENTITY_ENCODING)
+        if key_column is not None:
+            keyset = KeysetPagination(query, key_column)
+            if keyset.is_applicable():
+                df = self.__execute_keyset_query(client, keyset, limit, retries)
+                self._cache_result(cache_key, query, df)
+                return SPARQLEndpointClient.__with_retry_report(df, retries)
+            self.stats.add('keyset_fallbacks')
         offset = 0
         results_string = []  # where all the results are concatenated
         continue_streaming = True
@@ -56,25 +94,88 @@ class SPARQLEndpointClient(Client):
                 query_string = query + " OFFSET {} LIMIT {}".format(str(offset), str(limit))
             else:
                 query_string = query
-            query_string = query_string.encode()
-            client.setQuery(query_string)
-            try:
-                client.setReturnFormat(CSV)
-                result = client.query().convert().decode("UTF-8").split("\n", 1)
-                if len(results_string) == 0:  # Add the returned table header
-                    header = result[0]
-                    results_string.append(header + "\n")
-                # if the number of rows is less then the maximum number of rows
-                if result[1].count('\n') < _MAX_ROWS:
-                    continue_streaming = False
-                offset = offset + limit
-            except Exception as e:
-                print(e)
-                sys.exit()
+            result = self.__query_with_retries(client, query_string, offset, retries).split("\n", 1)
+            if len(result) < 2:  # an empty page without a header line
+                result.append('')
+            if len(results_string) == 0:  # Add the returned table header
+                header = result[0]
+                results_string.append(header + "\n")
+            # if the number of rows is less then the maximum number of rows
+            if result[1].count('\n') < limit:
+                continue_streaming = False
+            offset = offset + limit
             results_string.append(result[1])
         # convert it to a dataframe
         results_string = ''.join(results_string)
         f = io.StringIO(results_string)
         f.seek(0)
         df = pd.read_csv(f, sep=',') # to get the values and the header
+        self._cache_result(cache_key, query, df)
+        return SPARQLEndpointClient.__with_retry_report(df, retries)
+
+    def __execute_keyset_query(self, client, keyset, page_size, retries):
+        """
+        fetches all the pages of a query with keyset pagination
+        :param client: the SPARQLWrapper object
+        :param keyset: the KeysetPagination of the query
+        :param page_size: number of rows per page
+        :param retries: the list the pages fetched more than once are recorded in
+        :return: pandas dataframe of the results
+        """
+        fetched = [0]
+
+        def fetch(page_query, size):
+            page = keyset.parse_page(self.__query_with_retries(client, page_query, fetched[0], retries))
+            fetched[0] += 0 if page is None else len(page)
+            return page
+
+        frames = list(keyset.pages(fetch, AdaptivePageSizer(page_size, page_size, adaptive=False)))
+        if len(frames) == 0:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def __query_with_retries(self, client, query_string, offset, retries):
+        """
+        sends the query of one page, sending it again after a jittered exponential backoff if it fails with a
+        connection error, a timeout, 429 or 5xx
+        :param client: the SPARQLWrapper object
+        :param query_string: the sparql query of the page
+        :param offset: the number of rows before the page
+        :param retries: the list the page is recorded in if it is sent more than once
+        :return: the CSV text of the page
+        """
+        def attempt():
+            client.setQuery(query_string.encode())
+            client.setReturnFormat(CSV)
+            try:
+                return self.__read_result(client.query())
+            except HTTPError as e:
+                if not RetryPolicy.is_retryable_status(e.code):
+                    raise Exception("the page at offset {} failed with {}".format(offset, e))
+                raise TransientError(e, retry_after=RetryPolicy.retry_after(e.headers))
+            except (EndPointInternalError, URLError, HTTPException, socket.timeout, ConnectionError) as e:
+                raise TransientError(e)
+
+        return self.retry_policy.call(attempt, CircuitBreaker.for_endpoint(self.endpoint), offset, retries,
+                                      self.stats)
+
+    @staticmethod
+    def __with_retry_report(df, retries):
+        """
+        :return: the dataframe with the pages that had to be retried in its attrs
+        """
+        if len(retries) > 0:
+            df.attrs['retried_pages'] = list(retries)
         return df
+
+    def __read_result(self, query_result):
+        """
+        reads the body of a query result, decompressing it if the endpoint sent it compressed
+        :param query_result: SPARQLWrapper QueryResult object
+        :return: the decoded result text
+        """
+        response = query_result.response
+        headers = response.info()
+        self.stats.add('pages')
+        return decode_body(response.read(), headers.get('Content-Encoding'), charset_of(headers.get('Content-Type')),
+                           stats=self.stats)
@@ -0,0 +1,251 @@
+"""
+Spilling of large query results to disk. Once the pages of a result take more memory than a budget, they are written
+to Arrow IPC files in a scratch directory and the result is returned as a SpilledResult reading them through memory
+maps, so only the rows that are accessed are loaded. Requires the pyarrow package
+"""
+
+import os
+import shutil
+import tempfile
+import weakref
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+from rdfframes.client.arrow_results import unify_types
+from rdfframes.client.vocabulary import Vocabulary
+
+
+class SpillWriter:
+    """
+    Writes the pages of a result to Arrow IPC files. The pages are appended to one file as long as they can be cast to
+    its schema, a page that can't starts a new file
+    """
+    def __init__(self, scratch_dir=None):
+        """
+        :param scratch_dir: the directory the result's files are created in. If None, the system's temporary directory
+        """
+        if pa is None:
+            raise Exception("Spilling results to disk requires the pyarrow package. Install it with: pip install "
+                            "pyarrow")
+        self.directory = tempfile.mkdtemp(prefix='rdfframes-', dir=scratch_dir)
+        self.paths = []
+        self.rows = 0
+        self.bytes = 0
+        self.attrs = None
+        self.__writer = None
+        self.__schema = None
+
+    def write_frame(self, df):
+        """
+        appends a page to the spilled result
+        :param df: pandas dataframe of the page
+        :return: None
+        """
+        self.__merge_attrs(df.attrs)
+        # an IPC file can't change the dictionary of a column between pages, categorical columns are written as values
+        table = pa.Table.from_pandas(Vocabulary.decode(df), preserve_index=False).replace_schema_metadata(None)
+        if self.__writer is not None:
+            try:
+                table = table.cast(self.__schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError):
+                self.__close_writer()
+        if self.__writer is None:
+            path = os.path.join(self.directory, 'part-{:05d}.arrow'.format(len(self.paths)))
+            self.__writer = pa.ipc.new_file(path, table.schema)
+            self.__schema = table.schema
+            self.paths.append(path)
+        self.__writer.write_table(table)
+        self.rows += table.num_rows
+        self.bytes += table.nbytes
+
+    def close(self):
+        """
+        completes the files
+        :return: SpilledResult reading the files. The scratch directory is removed when it is closed or garbage
+            collected
+        """
+        self.__close_writer()
+        attrs = self.attrs if self.attrs is not None else {}
+        return SpilledResult(self.paths, attrs=attrs, directory=self.directory)
+
+    def abort(self):
+        """
+        removes the files written so far
+        :return: None
+        """
+        try:
+            self.__close_writer()
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __close_writer(self):
+        if self.__writer is not None:
+            writer, self.__writer = self.__writer, None
+            writer.close()
+
+    def __merge_attrs(self, attrs):
+        """
+        keeps the column datatypes and languages all the pages agree on, like concat_batches()
+        """
+        if self.attrs is None:
+            self.attrs = {key: dict(attrs[key]) for key in ('datatypes', 'languages') if key in attrs}
+            return
+        for key in list(self.attrs):
+            other = attrs.get(key, {})
+            self.attrs[key] = {c: v for c, v in self.attrs[key].items() if other.get(c) == v}
+
+
+class SpilledResult:
+    """
+    A query result stored in memory-mapped Arrow files. It is used like a read-only dataframe: result['col'] gives a
+    column, result[['a', 'b']] some columns, result[10:20] or result.iloc[10:20] some rows, and iter_chunks() iterates
+    over the rows in dataframes of a bounded size. Every access returns pandas objects holding only the requested
+    data. to_pandas() loads the whole result
+    """
+    def __init__(self, paths, attrs=None, directory=None):
+        """
+        :param paths: the Arrow IPC files of the result in row order
+        :param attrs: the attrs of the dataframes returned, e.g. the datatypes and languages of the columns
+        :param directory: a directory owned by the result, removed with the files when the result is closed
+        """
+        self.paths = list(paths)
+        self.attrs = attrs if attrs is not None else {}
+        self.__table = None
+        self.__finalizer = weakref.finalize(self, SpilledResult.__remove, list(self.paths), directory)
+
+    @property
+    def columns(self):
+        return pd.Index(self.to_arrow().column_names)
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    @property
+    def dtypes(self):
+        return self.head(0).dtypes
+
+    @property
+    def iloc(self):
+        return _RowIndexer(self)
+
+    def __len__(self):
+        return self.to_arrow().num_rows
+
+    def __getitem__(self, key):
+        table = self.to_arrow()
+        if isinstance(key, slice):
+            start, stop, step = key.indices(table.num_rows)
+            if step != 1:
+                return self.__frame(table.slice(start, max(stop - start, 0))).iloc[::step].reset_index(drop=True)
+            return self.__frame(table.slice(start, max(stop - start, 0)))
+        if isinstance(key, (list, tuple, pd.Index)):
+            return self.__frame(table.select(list(key)))
+        if key not in table.column_names:
+            raise KeyError(key)
+        return self.__frame(table.select([key]))[key]
+
+    def __contains__(self, key):
+        return key in self.to_arrow().column_names
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return 'SpilledResult({} rows x {} columns in {} file(s))'.format(len(self), len(self.columns),
+                                                                         len(self.paths))
+
+    def head(self, n=5):
+        """
+        :return: pandas dataframe of the first n rows
+        """
+        return self[:n]
+
+    def iter_chunks(self, chunk_rows=None, columns=None):
+        """
+        iterates over the rows of the result, loading one chunk at a time
+        :param chunk_rows: the maximum number of rows per chunk. If None, every page written is one chunk
+        :param columns: the columns to load. If None, all the columns
+        :return: generator of pandas dataframes
+        """
+        table = self.to_arrow()
+        if columns is not None:
+            table = table.select(list(columns))
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            yield self.__frame(pa.Table.from_batches([batch]))
+
+    def to_pandas(self, columns=None):
+        """
+        :param columns: the columns to load. If None, all the columns
+        :return: pandas dataframe of the whole result
+        """
+        table = self.to_arrow()
+        return self.__frame(table.select(list(columns)) if columns is not None else table)
+
+    def to_arrow(self):
+        """
+        :return: pyarrow Table whose buffers are memory-mapped from the files
+        """
+        if self.__table is None:
+            if not self.__finalizer.alive:
+                raise Exception("the spilled result is closed")
+            tables = [pa.ipc.open_file(pa.memory_map(path)).read_all() for path in self.paths]
+            if len(tables) == 0:
+                self.__table = pa.table({})
+            elif len(tables) == 1:
+                self.__table = tables[0]
+            else:
+                self.__table = pa.concat_tables(unify_types(tables), promote_options='permissive')
+        return self.__table
+
+    def close(self):
+        """
+        removes the files of the result. The dataframes already returned stay valid
+        :return: None
+        """
+        self.__table = None
+        self.__finalizer()
+
+    def __frame(self, table):
+        df = table.to_pandas()
+        df.attrs = {key: dict(value) if isinstance(value, dict) else value for key, value in self.attrs.items()}
+        return df
+
+    @staticmethod
+    def __remove(paths, directory):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class _RowIndexer:
+    """
+    Positional row access of a SpilledResult, result.iloc[i] or result.iloc[start:stop]
+    """
+    def __init__(self, result):
+        self.result = result
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.result[key]
+        n = len(self.result)
+        position = key + n if key < 0 else key
+        if not 0 <= position < n:
+            raise IndexError("row {} is out of bounds".format(key))
+        return self.result[position:position + 1].iloc[0]
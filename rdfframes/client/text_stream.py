@@ -0,0 +1,121 @@
+"""
+Read-only file object over a stream of text chunks, used to parse or copy a response body while it is received
+without holding the whole body in memory
+"""
+
+
+class TextChunkReader:
+    """
+    File-like reader of text chunks. Only the chunk being read and the part of the previous one not consumed yet are
+    kept in memory
+    """
+    def __init__(self, chunks):
+        """
+        :param chunks: iterable of text chunks
+        """
+        self.chunks = iter(chunks)
+        self.buffer = ''
+        self.exhausted = False
+
+    def read(self, size=-1):
+        """
+        :param size: the maximum number of characters to read. Negative to read the rest of the stream
+        :return: the text read, empty at the end of the stream
+        """
+        if size is None or size < 0:
+            data = self.buffer + ''.join(self.chunks)
+            self.buffer = ''
+            self.exhausted = True
+            return data
+        while len(self.buffer) < size and self.__fill():
+            pass
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        """
+        :return: the next line including its line break, empty at the end of the stream
+        """
+        while True:
+            end = self.buffer.find('\n')
+            if end >= 0:
+                end += 1
+                break
+            if not self.__fill():
+                end = len(self.buffer)
+                break
+        if size is not None and 0 <= size < end:
+            end = size
+        line = self.buffer[:end]
+        self.buffer = self.buffer[end:]
+        return line
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.exhausted = True
+        self.buffer = ''
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __fill(self):
+        """
+        appends the next chunk to the buffer
+        :return: False at the end of the stream
+        """
+        if self.exhausted:
+            return False
+        try:
+            self.buffer += next(self.chunks)
+            return True
+        except StopIteration:
+            self.exhausted = True
+            return False
+
+
+class CsvRecordCounter:
+    """
+    Counts the records of CSV text received in chunks. A line break inside a quoted value, e.g. in a multi-line
+    literal, doesn't end a record. The quotes escaped by doubling them inside a quoted value open and close the quoted
+    state twice, so they need no special handling
+    """
+    def __init__(self):
+        self.records = 0
+        self.quoted = False
+        self.last = ''
+
+    def feed(self, chunk):
+        """
+        :param chunk: the next text chunk
+        :return: the number of records ended in this chunk
+        """
+        if not chunk:
+            return 0
+        ended = 0
+        for i, part in enumerate(chunk.split('"')):
+            if i > 0:
+                self.quoted = not self.quoted
+            if not self.quoted:
+                ended += part.count('\n')
+        self.last = chunk[-1]
+        self.records += ended
+        return ended
+
+    def close(self):
+        """
+        counts the last record if the text doesn't end with a line break
+        :return: the total number of records
+        """
+        if self.last not in ('', '\n'):
+            self.records += 1
+            self.last = '\n'
+        return self.records
@@ -0,0 +1,209 @@
+"""
+Dictionary encoding of the uris and literals of query results. A Vocabulary gives every distinct value of a column
+a code once, and the encoded columns are pandas categorical columns whose categories are the column's values. All the
+pages of a result share one vocabulary, so they are concatenated on the codes without comparing strings, and two
+results are given common categories only when they are joined
+"""
+
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from rdfframes.client.result_parsers import URI
+from rdfframes.utils.helper_functions import is_uri
+
+
+class Vocabulary:
+    """
+    The codes of the categorical columns of one result. Every column has its own append-only mapping between its
+    values and codes, so its categories are the values of that column only, and a value keeps its code while the
+    result is received: a page encoded earlier is moved to the column's final categories by changing its dtype
+    without recoding. The vocabulary is dropped with the result, the results are only given common categories when
+    they are joined, with align_categories()
+    """
+    # encode the uri columns: the columns whose datatype is uri, or whose values are all uris when it is unknown
+    URIS = 'uris'
+    # encode all the columns of strings, uris and literals
+    TERMS = 'terms'
+
+    def __init__(self):
+        self.__columns = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(codes) for codes in self.__columns.values())
+
+    def dtype(self, name):
+        """
+        :param name: the name of an encoded column
+        :return: pandas CategoricalDtype whose categories are all the values of the column, or None if the column
+            was not encoded
+        """
+        with self.__lock:
+            codes = self.__columns.get(name)
+            return codes.dtype() if codes is not None else None
+
+    def encode(self, column, uris_only=False):
+        """
+        :param column: pandas series of strings, or a categorical series encoded with any categories
+        :param uris_only: if True, the column is only encoded if all its values are uris
+        :return: categorical pandas series with the dtype of the column's values, or None if the column has values
+            that are not strings, e.g. numbers of literals of different datatypes, or values that are not uris with
+            uris_only
+        """
+        with self.__lock:
+            codes = self.__columns.get(column.name)
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                positions, uniques = column.cat.codes.to_numpy(), column.cat.categories
+                if codes is not None and codes.issued(uniques):
+                    # encoded with this vocabulary, the codes are the same
+                    return _categorical(positions, column, codes.dtype())
+            else:
+                positions, uniques = pd.factorize(column.to_numpy(dtype=object, na_value=None), use_na_sentinel=True)
+            if not all(isinstance(value, str) and (not uris_only or is_uri(value)) for value in uniques):
+                return None
+            if codes is None:
+                codes = self.__columns[column.name] = _Codes()
+            lookup = codes.lookup(uniques)
+            # the categories are built once per page, after all its values got their codes
+            dtype = codes.dtype()
+        # the missing values have the code -1, which takes the last element of the lookup
+        return _categorical(np.append(lookup, -1)[positions], column, dtype)
+
+    def encode_frame(self, df, columns=URIS):
+        """
+        encodes the columns of a result dataframe
+        :param df: pandas dataframe
+        :param columns: URIS, TERMS or a list of column names
+        :return: pandas dataframe with the encoded columns as categorical columns and the same attrs
+        """
+        datatypes = df.attrs.get('datatypes', {})
+        encoded = {}
+        for name in df.columns:
+            dtype = df[name].dtype
+            if not (dtype == object or pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype)):
+                continue
+            if columns == Vocabulary.URIS:
+                if name in datatypes and datatypes[name] != URI:
+                    continue
+                column = self.encode(df[name], uris_only=name not in datatypes)
+            elif columns == Vocabulary.TERMS or name in columns:
+                column = self.encode(df[name])
+            else:
+                continue
+            if column is not None:
+                encoded[name] = column
+        return df.assign(**encoded) if len(encoded) > 0 else df
+
+    def align(self, df):
+        """
+        moves the columns encoded with this vocabulary to their current dtypes, so they can be concatenated with the
+        pages encoded later
+        :param df: pandas dataframe
+        :return: pandas dataframe
+        """
+        aligned = {}
+        with self.__lock:
+            for name in df.columns:
+                categories = getattr(df[name].dtype, 'categories', None)
+                codes = self.__columns.get(name)
+                if categories is None or codes is None or not codes.issued(categories):
+                    continue
+                dtype = codes.dtype()
+                if categories is not dtype.categories:
+                    aligned[name] = _categorical(df[name].cat.codes.to_numpy(), df[name], dtype)
+        return df.assign(**aligned) if len(aligned) > 0 else df
+
+    @staticmethod
+    def decode(df):
+        """
+        :param df: pandas dataframe
+        :return: the dataframe with its categorical columns converted back to their values
+        """
+        categorical = [name for name in df.columns if isinstance(df[name].dtype, pd.CategoricalDtype)]
+        return df.assign(**{name: df[name].astype(object) for name in categorical}) if len(categorical) > 0 else df
+
+
+class _Codes:
+    """
+    the append-only codes of the values of one column
+    """
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+        self.current = None
+        # the categories of the dtypes returned by dtype(), all prefixes of the current values
+        self.categories = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.values)
+
+    def lookup(self, uniques):
+        """
+        :param uniques: the distinct values of a page
+        :return: numpy array of their codes, the new values are given the next codes
+        """
+        lookup = np.empty(len(uniques), dtype=np.int64)
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+                self.current = None
+            lookup[i] = code
+        return lookup
+
+    def dtype(self):
+        if self.current is None:
+            self.current = pd.CategoricalDtype(pd.Index(self.values))
+            self.categories[id(self.current.categories)] = self.current.categories
+        return self.current
+
+    def issued(self, categories):
+        return self.categories.get(id(categories)) is categories
+
+
+def _categorical(codes, column, dtype):
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype, validate=False), index=column.index,
+                     name=column.name)
+
+
+def align_categories(left, right, columns):
+    """
+    gives the categorical columns two dataframes are joined on the same categories, so they are merged on their codes.
+    When the categories of one column start with those of the other, e.g. the batches of one result, only the shorter
+    one is replaced. Otherwise the values of the right column missing from the left one are appended to the left
+    categories, and only the right column is recoded
+    :param left: pandas dataframe
+    :param right: pandas dataframe
+    :param columns: the join columns
+    :return: (left, right)
+    """
+    for name in columns:
+        left_dtype, right_dtype = left[name].dtype, right[name].dtype
+        if not (isinstance(left_dtype, pd.CategoricalDtype) and isinstance(right_dtype, pd.CategoricalDtype)) or \
+                left_dtype == right_dtype:
+            continue
+        left_categories, right_categories = left_dtype.categories, right_dtype.categories
+        if len(left_categories) <= len(right_categories) and \
+                right_categories[:len(left_categories)].equals(left_categories):
+            left = left.assign(**{name: _with_categories(left[name], right_dtype)})
+        elif len(right_categories) < len(left_categories) and \
+                left_categories[:len(right_categories)].equals(right_categories):
+            right = right.assign(**{name: _with_categories(right[name], left_dtype)})
+        else:
+            categories = left_categories.append(right_categories.difference(left_categories, sort=False))
+            dtype = pd.CategoricalDtype(categories)
+            left = left.assign(**{name: _with_categories(left[name], dtype)})
+            right = right.assign(**{name: right[name].astype(dtype)})
+    return left, right
+
+
+def _with_categories(column, dtype):
+    """
+    replaces the categories of a column by a longer list starting with them, keeping the codes
+    """
+    return pd.Series(pd.Categorical.from_codes(column.cat.codes.to_numpy(), dtype=dtype, validate=False),
+                     index=column.index, name=column.name)
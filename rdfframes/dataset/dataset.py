@@ -3,6 +3,8 @@
 import copy
 import warnings
 
+import pandas as pd
+
 from rdfframes.query_buffer.query_operators.shared.limit_operator import LimitOperator
 from rdfframes.query_buffer.query_operators.shared.offset_operator import OffsetOperator
 from rdfframes.query_buffer.query_operators.shared.sort_operator import SortOperator
@@ -13,6 +15,10 @@ from rdfframes.query_buffer.query_queue import QueryQueue
 from rdfframes.query_builder.queue2querymodel import Queue2QueryModelConverter
 from rdfframes.utils.constants import JoinType
 from rdfframes.dataset.rdfpredicate import PredicateDirection
+from rdfframes.dataset.semantic_cache import SemanticCache
+from rdfframes.dataset.materialization import Materializer
+from rdfframes.dataset.prefix_compaction import PrefixCompactor
+from rdfframes.client import arrow_results
 from rdfframes.utils.helper_functions import is_uri
 from rdfframes.utils.constants import _TIMEOUT, _MAX_ROWS
 
@@ -41,6 +47,8 @@ class Dataset:
         self.query_queue = QueryQueue(self)
         self.columns = []
         self.cached = False
+        self.cache_source = None  # the cached dataset this dataset was derived from
+        self.cache_prefix_length = 0  # the number of steps of the cached dataset at the start of the query queue
         self.is_grouped = False
 
     def expand(self, src_col_name, predicate_list):
@@ -161,6 +169,9 @@ class Dataset:
         invalid_cols = [col for col in col_list if col not in self.columns]
         if len(invalid_cols) > 0:
             raise Exception('Columns {} are not defined in the dataset'.format(invalid_cols))
+        if self.cached:
+            ds = self._cache_dataset()
+            return ds.select_cols(col_list)
         select_node = SelectOperator(self.name, col_list)
         self.query_queue.append_node(select_node)
         # change the dataset to contain only the new columns
@@ -183,6 +194,9 @@ class Dataset:
         {'sort_col1': 'DESC', 'sort_col2': 'ASC', ... etc}
         :return: the same dataset object logically ordered
         """
+        if self.cached:
+            ds = self._cache_dataset()
+            return ds.sort(sort_dict)
         sort_node = SortOperator(self.name, sort_dict)
         self.query_queue.append_node(sort_node)
         return self
@@ -193,6 +207,9 @@ class Dataset:
         :param threshold: the cut off threshold
         :return: the same dataset object
         """
+        if self.cached:
+            ds = self._cache_dataset()
+            return ds.limit(threshold)
         limit_node = LimitOperator(self.name, threshold)
         self.query_queue.append_node(limit_node)
         return self
@@ -203,6 +220,9 @@ class Dataset:
         :param offset: the offset (int)
         :return: the same dataset object
         """
+        if self.cached:
+            ds = self._cache_dataset()
+            return ds.offset(offset)
         offset_node = OffsetOperator(self.name, offset)
         self.query_queue.append_node(offset_node)
         return self
@@ -271,18 +291,109 @@ class Dataset:
         query_string = query_model.to_sparql()
         return query_string
 
-    def execute(self, client, return_format=None, output_file=None, timeout = _TIMEOUT, limit = _MAX_ROWS):
+    def execute(self, client, return_format=None, output_file=None, timeout = _TIMEOUT, limit = _MAX_ROWS,
+                compact_uris=False, **kwargs):
         """
         converts this dataset to a sparql query, send it to the sparql endpoint or RDF engine and
         returns the result in the specified return format
         :param client: client to communicate with the SPARQL endpoint/RDF engine
         :param return_format: one of ['df', 'csv']
         :param output_file: file to save the results in
-        :return:
+        :param compact_uris: if True, every uri column of the result is split into a column of namespace ids, one per
+            namespace of the graph's prefixes, and a column of local names. See PrefixCompactor.compact(). The full
+            uris are rebuilt with prefix_compaction.expand_uris()
+        :param kwargs: client specific execution options, e.g. max_workers for HttpClient, key_column to page the
+            results by one of the dataset's columns (e.g. the seed entity) instead of OFFSET, memory_budget to spill
+            a result larger than this number of bytes to disk and get it back as a SpilledResult, categorical to get
+            the uri columns (Vocabulary.URIS) or other columns as pandas categorical columns or downcast to give the
+            columns the smallest dtypes holding their values
+        :return: the result in the specified return format. If the client has a result cache and this dataset only
+            adds filter, select_cols, sort, limit or offset steps to a dataset whose result is cached, the result is
+            computed from the cached one without contacting the endpoint. The result of a cached dataset is kept in the
+            client, and the datasets derived from it are computed from that result where possible
         """
         query_string = self.to_sparql()
+        if output_file is None and Materializer.is_materialized(self):
+            # the results of cached datasets are kept in memory
+            kwargs.pop('memory_budget', None)
+            kwargs.pop('scratch_dir', None)
+            df = Materializer(self).execute(client, query_string, return_format=return_format, timeout=timeout,
+                                            limit=limit, **kwargs)
+            return self.__compacted(df, compact_uris)
+        if output_file is None and getattr(client, 'cache', None) is not None and \
+                not client.is_cached(query_string, return_format):
+            df = SemanticCache(self).answer(client, return_format)
+            if df is not None:
+                return self.__compacted(df, compact_uris)
         res = client.execute_query(query_string, timeout=timeout, limit=limit, return_format=return_format,
-                                   output_file=output_file)
+                                   output_file=output_file, **kwargs)
+        return self.__compacted(res, compact_uris) if output_file is None else res
+
+    def to_arrow(self, client, return_format=None, timeout=_TIMEOUT, limit=_MAX_ROWS, **kwargs):
+        """
+        converts this dataset to a sparql query, send it to the sparql endpoint or RDF engine and returns the result
+        as a pyarrow Table, read page by page with the Arrow readers where the client supports it
+        :param client: client to communicate with the SPARQL endpoint/RDF engine
+        :param return_format: the format the results are retrieved in, e.g. JSON to type the columns after their xsd
+            datatypes
+        :param kwargs: client specific execution options, e.g. max_workers for HttpClient
+        :return: pyarrow Table whose uri columns are dictionary encoded
+        """
+        arrow_results.require_pyarrow()
+        if Materializer.is_materialized(self):
+            return arrow_results.from_pandas(self.execute(client, return_format=return_format, timeout=timeout,
+                                                          limit=limit, **kwargs))
+        return client.execute_arrow(self.to_sparql(), timeout=timeout, limit=limit, return_format=return_format,
+                                    **kwargs)
+
+    def to_pandas(self, client, arrow_dtypes=False, return_format=None, timeout=_TIMEOUT, limit=_MAX_ROWS,
+                  **kwargs):
+        """
+        executes this dataset with to_arrow() and converts the table to a pandas dataframe without copying the data
+        where possible
+        :param client: client to communicate with the SPARQL endpoint/RDF engine
+        :param arrow_dtypes: if True, the columns are backed by the Arrow arrays (pandas.ArrowDtype) and nothing is
+            copied. Otherwise uri columns become categorical and numeric columns without missing values are zero-copy
+        :param return_format: the format the results are retrieved in
+        :param kwargs: client specific execution options
+        :return: pandas dataframe
+        """
+        table = self.to_arrow(client, return_format=return_format, timeout=timeout, limit=limit, **kwargs)
+        return arrow_results.to_pandas(table, arrow_dtypes=arrow_dtypes)
+
+    def iter_batches(self, client, batch_rows=None, timeout=_TIMEOUT, compact_uris=False, **kwargs):
+        """
+        converts this dataset to a sparql query, send it to the sparql endpoint or RDF engine and
+        yields the result one batch of rows at a time as pandas dataframes, so the whole result is never held in memory
+        :param client: client to communicate with the SPARQL endpoint/RDF engine
+        :param batch_rows: the number of rows in each batch
+        :param compact_uris: if True, the uri columns of every batch are split into namespace ids and local names, see
+            execute()
+        :param kwargs: client specific execution options, e.g. max_workers for HttpClient or memory_budget to pause
+            fetching while the batches not consumed yet take more than this number of bytes
+        :return: generator of pandas dataframes
+        """
+        query_string = self.to_sparql()
+        batches = client.iter_batches(query_string, batch_rows=batch_rows, timeout=timeout, **kwargs)
+        if not compact_uris:
+            return batches
+        compactor = PrefixCompactor.of_graph(self.graph)
+        return (compactor.compact(batch) for batch in batches)
+
+    async def execute_async(self, client, return_format=None, output_file=None, timeout=_TIMEOUT, limit=_MAX_ROWS,
+                            **kwargs):
+        """
+        coroutine version of execute() for asynchronous clients like AsyncHttpClient. Many datasets can be executed
+        concurrently on one event loop, e.g. with asyncio.gather
+        :param client: asynchronous client to communicate with the SPARQL endpoint/RDF engine
+        :param return_format: one of ['df', 'csv']
+        :param output_file: file to save the results in
+        :param kwargs: client specific execution options
+        :return:
+        """
+        query_string = self.to_sparql()
+        res = await client.execute_query(query_string, timeout=timeout, limit=limit, return_format=return_format,
+                                         output_file=output_file, **kwargs)
         return res
 
     def type(self):
@@ -310,15 +421,40 @@ class Dataset:
             self.columns.remove(column)
 
     def cache(self):
+        """
+        marks the dataset as cached. Its result is materialized in the client the first time it is executed, and the
+        operators called on it create new datasets computed from that result instead of sending its query again
+        :return: the same dataset object
+        """
         self.cached = True
         return self
 
     def _cache_dataset(self):
-        ds = copy.deepcopy(self)
+        """
+        :return: a new dataset starting with the steps of this cached dataset, to add the steps of an operator to. The
+            two datasets share the graph and the steps, the new one records this dataset as the source of its result
+        """
+        ds = copy.copy(self)
         ds.cached = False
+        ds.cache_source = self
+        ds.cache_prefix_length = len(self.query_queue.queue)
+        ds.columns = list(self.columns)
+        if hasattr(self, 'agg_columns'):
+            ds.agg_columns = list(self.agg_columns)
+        ds.query_queue = QueryQueue(ds)
+        for node in self.query_queue.queue:
+            ds.query_queue.append_node(node)
         return ds
 
 
 
 
 
+
+    def __compacted(self, result, compact_uris):
+        """
+        :return: the result with its uri columns split into namespace ids and local names if compact_uris is True
+        """
+        if not compact_uris or not isinstance(result, pd.DataFrame):
+            return result
+        return PrefixCompactor.of_graph(self.graph).compact(result)
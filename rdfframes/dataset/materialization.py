@@ -0,0 +1,250 @@
+"""
+Execution of the datasets derived from a cached dataset. The result of a cached dataset is materialized in the client
+the first time it is executed, and the datasets derived from it are computed from that result instead of sending the
+shared part of their query to the endpoint again
+"""
+
+import copy
+
+import pandas as pd
+
+from rdfframes.client.vocabulary import align_categories
+from rdfframes.dataset.rdfpredicate import PredicateDirection
+from rdfframes.dataset.semantic_cache import SemanticCache
+from rdfframes.query_buffer.query_operators.shared.expansion_operator import ExpansionOperator
+from rdfframes.query_buffer.query_operators.shared.filter_operator import FilterOperator
+from rdfframes.query_buffer.query_operators.shared.groupby_operator import GroupByOperator
+from rdfframes.query_buffer.query_operators.shared.join_operator import JoinOperator
+from rdfframes.query_buffer.query_operators.shared.limit_operator import LimitOperator
+from rdfframes.query_buffer.query_operators.shared.offset_operator import OffsetOperator
+from rdfframes.query_buffer.query_operators.shared.select_operator import SelectOperator
+from rdfframes.query_buffer.query_operators.shared.sort_operator import SortOperator
+from rdfframes.query_buffer.query_queue import QueryQueue
+from rdfframes.query_builder.filter_compiler import UnsupportedFilterError
+from rdfframes.query_builder.local_executor import LocalExecutor, LocalExecutionError
+from rdfframes.query_builder.querymodel import QueryModel
+from rdfframes.query_builder.queue2querymodel import Queue2QueryModelConverter
+from rdfframes.utils.constants import JoinType, _TIMEOUT, _MAX_ROWS, _VALUES_BATCH_SIZE, _VALUES_MAX_BATCHES
+from rdfframes.utils.helper_functions import is_uri
+
+
+class Materializer:
+    """
+    Executes a cached dataset or a dataset derived from one. The steps added after the cached dataset are evaluated on
+    its materialized result: filter, select_cols, sort, limit and offset locally, expand by sending only the new
+    triple pattern with the values of the source column bound in a VALUES clause, and join with another dataset
+    derived from a cached one by joining the two results locally. A grouped dataset derived from a cached one is
+    grouped and aggregated locally by LocalExecutor. If a step can't be evaluated this way, the full query is sent to
+    the endpoint
+    """
+    BINDING_OPERATORS = (ExpansionOperator, JoinOperator)
+    MODIFIER_OPERATORS = (SelectOperator, SortOperator, LimitOperator, OffsetOperator)
+    JOIN_TYPES = {
+        JoinType.InnerJoin: 'inner',
+        JoinType.LeftOuterJoin: 'left',
+        JoinType.RightOuterJoin: 'right',
+        JoinType.OuterJoin: 'outer'
+    }
+
+    def __init__(self, dataset):
+        """
+        :param dataset: a cached dataset or a dataset derived from one
+        """
+        self.dataset = dataset
+        self.semantic_cache = SemanticCache(dataset)
+
+    @staticmethod
+    def is_materialized(dataset):
+        """
+        :return: True if the dataset is cached or derived from a cached dataset
+        """
+        if dataset.cached or dataset.cache_source is not None:
+            return True
+        return dataset.type() == "GroupedDataset" and Materializer.is_materialized(dataset.parent_dataset)
+
+    def execute(self, client, query_string, return_format=None, timeout=_TIMEOUT, limit=_MAX_ROWS, **kwargs):
+        """
+        :param client: the client executing the dataset. The materialized results are kept in the client
+        :param query_string: the SPARQL query of the dataset
+        :param return_format: the return format of the result
+        :param kwargs: client specific execution options, used for the queries sent to the endpoint
+        :return: pandas dataframe of the dataset's result
+        """
+        if self.dataset.cached:
+            df = client.materialized_result(query_string, return_format)
+            if df is not None:
+                return df
+        df = None
+        if self.dataset.cache_source is not None:
+            df = self.__from_source(client, return_format, timeout, limit, kwargs)
+        elif self.dataset.type() == "GroupedDataset" and Materializer.is_materialized(self.dataset.parent_dataset):
+            df = self.__from_parent(client, return_format, timeout, limit, kwargs)
+        if df is not None:
+            client.stats.add('materialized_branches')
+        if df is None:
+            df = client.execute_query(query_string, timeout=timeout, limit=limit, return_format=return_format,
+                                      **kwargs)
+        if self.dataset.cached:
+            client.materialize(query_string, df, return_format)
+        return df
+
+    def __from_source(self, client, return_format, timeout, limit, kwargs):
+        """
+        evaluates the steps added after the cached dataset on its result
+        :return: pandas dataframe of the dataset's result or None if a step can't be evaluated from the cached result
+        """
+        nodes = self.dataset.query_queue.queue
+        prefix, suffix = nodes[:self.dataset.cache_prefix_length], nodes[self.dataset.cache_prefix_length:]
+        local_operators = SemanticCache.LOCAL_OPERATORS + Materializer.BINDING_OPERATORS
+        if any(not isinstance(node, local_operators) for node in suffix):
+            return None
+        prefix_modifiers = any(isinstance(node, Materializer.MODIFIER_OPERATORS) for node in prefix)
+        bindings = [i for i, node in enumerate(suffix) if isinstance(node, Materializer.BINDING_OPERATORS)]
+        if len(bindings) == 0:
+            if not prefix_modifiers:
+                query_model = self.__modifiers_model(suffix)
+            elif self.dataset.type() == "ExpandableDataset" and \
+                    not any(isinstance(node, (LimitOperator, OffsetOperator)) for node in prefix):
+                # the order and the projection of the cached dataset apply to the whole query
+                query_model = Queue2QueryModelConverter(self.dataset).to_query_model()
+            else:
+                return None
+            df = self.dataset.cache_source.execute(client, return_format=return_format, timeout=timeout, limit=limit,
+                                                   **kwargs)
+            return self.semantic_cache.evaluate(df, suffix, query_model)
+
+        # the order, the projection and the slice of a query apply after all its graph patterns
+        last_binding = bindings[-1]
+        if prefix_modifiers or \
+                any(isinstance(node, Materializer.MODIFIER_OPERATORS) for node in suffix[:last_binding]):
+            return None
+        df = self.dataset.cache_source.execute(client, return_format=return_format, timeout=timeout, limit=limit,
+                                               **kwargs)
+        for node in suffix[:last_binding + 1]:
+            if isinstance(node, FilterOperator):
+                df = self.__filter(df, node)
+            elif isinstance(node, ExpansionOperator):
+                df = self.__expand(df, node, client, return_format, timeout)
+            else:
+                df = self.__join(df, node, client, return_format, timeout, limit, kwargs)
+            if df is None:
+                return None
+        tail = suffix[last_binding + 1:]
+        return self.semantic_cache.evaluate(df, tail, self.__modifiers_model(tail))
+
+    def __from_parent(self, client, return_format, timeout, limit, kwargs):
+        """
+        groups and aggregates the result of the parent dataset of a grouped dataset locally
+        :return: pandas dataframe of the dataset's result or None if a step can't be evaluated locally
+        """
+        parent = self.dataset.parent_dataset
+        nodes = parent.query_queue.queue
+        groupby_nodes = [node for node in nodes if isinstance(node, GroupByOperator)]
+        if any(isinstance(node, GroupByOperator) for node in nodes[:parent.cache_prefix_length]):
+            return None
+        # the parent dataset without its group by steps gives the solutions to group
+        ungrouped = copy.copy(parent)
+        ungrouped.cached = False
+        ungrouped.query_queue = QueryQueue(ungrouped)
+        for node in nodes:
+            if not isinstance(node, GroupByOperator):
+                ungrouped.query_queue.append_node(node)
+        df = ungrouped.execute(client, return_format=return_format, timeout=timeout, limit=limit, **kwargs)
+
+        bindings_model = Queue2QueryModelConverter(self.dataset).query_model
+        query_model = bindings_model
+        for node in groupby_nodes:
+            _, query_model, _ = node.visit_node(query_model, parent, node)
+        for node in self.dataset.query_queue.queue:
+            _, query_model, _ = node.visit_node(query_model, self.dataset, node)
+        try:
+            return LocalExecutor().execute(query_model, bindings=df, bindings_model=bindings_model)
+        except LocalExecutionError:
+            return None
+
+    def __filter(self, df, node):
+        """
+        :return: the rows of the result satisfying the condition of a filter step or None if the condition can't be
+            evaluated locally
+        """
+        if node.src_col_name not in df.columns:
+            return None
+        mask = self.semantic_cache.filter_compiler.compile_all([(node.src_col_name, node.conditions)],
+                                                               SemanticCache.is_typed(df))
+        if mask is None:
+            return None
+        try:
+            return df[mask(df)]
+        except UnsupportedFilterError:
+            return None
+
+    def __expand(self, df, node, client, return_format, timeout):
+        """
+        sends the triple pattern of an expansion step with the distinct values of its source column bound in a VALUES
+        clause, a batch of values per query, and joins the bindings returned with the result. The batches are sent one
+        after the other, so a source column with more than _VALUES_MAX_BATCHES batches of values is expanded by the
+        full query, whose pages the client can fetch in parallel
+        :return: the expanded result or None if the source column has values that are not uris or too many values
+        """
+        src_col, new_col, predicate = node.src_col_name, node.new_col_name, node.predicate
+        if src_col not in df.columns:
+            return None
+        values = df[src_col].dropna().unique()
+        if len(values) > _VALUES_BATCH_SIZE * _VALUES_MAX_BATCHES:
+            return None
+        if any(not isinstance(value, str) or not is_uri(value) for value in values):
+            return None
+        columns = [src_col, new_col]
+        if not is_uri(predicate) and predicate.find(":") < 0:
+            columns.append(predicate)
+
+        parts = []
+        for start in range(0, len(values), _VALUES_BATCH_SIZE):
+            query_model = Queue2QueryModelConverter(self.dataset).query_model
+            query_model.add_values([src_col], [[value] for value in values[start:start + _VALUES_BATCH_SIZE]])
+            if node.expansion_direction == PredicateDirection.INCOMING:
+                query_model.add_triple(new_col, predicate, src_col)
+            else:
+                query_model.add_triple(src_col, predicate, new_col)
+            for col in columns:
+                query_model.add_select_column(col)
+            part = client.execute_query(query_model.to_sparql(), timeout=timeout, return_format=return_format)
+            parts.append(part.reindex(columns=columns))
+        bindings = pd.concat(parts, ignore_index=True) if len(parts) > 0 else pd.DataFrame(columns=columns)
+        join_cols = [col for col in columns if col in df.columns]
+        return df.merge(bindings, on=join_cols, how='left' if node.is_optional else 'inner')
+
+    def __join(self, df, node, client, return_format, timeout, limit, kwargs):
+        """
+        joins the result with the result of the second dataset of a join step. The second dataset has to be a cached
+        dataset or derived from one, and the join columns can't have unbound values
+        :return: the joined result or None if the join can't be evaluated locally
+        """
+        second_dataset = node.second_dataset
+        how = Materializer.JOIN_TYPES.get(node.join_type)
+        if how is None or not Materializer.is_materialized(second_dataset):
+            return None
+        if any(isinstance(n, Materializer.MODIFIER_OPERATORS) for n in second_dataset.query_queue.queue):
+            # the join would apply to the second dataset's query as a subquery
+            return None
+        second_df = second_dataset.execute(client, return_format=return_format, timeout=timeout, limit=limit,
+                                           **kwargs)
+        new_col = node.new_col_name if node.new_col_name is not None else node.src_col_name
+        df = df.rename(columns={node.src_col_name: new_col})
+        second_df = second_df.rename(columns={node.second_col_name: new_col})
+        join_cols = [col for col in df.columns if col in second_df.columns]
+        if any(df[col].isna().any() or second_df[col].isna().any() for col in join_cols):
+            # an unbound value is compatible with any value in SPARQL
+            return None
+        df, second_df = align_categories(df, second_df, join_cols)
+        return df.merge(second_df, on=join_cols, how=how)
+
+    def __modifiers_model(self, nodes):
+        """
+        :return: a query model with only the order, the projection and the slice of the given steps
+        """
+        query_model = QueryModel()
+        for node in nodes:
+            if isinstance(node, Materializer.MODIFIER_OPERATORS):
+                node.visit_node(query_model, self.dataset, node)
+        return query_model
@@ -0,0 +1,143 @@
+"""
+Prefix compaction of the uri columns of query results. Every uri column is split into a column of namespace ids,
+one per namespace of the knowledge graph's prefixes, and a column of the local names after the namespace, so the
+namespace is stored once per result instead of in every value. The namespaces are kept in the dataframe's attrs, and
+expand_uris() rebuilds the full uris
+"""
+
+import numpy as np
+import pandas as pd
+
+from rdfframes.client.arrow_results import URI_PATTERN
+from rdfframes.client.result_parsers import URI
+
+# the suffix of the name of the namespace id column added before each compacted column
+NAMESPACE_SUFFIX = '_ns'
+# the namespace id of the uris that are in none of the namespaces and of the missing values, kept whole
+NO_NAMESPACE = -1
+
+
+class PrefixCompactor:
+    """
+    Splits uris into namespace ids and local names. A uri is matched with the longest namespace it starts with, so a
+    namespace nested in another one, e.g. dbpr: in http://dbpedia.org/, takes its uris
+    """
+    def __init__(self, prefixes):
+        """
+        :param prefixes: dictionary of the prefixes and their namespace uris. A namespace with several prefixes gets
+            one id
+        """
+        self.prefixes = []
+        self.namespaces = []
+        for prefix, namespace in sorted(prefixes.items()):
+            if len(namespace) > 0 and namespace not in self.namespaces:
+                self.prefixes.append(prefix)
+                self.namespaces.append(namespace)
+        # the ids of the namespaces, longest first
+        self.__order = sorted(range(len(self.namespaces)), key=lambda i: -len(self.namespaces[i]))
+
+    @staticmethod
+    def of_graph(graph):
+        """
+        :param graph: KnowledgeGraph
+        :return: PrefixCompactor of the prefixes of all the graphs of the knowledge graph
+        """
+        prefixes = {}
+        for graph_prefixes in graph.graph_prefixes.values():
+            for prefix, namespace in graph_prefixes.items():
+                prefixes.setdefault(prefix, namespace)
+        return PrefixCompactor(prefixes)
+
+    def split(self, column):
+        """
+        :param column: pandas series of uris
+        :return: (numpy array of the namespace ids, pandas series of the local names). The uris in none of the
+            namespaces have the id NO_NAMESPACE and keep their full value
+        """
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(column.cat.categories.dtype)
+        if column.dtype == object:
+            # the string operations are vectorized on the string dtype only
+            column = column.astype(pd.StringDtype())
+        ids = np.full(len(column), NO_NAMESPACE, dtype=self.__id_dtype())
+        remaining = column.notna().to_numpy(dtype=bool)
+        local = column.copy()
+        for i in self.__order:
+            if not remaining.any():
+                break
+            namespace = self.namespaces[i]
+            matched = remaining & column.str.startswith(namespace, na=False).to_numpy(dtype=bool)
+            if matched.any():
+                ids[matched] = i
+                local = local.where(~matched, column.str.slice(len(namespace)))
+                remaining = remaining & ~matched
+        return ids, local
+
+    def compact(self, df, columns=None):
+        """
+        :param df: pandas dataframe of a result
+        :param columns: the columns to compact. If None, the uri columns: the columns whose datatype is uri, or whose
+            values are all uris when it is unknown
+        :return: pandas dataframe where every compacted column holds the local names and is preceded by the column of
+            its namespace ids, named after it with NAMESPACE_SUFFIX. attrs['namespaces'] lists the namespace of each id
+            and attrs['compacted'] maps each compacted column to its namespace id column
+        """
+        if columns is None:
+            columns = [name for name in df.columns if PrefixCompactor.__is_uri_column(df, name)]
+        compacted = dict(df.attrs.get('compacted', {}))
+        result = df.copy()
+        for name in df.columns:
+            if name in columns and name not in compacted:
+                namespace_col = name + NAMESPACE_SUFFIX
+                if namespace_col in df.columns:
+                    raise Exception("can't compact column {}, the result has a column {}".format(name, namespace_col))
+                ids, result[name] = self.split(df[name])
+                result.insert(result.columns.get_loc(name), namespace_col, ids)
+                compacted[name] = namespace_col
+        if len(compacted) > 0:
+            result.attrs['namespaces'] = list(self.namespaces)
+            result.attrs['compacted'] = compacted
+        return result
+
+    def __id_dtype(self):
+        if len(self.namespaces) <= np.iinfo(np.int8).max:
+            return np.int8
+        if len(self.namespaces) <= np.iinfo(np.int16).max:
+            return np.int16
+        return np.int32
+
+    @staticmethod
+    def __is_uri_column(df, name):
+        datatype = df.attrs.get('datatypes', {}).get(name)
+        if datatype is not None:
+            return datatype == URI
+        column = df[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = pd.Series(column.cat.categories)
+        elif not (column.dtype == object or pd.api.types.is_string_dtype(column.dtype)):
+            return False
+        values = column.dropna()
+        if len(values) == 0 or not pd.api.types.infer_dtype(values, skipna=True) == 'string':
+            return False
+        return bool(values.str.match(URI_PATTERN).all())
+
+
+def expand_uris(df):
+    """
+    rebuilds the full uris of a dataframe compacted by PrefixCompactor.compact()
+    :param df: pandas dataframe with the namespaces and the compacted columns in its attrs
+    :return: pandas dataframe with the original columns
+    """
+    compacted = df.attrs.get('compacted', {})
+    if len(compacted) == 0:
+        return df
+    namespaces = df.attrs['namespaces']
+    result = df.drop(columns=list(compacted.values()))
+    for name, namespace_col in compacted.items():
+        ids = df[namespace_col].to_numpy()
+        column = df[name]
+        for i in np.unique(ids[ids != NO_NAMESPACE]):
+            column = column.where(ids != i, namespaces[i] + column)
+        result[name] = column
+    result.attrs = {key: value for key, value in df.attrs.items() if key not in ('namespaces', 'compacted')}
+    return result
@@ -0,0 +1,126 @@
+"""
+Answers a refined dataset from the cached result of a broader one. A dataset whose query queue is the queue of a cached
+dataset followed only by filter, select_cols, sort, limit or offset steps is computed from the cached dataframe
+without contacting the endpoint
+"""
+
+import copy
+
+from rdfframes.query_buffer.query_operators.shared.filter_operator import FilterOperator
+from rdfframes.query_buffer.query_operators.shared.limit_operator import LimitOperator
+from rdfframes.query_buffer.query_operators.shared.offset_operator import OffsetOperator
+from rdfframes.query_buffer.query_operators.shared.select_operator import SelectOperator
+from rdfframes.query_buffer.query_operators.shared.sort_operator import SortOperator
+from rdfframes.query_buffer.query_queue import QueryQueue
+from rdfframes.query_builder.filter_compiler import FilterCompiler, UnsupportedFilterError
+from rdfframes.query_builder.queue2querymodel import Queue2QueryModelConverter
+from rdfframes.utils.constants import SortingOrder
+
+
+class SemanticCache:
+    """
+    Finds the longest prefix of a dataset's query queue whose result is in the client's cache and evaluates the rest
+    of the queue on it. The rest is evaluated with the semantics of the full SPARQL query: the filters apply before
+    the order, the projection (SELECT DISTINCT) and the limit, whatever their order in the queue
+    """
+    LOCAL_OPERATORS = (FilterOperator, SelectOperator, SortOperator, LimitOperator, OffsetOperator)
+
+    def __init__(self, dataset):
+        """
+        :param dataset: the dataset to answer
+        """
+        self.dataset = dataset
+        prefixes = {}
+        for graph_prefixes in dataset.graph.graph_prefixes.values():
+            prefixes.update(graph_prefixes)
+        self.filter_compiler = FilterCompiler(prefixes)
+
+    def answer(self, client, return_format=None):
+        """
+        :param client: the client whose cache is searched
+        :param return_format: the return format the dataset would be executed with
+        :return: pandas dataframe of the dataset's result or None if it can't be computed from a cached result
+        """
+        if getattr(client, 'cache', None) is None or self.dataset.type() != "ExpandableDataset":
+            return None
+        nodes = self.dataset.query_queue.queue
+        query_model = None
+        for prefix_length in range(len(nodes) - 1, 0, -1):
+            prefix, suffix = nodes[:prefix_length], nodes[prefix_length:]
+            if not isinstance(suffix[0], SemanticCache.LOCAL_OPERATORS):
+                # the earlier prefixes would have this step in their suffix too
+                break
+            if any(isinstance(node, (LimitOperator, OffsetOperator)) for node in prefix):
+                # the filters of the suffix apply before the limit of the prefix in the full query
+                continue
+            df = client.cached_result(self.__prefix_dataset(prefix).to_sparql(), return_format)
+            if df is None:
+                continue
+            if query_model is None:
+                query_model = Queue2QueryModelConverter(self.dataset).to_query_model()
+            result = self.evaluate(df, suffix, query_model)
+            if result is not None:
+                client.stats.add('semantic_cache_hits')
+                return result
+        return None
+
+    def __prefix_dataset(self, prefix):
+        """
+        :return: a shallow copy of the dataset whose query queue is the given prefix
+        """
+        ds = copy.copy(self.dataset)
+        ds.query_queue = QueryQueue(ds)
+        for node in prefix:
+            ds.query_queue.append_node(node)
+        return ds
+
+    @staticmethod
+    def is_typed(df):
+        """
+        :return: True if the result was parsed from typed results (JSON or TSV) and has the datatypes and the language
+            tags of its columns. The values of a CSV result don't tell an iri from a literal or "2015" from 2015
+        """
+        return 'datatypes' in df.attrs
+
+    def evaluate(self, df, suffix, query_model):
+        """
+        evaluates filter, select_cols, sort, limit and offset steps on a result
+        :param df: the cached result of the prefix
+        :param suffix: the steps after the prefix
+        :param query_model: the query model of the full dataset, giving the order, the projection and the slice
+        :return: the result of the full dataset or None if a step can't be evaluated locally
+        """
+        if query_model.parent_query_model is not None or len(query_model.subqueries) > 0:
+            return None
+        conditions = [(node.src_col_name, node.conditions) for node in suffix if isinstance(node, FilterOperator)]
+        if any(col_name not in df.columns for col_name, _ in conditions):
+            return None
+        mask = self.filter_compiler.compile_all(conditions, SemanticCache.is_typed(df))
+        if mask is None:
+            return None
+        if len(conditions) > 0:
+            try:
+                df = df[mask(df)]
+            except UnsupportedFilterError:
+                return None
+
+        if any(isinstance(node, SortOperator) for node in suffix) and len(query_model.order_clause) > 0:
+            order_cols = list(query_model.order_clause.keys())
+            if any(col not in df.columns for col in order_cols):
+                return None
+            ascending = [query_model.order_clause[col] != SortingOrder.DESC for col in order_cols]
+            df = df.sort_values(order_cols, ascending=ascending, kind='mergesort',
+                                na_position='first' if all(ascending) else 'last')
+
+        if any(isinstance(node, SelectOperator) for node in suffix):
+            select_cols = list(query_model.select_columns.union(query_model.auto_generated_select_columns))
+            if any(col not in df.columns for col in select_cols):
+                return None
+            if len(select_cols) > 0 and not query_model.select_all:
+                # SPARQLBuilder projects the selected columns with SELECT DISTINCT
+                df = df[select_cols].drop_duplicates()
+
+        if query_model.offset > 0 or query_model.limit > 0:
+            end = query_model.offset + query_model.limit if query_model.limit > 0 else None
+            df = df.iloc[query_model.offset:end]
+        return df.reset_index(drop=True)
@@ -0,0 +1,801 @@
+"""
+Evaluation of dataset filter conditions on query results that are already in a pandas dataframe, so a refined
+dataset can be answered without sending its query to the endpoint. A condition is parsed into an expression tree
+whose nodes evaluate to whole columns at once, so the filters run as vectorized pandas/numpy operations
+"""
+
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+from rdfframes.utils.helper_functions import is_uri
+
+TOKENS = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<var>[?$]\w+)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<lang>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+  | (?P<datatype>\^\^)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<operator>&&|\|\||!=|<=|>=|[=<>!+\-*/(),])
+  | (?P<name>(?:[A-Za-z][\w-]*)?:[\w-]*(?:\.[\w-]+)*|[A-Za-z_]\w*)
+''', re.VERBOSE)
+IRI = re.compile(r'<([^<>"{}|^`\\\s]*)>')
+ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+NUMERIC_TYPES = ('integer', 'int', 'long', 'short', 'byte', 'decimal', 'double', 'float', 'nonNegativeInteger',
+                 'positiveInteger', 'negativeInteger', 'nonPositiveInteger', 'unsignedInt', 'unsignedLong')
+DATETIME_TYPES = ('dateTime', 'date', 'dateTimeStamp')
+COMPARISONS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+               '>=': operator.ge}
+ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+REGEX_FLAGS = {'i': re.IGNORECASE, 's': re.DOTALL, 'm': re.MULTILINE, 'x': re.VERBOSE}
+
+
+class UnsupportedFilterError(Exception):
+    """
+    Raised for a filter that can't be evaluated on a dataframe, either because it is outside the supported subset
+    of SPARQL or because the result lacks the information it needs, e.g. the language tags of a column
+    """
+    pass
+
+
+class FilterCompiler:
+    """
+    Compiles the filter conditions of a dataset into functions computing a boolean mask over a dataframe. The
+    supported subset of SPARQL covers comparisons, IN and NOT IN, &&, || and !, arithmetic and the functions regex,
+    str, isIRI, isLiteral, bound, lang, langMatches, year, month, day, lcase, ucase, strlen, contains, strstarts,
+    strends and the xsd casts. Conditions that are not supported can't be evaluated locally, compile() returns None
+    for them and the query has to be sent to the endpoint
+    """
+    def __init__(self, prefixes=None):
+        """
+        :param prefixes: dictionary of the prefixes of the graph, used to expand the prefixed names in the conditions
+        """
+        self.prefixes = prefixes if prefixes is not None else {}
+
+    def compile(self, col_name, condition, typed=True):
+        """
+        :param col_name: the filtered column
+        :param condition: the filter condition as passed to Dataset.filter(), e.g. '>= 2015', '= dbpr:USA',
+            'IN (dbpr:A, dbpr:B)' or 'regex(str(?country), "USA")'
+        :param typed: False if the dataframe is an untyped result, e.g. parsed from CSV, where an iri and a literal
+            with the same text, or literals with different datatypes or language tags, have the same value. Comparing
+            a column with =, !=, <, <=, >, >= or IN is not supported on such a result
+        :return: a function taking a dataframe and returning a boolean numpy array or None if the condition is not
+            supported
+        """
+        try:
+            expression = self.parse(FilterCompiler.expression_string(col_name, condition))
+            if not typed and _compares_variable(expression):
+                raise UnsupportedFilterError("comparing ?{} needs the datatypes of the result".format(col_name))
+        except UnsupportedFilterError:
+            return None
+        return expression.mask
+
+    def compile_all(self, conditions, typed=True):
+        """
+        :param conditions: list of (column name, condition) pairs combined with AND
+        :param typed: False if the dataframe is an untyped result, see compile()
+        :return: a function computing the mask of all the conditions or None if one of them is not supported. The
+            function raises UnsupportedFilterError if the dataframe lacks the information a condition needs
+        """
+        compiled = [self.compile(col_name, condition, typed) for col_name, condition in conditions]
+        if any(function is None for function in compiled):
+            return None
+
+        def evaluate(df):
+            mask = np.ones(len(df), dtype=bool)
+            for function in compiled:
+                mask &= function(df)
+            return mask
+        return evaluate
+
+    @staticmethod
+    def expression_string(col_name, condition):
+        """
+        builds the filter expression of a condition the way SPARQLBuilder does
+        :return: the SPARQL expression of the condition
+        """
+        if any(condition.find(function) >= 0 for function in ('isIRI', 'langMatches', 'regex')):
+            return condition
+        if "date" not in col_name:
+            return "?%s %s" % (col_name, condition)
+        return "year(xsd:dateTime(?%s)) %s" % (col_name, condition)
+
+    def parse(self, expression):
+        """
+        :param expression: a SPARQL filter expression
+        :return: the root Expression of the expression tree
+        """
+        return _Parser(self.__tokenize(expression), self.prefixes).parse()
+
+    @staticmethod
+    def __tokenize(expression):
+        """
+        :return: list of (kind, text) pairs
+        """
+        tokens = []
+        position = 0
+        while position < len(expression):
+            # '<' starts an iri where an operand is expected and is the less than operator after an operand
+            after_operand = len(tokens) > 0 and (tokens[-1][0] in ('var', 'string', 'lang', 'number', 'iri') or
+                                                 tokens[-1] == ('operator', ')') or
+                                                 (tokens[-1][0] == 'name' and tokens[-1][1].upper() not in
+                                                  ('IN', 'NOT')))
+            match = IRI.match(expression, position) if not after_operand else None
+            if match is not None:
+                tokens.append(('iri', match.group(1)))
+                position = match.end()
+                continue
+            match = TOKENS.match(expression, position)
+            if match is None:
+                raise UnsupportedFilterError("unexpected character at {} in {}".format(position, expression))
+            if match.lastgroup != 'space':
+                tokens.append((match.lastgroup, match.group()))
+            position = match.end()
+        return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser of the SPARQL expression grammar, from || down to the primary expressions
+    """
+    def __init__(self, tokens, prefixes):
+        self.tokens = tokens
+        self.prefixes = prefixes
+        self.position = 0
+
+    def parse(self):
+        expression = self.__or()
+        if self.position < len(self.tokens):
+            raise UnsupportedFilterError("unexpected token {}".format(self.tokens[self.position][1]))
+        return expression
+
+    def __peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return None, None
+
+    def __next(self):
+        token = self.__peek()
+        if token[0] is None:
+            raise UnsupportedFilterError("unexpected end of the expression")
+        self.position += 1
+        return token
+
+    def __accept(self, *texts):
+        kind, text = self.__peek()
+        if kind in ('operator', 'name') and (text in texts or text.upper() in texts):
+            self.position += 1
+            return text
+        return None
+
+    def __expect(self, text):
+        if self.__accept(text) is None:
+            raise UnsupportedFilterError("expected {}".format(text))
+
+    def __or(self):
+        expression = self.__and()
+        while self.__accept('||'):
+            expression = Or(expression, self.__and())
+        return expression
+
+    def __and(self):
+        expression = self.__relational()
+        while self.__accept('&&'):
+            expression = And(expression, self.__relational())
+        return expression
+
+    def __relational(self):
+        expression = self.__additive()
+        comparison = self.__accept(*COMPARISONS)
+        if comparison is not None:
+            return Comparison(comparison, expression, self.__additive())
+        negated = self.__accept('NOT') is not None
+        if negated or self.__accept('IN'):
+            if negated:
+                self.__expect('IN')
+            return In(expression, self.__arguments(), negated)
+        return expression
+
+    def __additive(self):
+        expression = self.__multiplicative()
+        while True:
+            arithmetic = self.__accept('+', '-')
+            if arithmetic is None:
+                return expression
+            expression = Arithmetic(arithmetic, expression, self.__multiplicative())
+
+    def __multiplicative(self):
+        expression = self.__unary()
+        while True:
+            arithmetic = self.__accept('*', '/')
+            if arithmetic is None:
+                return expression
+            expression = Arithmetic(arithmetic, expression, self.__unary())
+
+    def __unary(self):
+        if self.__accept('!'):
+            return Not(self.__unary())
+        if self.__accept('+'):
+            return self.__unary()
+        if self.__accept('-'):
+            operand = self.__unary()
+            if isinstance(operand, Constant) and operand.kind == 'number':
+                return Constant(-operand.value, 'number')
+            return Arithmetic('-', Constant(0, 'number'), operand)
+        return self.__primary()
+
+    def __arguments(self):
+        self.__expect('(')
+        arguments = []
+        if self.__accept(')'):
+            return arguments
+        arguments.append(self.__or())
+        while self.__accept(','):
+            arguments.append(self.__or())
+        self.__expect(')')
+        return arguments
+
+    def __primary(self):
+        kind, text = self.__next()
+        if kind == 'operator' and text == '(':
+            expression = self.__or()
+            self.__expect(')')
+            return expression
+        if kind == 'var':
+            return Variable(text[1:])
+        if kind == 'number':
+            return Constant(float(text) if any(c in text for c in '.eE') else int(text), 'number')
+        if kind == 'iri':
+            return Constant(text, 'iri')
+        if kind == 'string':
+            return self.__literal(text)
+        if kind == 'name':
+            if self.__peek() == ('operator', '('):
+                return self.__call(text)
+            if text in ('true', 'false'):
+                return Constant(text == 'true', 'boolean')
+            return Constant(self.__expand(text), 'iri')
+        raise UnsupportedFilterError("unexpected token {}".format(text))
+
+    def __literal(self, text):
+        value = re.sub(r'\\(.)', lambda m: ESCAPES.get(m.group(1), m.group(1)), text[1:-1])
+        kind, suffix = self.__peek()
+        if kind == 'lang':
+            self.position += 1
+            return Constant(value, 'string', language=suffix[1:])
+        if kind == 'datatype':
+            self.position += 1
+            kind, datatype = self.__next()
+            if kind == 'name':
+                datatype = self.__expand(datatype)
+            elif kind != 'iri':
+                raise UnsupportedFilterError("expected a datatype after ^^")
+            return Constant.typed(value, datatype)
+        return Constant(value, 'string')
+
+    def __call(self, name):
+        arguments = self.__arguments()
+        if ':' in name:
+            iri = self.__expand(name)
+            if not iri.startswith(XSD):
+                raise UnsupportedFilterError("function {} is not supported".format(name))
+            if len(arguments) != 1:
+                raise UnsupportedFilterError("{} takes one argument".format(name))
+            return Cast(iri[len(XSD):], arguments[0])
+        return Call(name.lower(), arguments)
+
+    def __expand(self, name):
+        prefix, _, local_name = name.partition(':')
+        if prefix in self.prefixes:
+            return self.prefixes[prefix] + local_name
+        if prefix == 'xsd':
+            return XSD + local_name
+        raise UnsupportedFilterError("unknown prefix in {}".format(name))
+
+
+def _series(values, n):
+    """
+    :return: the values as a series with a positional index, a scalar repeated n times
+    """
+    if isinstance(values, pd.Series):
+        return values
+    return pd.Series([values] * n, dtype=object if values is None else None)
+
+
+def _boolean(values, defined):
+    """
+    :return: nullable boolean series, NA where the value is an error
+    """
+    values = np.asarray(values, dtype=bool)
+    return pd.Series(pd.arrays.BooleanArray(values, ~np.asarray(defined, dtype=bool)))
+
+
+def _is_string(series):
+    """
+    :return: boolean numpy array, True for the values that are strings
+    """
+    if isinstance(series.dtype, pd.StringDtype):
+        return series.notna().to_numpy(dtype=bool)
+    if series.dtype != object:
+        return np.zeros(len(series), dtype=bool)
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        return series.notna().to_numpy(dtype=bool)
+    return np.fromiter((isinstance(v, str) for v in series.to_numpy()), dtype=bool, count=len(series))
+
+
+def _strings(series):
+    """
+    :return: object series of the string values, None for the other values
+    """
+    if isinstance(series.dtype, pd.StringDtype):
+        return series
+    strings = _is_string(series)
+    if strings.all():
+        return series.astype(object)
+    return pd.Series(np.where(strings, series.to_numpy(dtype=object), None), dtype=object)
+
+
+def _numbers(series):
+    """
+    :return: float series of the numeric values, NaN for the other values
+    """
+    if series.dtype == bool or isinstance(series.dtype, pd.BooleanDtype):
+        return pd.Series(np.full(len(series), np.nan))
+    return pd.to_numeric(series, errors='coerce').astype(float)
+
+
+def _datetimes(series):
+    """
+    :return: utc datetime series, NaT for the values that are not dates
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series if series.dt.tz is not None else series.dt.tz_localize('UTC')
+    strings = _strings(series.astype(object).where(series.notna(), None).map(
+        lambda v: str(v) if isinstance(v, (int, np.integer)) and not isinstance(v, bool) else v))
+    return pd.to_datetime(strings, errors='coerce', utc=True, format='ISO8601')
+
+
+def _lexical(series):
+    """
+    :return: object series of the lexical forms of the values as str() gives them in SPARQL
+    """
+    if series.dtype == bool or isinstance(series.dtype, pd.BooleanDtype):
+        return pd.Series(np.where(series.isna(), None, np.where(series.fillna(False), 'true', 'false')),
+                         dtype=object)
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if len(values) > 0 and (values == np.round(values)).all():
+            series = series.astype('Int64')
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(object).where(series.notna(), None).map(lambda v: None if v is None else str(v))
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype(object).where(series.notna(), None).map(
+            lambda v: None if v is None else v.isoformat())
+    if isinstance(series.dtype, pd.StringDtype) or pd.api.types.infer_dtype(series, skipna=True) in ('string',
+                                                                                                    'empty'):
+        return series
+    return series.map(lambda v: v if isinstance(v, str) else
+                      None if v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v)) else
+                      ('true' if v else 'false') if isinstance(v, (bool, np.bool_)) else str(v))
+
+
+def _compares_variable(expression):
+    """
+    :return: True if the expression compares a variable itself, not a function of it, with another value
+    """
+    if isinstance(expression, Comparison):
+        operands = [expression.left, expression.right]
+    elif isinstance(expression, In):
+        operands = [expression.operand] + list(expression.items)
+    else:
+        operands = []
+    if any(isinstance(operand, Variable) for operand in operands):
+        return True
+    children = [getattr(expression, name) for name in ('left', 'right', 'operand') if hasattr(expression, name)]
+    children += list(getattr(expression, 'arguments', [])) + list(getattr(expression, 'items', []))
+    return any(_compares_variable(child) for child in children if isinstance(child, Expression))
+
+
+def _effective_boolean_value(series):
+    """
+    :return: the effective boolean value of the values as a nullable boolean series
+    """
+    if isinstance(series.dtype, pd.BooleanDtype):
+        return series
+    if series.dtype == bool:
+        return series.astype('boolean')
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = series.to_numpy(dtype=float)
+        return _boolean(~np.isnan(numbers) & (numbers != 0), ~np.isnan(numbers))
+    strings = _is_string(series)
+    return _boolean(strings & (series.map(lambda v: isinstance(v, str) and len(v) > 0).to_numpy(dtype=bool)),
+                    strings)
+
+
+class Expression:
+    """
+    A node of the expression tree of a filter. evaluate() computes the values of the node for all the rows of a
+    dataframe: unbound values and errors are missing values and a boolean node gives a nullable boolean series
+    """
+    def evaluate(self, df):
+        """
+        :param df: the dataframe the filter applies to
+        :return: a series with a positional index, or a python value for a constant
+        """
+        raise NotImplementedError
+
+    def values(self, df):
+        """
+        :return: the values of the node as a series, constants repeated for all the rows
+        """
+        return _series(self.evaluate(df), len(df))
+
+    def mask(self, df):
+        """
+        :return: boolean numpy array, True for the rows the filter keeps. An error drops the row like in SPARQL
+        """
+        result = _effective_boolean_value(self.values(df))
+        return result.fillna(False).to_numpy(dtype=bool)
+
+
+class Variable(Expression):
+    def __init__(self, name):
+        self.name = name
+
+    def evaluate(self, df):
+        if self.name not in df.columns:
+            return pd.Series([None] * len(df), dtype=object)
+        column = df[self.name].reset_index(drop=True)
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # the conditions compare the values of a categorical column, not its codes
+            return column.astype(column.cat.categories.dtype)
+        return column
+
+    def attribute(self, df, attribute):
+        """
+        :return: the value of a per column attribute of a typed result, 'datatypes' or 'languages', for this variable
+        """
+        return df.attrs.get(attribute, {}).get(self.name)
+
+
+class Constant(Expression):
+    def __init__(self, value, kind, language=None):
+        """
+        :param value: the python value of the constant
+        :param kind: 'number', 'string', 'boolean', 'datetime' or 'iri'
+        :param language: the language tag of a string
+        """
+        self.value = value
+        self.kind = kind
+        self.language = language
+
+    @staticmethod
+    def typed(value, datatype):
+        """
+        :return: the constant of a typed literal
+        """
+        local_name = datatype[len(XSD):] if datatype.startswith(XSD) else None
+        if local_name in NUMERIC_TYPES:
+            number = pd.to_numeric(value, errors='coerce')
+            if pd.isna(number):
+                raise UnsupportedFilterError("invalid {} literal {}".format(local_name, value))
+            return Constant(int(number) if float(number).is_integer() and local_name not in ('decimal', 'double',
+                                                                                             'float')
+                            else float(number), 'number')
+        if local_name in DATETIME_TYPES:
+            timestamp = pd.to_datetime(value, errors='coerce', utc=True)
+            if pd.isna(timestamp):
+                raise UnsupportedFilterError("invalid {} literal {}".format(local_name, value))
+            return Constant(timestamp, 'datetime')
+        if local_name == 'boolean':
+            return Constant(value in ('true', '1'), 'boolean')
+        return Constant(value, 'string')
+
+    def evaluate(self, df):
+        return self.value
+
+
+class Not(Expression):
+    def __init__(self, operand):
+        self.operand = operand
+
+    def evaluate(self, df):
+        return ~_effective_boolean_value(self.operand.values(df))
+
+
+class And(Expression):
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def evaluate(self, df):
+        # nullable booleans follow the three valued logic of SPARQL: false && error is false
+        return _effective_boolean_value(self.left.values(df)) & _effective_boolean_value(self.right.values(df))
+
+
+class Or(Expression):
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def evaluate(self, df):
+        return _effective_boolean_value(self.left.values(df)) | _effective_boolean_value(self.right.values(df))
+
+
+class Comparison(Expression):
+    def __init__(self, comparison, left, right):
+        self.comparison = comparison
+        self.left = left
+        self.right = right
+
+    def evaluate(self, df):
+        if self.__different_language(df):
+            # language tagged literals with different tags are never equal
+            bound = self.left.values(df).notna() & self.right.values(df).notna()
+            return _boolean(np.full(len(df), self.comparison == '!='), bound)
+        return Comparison.compare(self.comparison, self.left.evaluate(df), self.right.evaluate(df), len(df))
+
+    def __different_language(self, df):
+        """
+        :return: True if one side is a language tagged constant and the other a column with another language tag
+        """
+        for constant, variable in ((self.left, self.right), (self.right, self.left)):
+            if isinstance(constant, Constant) and constant.language is not None and isinstance(variable, Variable):
+                language = variable.attribute(df, 'languages')
+                if language is not None and self.comparison in ('=', '!='):
+                    return language.lower() != constant.language.lower()
+        return False
+
+    @staticmethod
+    def compare(comparison, left, right, n):
+        """
+        compares two series, or a series and a python value. The values are compared as numbers if one side is a
+        number, as dates if one side is a date and as strings otherwise. Values that can't be compared give an error
+        :return: nullable boolean series
+        """
+        function = COMPARISONS[comparison]
+        scalars = [value for value in (left, right) if not isinstance(value, pd.Series)]
+        series = [value for value in (left, right) if isinstance(value, pd.Series)]
+        if any(isinstance(value, (bool, np.bool_)) for value in scalars) or \
+                (len(scalars) == 0 and all(s.dtype == bool or isinstance(s.dtype, pd.BooleanDtype) for s in series)):
+            convert = Comparison.__booleans
+        elif any(isinstance(value, (int, float, np.number)) for value in scalars) or \
+                (len(scalars) == 0 and all(pd.api.types.is_numeric_dtype(s) for s in series)):
+            convert = _numbers
+        elif any(isinstance(value, pd.Timestamp) for value in scalars) or \
+                any(pd.api.types.is_datetime64_any_dtype(s) for s in series):
+            convert = _datetimes
+        else:
+            convert = _strings
+        left, right = [convert(value) if isinstance(value, pd.Series) else value for value in (left, right)]
+        if convert is _strings and any(not isinstance(value, str) for value in (left, right)
+                                       if not isinstance(value, pd.Series)):
+            return _boolean(np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+        defined = np.ones(n, dtype=bool)
+        for value in (left, right):
+            if isinstance(value, pd.Series):
+                defined &= value.notna().to_numpy(dtype=bool)
+        if not defined.any():
+            return _boolean(np.zeros(n, dtype=bool), defined)
+        left, right = [Comparison.__filled(value, defined) for value in (left, right)]
+        return _boolean(np.asarray(function(left, right), dtype=bool) & defined, defined)
+
+    @staticmethod
+    def __booleans(series):
+        if series.dtype == bool or isinstance(series.dtype, pd.BooleanDtype):
+            return series
+        return series.map(lambda v: bool(v) if isinstance(v, (bool, np.bool_)) else
+                          {'true': True, 'false': False}.get(v) if isinstance(v, str) else None)
+
+    @staticmethod
+    def __filled(value, defined):
+        """
+        :return: the values with the missing values replaced by a value of the same type, so the comparison doesn't
+            raise on them
+        """
+        if not isinstance(value, pd.Series) or defined.all():
+            return value
+        return value.where(pd.Series(defined), value[defined].iloc[0])
+
+
+class In(Expression):
+    def __init__(self, operand, items, negated):
+        self.operand = operand
+        self.items = items
+        self.negated = negated
+
+    def evaluate(self, df):
+        # IN is true if one of the items is equal to the operand, an error if none is and a comparison failed
+        result = _boolean(np.zeros(len(df), dtype=bool), np.ones(len(df), dtype=bool))
+        for item in self.items:
+            result = result | Comparison('=', self.operand, item).evaluate(df)
+        return ~result if self.negated else result
+
+
+class Arithmetic(Expression):
+    def __init__(self, arithmetic, left, right):
+        self.arithmetic = arithmetic
+        self.left = left
+        self.right = right
+
+    def evaluate(self, df):
+        left, right = [_numbers(value) if isinstance(value, pd.Series) else value
+                       for value in (self.left.evaluate(df), self.right.evaluate(df))]
+        if any(not isinstance(value, (pd.Series, int, float)) or isinstance(value, bool) for value in (left, right)):
+            return pd.Series(np.full(len(df), np.nan))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = ARITHMETIC[self.arithmetic](left, right)
+        if not isinstance(result, pd.Series):
+            return result
+        return result.replace([np.inf, -np.inf], np.nan)
+
+
+class Cast(Expression):
+    def __init__(self, datatype, operand):
+        """
+        :param datatype: the local name of the xsd datatype
+        """
+        if datatype not in NUMERIC_TYPES + DATETIME_TYPES + ('string', 'boolean'):
+            raise UnsupportedFilterError("cast to xsd:{} is not supported".format(datatype))
+        self.datatype = datatype
+        self.operand = operand
+
+    def evaluate(self, df):
+        values = self.operand.values(df)
+        if self.datatype in NUMERIC_TYPES:
+            return _numbers(values)
+        if self.datatype in DATETIME_TYPES:
+            return _datetimes(values)
+        if self.datatype == 'string':
+            return _lexical(values)
+        return Comparison.compare('=', _lexical(values).map(lambda v: {'1': 'true', '0': 'false'}.get(v, v)),
+                                  'true', len(df))
+
+
+class Call(Expression):
+    """
+    A call to one of the built in functions of SPARQL
+    """
+    ARITY = {'regex': (2, 3), 'str': (1, 1), 'isiri': (1, 1), 'isuri': (1, 1), 'isliteral': (1, 1),
+             'isblank': (1, 1), 'bound': (1, 1), 'lang': (1, 1), 'langmatches': (2, 2), 'year': (1, 1),
+             'month': (1, 1), 'day': (1, 1), 'lcase': (1, 1), 'ucase': (1, 1), 'strlen': (1, 1),
+             'contains': (2, 2), 'strstarts': (2, 2), 'strends': (2, 2)}
+
+    def __init__(self, name, arguments):
+        arity = Call.ARITY.get(name)
+        if arity is None:
+            raise UnsupportedFilterError("function {} is not supported".format(name))
+        if not arity[0] <= len(arguments) <= arity[1]:
+            raise UnsupportedFilterError("wrong number of arguments to {}".format(name))
+        if name == 'bound' and not isinstance(arguments[0], Variable):
+            raise UnsupportedFilterError("bound takes a variable")
+        if name == 'regex' and any(not isinstance(argument, Constant) or argument.kind != 'string'
+                                   for argument in arguments[1:]):
+            raise UnsupportedFilterError("the pattern and the flags of regex have to be strings")
+        self.name = name
+        self.arguments = arguments
+
+    def evaluate(self, df):
+        argument = self.arguments[0]
+        if self.name == 'bound':
+            return argument.values(df).notna().astype('boolean')
+        if self.name in ('isiri', 'isuri', 'isliteral', 'isblank'):
+            return self.__term_type(df, argument)
+        if self.name == 'lang':
+            return self.__language(df, argument)
+        if self.name == 'langmatches':
+            return self.__language_matches(df)
+        if self.name in ('year', 'month', 'day'):
+            dates = _datetimes(argument.values(df))
+            return getattr(dates.dt, self.name).astype(float)
+        if self.name == 'str':
+            return _lexical(argument.values(df))
+
+        strings = self.__string_argument(df, argument)
+        if self.name == 'regex':
+            flags = 0
+            for flag in (self.arguments[2].value if len(self.arguments) > 2 else ''):
+                flags |= REGEX_FLAGS.get(flag, 0)
+            return self.__string_test(strings, lambda s: s.str.contains(self.arguments[1].value, regex=True,
+                                                                        flags=flags))
+        if self.name == 'lcase':
+            return strings.str.lower()
+        if self.name == 'ucase':
+            return strings.str.upper()
+        if self.name == 'strlen':
+            return strings.str.len().astype(float)
+        other = self.arguments[1].evaluate(df)
+        if not isinstance(other, str):
+            other = self.__string_argument(df, self.arguments[1])
+            pairs = pd.DataFrame({'s': strings, 'o': other})
+            defined = pairs.notna().all(axis=1).to_numpy(dtype=bool)
+            test = {'contains': lambda s, o: o in s, 'strstarts': str.startswith, 'strends': str.endswith}[self.name]
+            values = [bool(test(s, o)) if d else False for s, o, d in zip(pairs['s'], pairs['o'], defined)]
+            return _boolean(values, defined)
+        if self.name == 'contains':
+            return self.__string_test(strings, lambda s: s.str.contains(other, regex=False))
+        if self.name == 'strstarts':
+            return self.__string_test(strings, lambda s: s.str.startswith(other))
+        return self.__string_test(strings, lambda s: s.str.endswith(other))
+
+    @staticmethod
+    def __string_argument(df, argument):
+        """
+        :return: the string values of an argument, None for the other values
+        """
+        value = argument.evaluate(df)
+        if not isinstance(value, pd.Series):
+            return pd.Series([value if isinstance(value, str) else None] * len(df), dtype=object)
+        return _strings(value)
+
+    @staticmethod
+    def __string_test(strings, test):
+        """
+        :return: nullable boolean series of a test on the strings, an error for the values that are not strings
+        """
+        defined = strings.notna().to_numpy(dtype=bool)
+        values = np.zeros(len(strings), dtype=bool)
+        if defined.any():
+            values[defined] = test(strings[defined].astype(str)).to_numpy(dtype=bool)
+        return _boolean(values, defined)
+
+    def __term_type(self, df, argument):
+        """
+        the type of the terms is given by the datatypes of a typed result. Otherwise the strings that look like uris
+        are taken to be iris, the result formats without term types don't tell them apart from literals
+        """
+        values = argument.values(df)
+        bound = values.notna().to_numpy(dtype=bool)
+        datatype = argument.attribute(df, 'datatypes') if isinstance(argument, Variable) else None
+        if isinstance(argument, Constant):
+            iri = np.full(len(df), argument.kind == 'iri')
+        elif datatype is not None:
+            iri = np.full(len(df), datatype == 'uri')
+            blank = np.full(len(df), datatype == 'bnode')
+        else:
+            strings = _is_string(values)
+            iri = strings.copy()
+            iri[strings] = [is_uri(v) for v in values.to_numpy(dtype=object)[strings]]
+        if datatype is None:
+            blank = np.zeros(len(df), dtype=bool)
+        if self.name in ('isiri', 'isuri'):
+            return _boolean(iri, bound)
+        if self.name == 'isblank':
+            return _boolean(blank, bound)
+        return _boolean(~iri & ~blank, bound)
+
+    @staticmethod
+    def __language(df, argument):
+        """
+        :return: the language tags of the values. A result only knows them for the columns with one common tag
+        """
+        if isinstance(argument, Constant):
+            return argument.language or ''
+        values = argument.values(df)
+        bound = values.notna()
+        language = argument.attribute(df, 'languages') if isinstance(argument, Variable) else None
+        if language is None:
+            datatype = argument.attribute(df, 'datatypes') if isinstance(argument, Variable) else None
+            if datatype is None or datatype == 'bnode':
+                raise UnsupportedFilterError("the language tags of {} are not known".format(
+                    getattr(argument, 'name', argument)))
+            if datatype != 'uri':
+                language = ''
+        return pd.Series(np.where(bound, language, None), dtype=object)
+
+    def __language_matches(self, df):
+        tags = self.__string_argument(df, self.arguments[0])
+        language_range = self.arguments[1].evaluate(df)
+        if not isinstance(language_range, str):
+            raise UnsupportedFilterError("the language range of langMatches has to be a string")
+        language_range = language_range.lower()
+        if language_range == '*':
+            return self.__string_test(tags, lambda s: s != '')
+        return self.__string_test(tags, lambda s: (s.str.lower() == language_range) |
+                                  s.str.lower().str.startswith(language_range + '-'))
@@ -0,0 +1,339 @@
+"""
+Evaluation of a query model on data that is already in pandas dataframes, without a SPARQL endpoint. The graph
+patterns are matched against a dataframe of triples and joined with vectorized merges, and the filters, the grouping,
+the aggregations, the order and the slice are computed with pandas
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from rdfframes.client.vocabulary import align_categories
+from rdfframes.query_builder.filter_compiler import FilterCompiler, UnsupportedFilterError
+from rdfframes.utils.constants import AggregationFunction, SortingOrder
+from rdfframes.utils.helper_functions import is_uri
+
+TRIPLE_COLUMNS = ('subject', 'predicate', 'object')
+
+
+class LocalExecutionError(Exception):
+    """
+    Raised when a query model uses a construct that can't be evaluated locally
+    """
+    pass
+
+
+class LocalExecutor:
+    """
+    Executes query models the way the SPARQL query built by SPARQLBuilder would be executed by an endpoint: the
+    triple patterns, the VALUES clause, the subqueries, the optional blocks and the unions of a query are joined, then
+    the filters apply, then the grouping and the aggregations, the having conditions, the order, the projection with
+    SELECT DISTINCT and the offset and limit.
+    Unbound values are NaN. They are only joined with unbound values, and never satisfy a filter
+    """
+    def __init__(self, triples=None):
+        """
+        :param triples: pandas dataframe of triples with the columns subject, predicate and object, and an optional
+            graph column with the uri of the graph of every triple. None if the queries only refine bindings passed
+            to execute()
+        """
+        if triples is not None and any(col not in triples.columns for col in TRIPLE_COLUMNS):
+            raise Exception("the triples dataframe needs the columns {}".format(list(TRIPLE_COLUMNS)))
+        self.triples = triples
+        self.__by_predicate = None
+        self.__filter_compiler = None
+        self.__default_graphs = set()
+        self.__prefixes = {}
+
+    def execute(self, query_model, bindings=None, bindings_model=None):
+        """
+        :param query_model: the query model to execute
+        :param bindings: pandas dataframe of solutions joined with the graph patterns of bindings_model, e.g. the
+            result of the graph patterns of the query fetched before
+        :param bindings_model: the query model, query_model or one of its subqueries, whose patterns are joined with
+            the bindings. If None, query_model
+        :return: pandas dataframe of the result of the query
+        """
+        self.__filter_compiler = FilterCompiler(query_model.prefixes)
+        self.__default_graphs = set(query_model.from_clause)
+        # the subqueries and the optional blocks use the prefixes of the outer query
+        self.__prefixes = dict(query_model.prefixes)
+        if bindings is not None and bindings_model is None:
+            bindings_model = query_model
+        return self.__execute(query_model, bindings, bindings_model)
+
+    def __execute(self, query_model, bindings, bindings_model):
+        df = self.__where(query_model, bindings if query_model is bindings_model else None, bindings, bindings_model)
+        df = self.__aggregate(df, query_model)
+        df = self.__having(df, query_model)
+        df = self.__order(df, query_model)
+        df = self.__project(df, query_model)
+        if query_model.offset > 0 or query_model.limit > 0:
+            end = query_model.offset + query_model.limit if query_model.limit > 0 else None
+            df = df.iloc[query_model.offset:end]
+        return df.reset_index(drop=True)
+
+    def __where(self, query_model, own_bindings, bindings, bindings_model, graph=None):
+        """
+        :return: the solutions of the graph patterns of a query model after its filters
+        """
+        df = own_bindings.reset_index(drop=True) if own_bindings is not None else LocalExecutor.__unit()
+        if query_model.values_clause is not None:
+            columns, rows = query_model.values_clause
+            values = pd.DataFrame([[np.nan if v is None else v for v in row] for row in rows], columns=columns)
+            df = LocalExecutor.__join(df, values)
+        for triple in query_model.triples:
+            df = LocalExecutor.__join(df, self.__match(triple, graph))
+        for graph_uri, triples in query_model.graph_triples.items():
+            for triple in triples:
+                df = LocalExecutor.__join(df, self.__match(triple, graph_uri))
+        for graph_uri, graph_query in query_model.graph_clause.items():
+            df = LocalExecutor.__join(df, self.__where(graph_query, None, bindings, bindings_model, graph_uri))
+        for graph_uri, graph_query in query_model.optional_graph_clause.items():
+            df = LocalExecutor.__join(df, self.__where(graph_query, None, bindings, bindings_model, graph_uri),
+                                      how='left')
+        for subquery in query_model.subqueries:
+            df = LocalExecutor.__join(df, self.__execute(subquery, bindings, bindings_model))
+        for optional in query_model.optionals:
+            df = LocalExecutor.__join(df, self.__where(optional, None, bindings, bindings_model, graph), how='left')
+        if len(query_model.unions) > 0:
+            union = pd.concat([self.__execute(union_query, bindings, bindings_model)
+                               for union_query in query_model.unions], ignore_index=True, sort=False)
+            df = LocalExecutor.__join(df, union)
+        for subquery in query_model.optional_subqueries:
+            df = LocalExecutor.__join(df, self.__execute(subquery, bindings, bindings_model), how='left')
+        return self.__filter(df, query_model)
+
+    def __match(self, triple, graph=None):
+        """
+        :return: the bindings of the variables of a triple pattern, one column per variable
+        """
+        if self.triples is None:
+            raise LocalExecutionError("the query has triple patterns but the executor has no triples")
+        triples = self.triples
+        terms = [LocalExecutor.__term(element, self.__prefixes) for element in triple[:3]]
+        if not terms[1][0]:
+            triples = self.__predicate_triples(terms[1][1])
+        if 'graph' in triples.columns:
+            if graph is not None:
+                triples = triples[triples['graph'] == graph]
+            elif len(self.__default_graphs) > 0:
+                # the default graph of the query is the merge of the graphs of its FROM clause
+                triples = triples[triples['graph'].isin(self.__default_graphs)]
+        mask = np.ones(len(triples), dtype=bool)
+        variables = OrderedDict()
+        for (is_variable, value), col in zip(terms, TRIPLE_COLUMNS):
+            if not is_variable:
+                mask &= (triples[col] == value).to_numpy(dtype=bool)
+            elif value in variables:
+                # the same variable twice in the pattern
+                mask &= (triples[col] == triples[variables[value]]).to_numpy(dtype=bool)
+            else:
+                variables[value] = col
+        matched = triples[mask]
+        return pd.DataFrame({variable: matched[col].to_numpy() for variable, col in variables.items()})
+
+    def __predicate_triples(self, predicate):
+        """
+        :return: the triples of a predicate. The triples are indexed by predicate the first time
+        """
+        if self.__by_predicate is None:
+            self.__by_predicate = {p: group for p, group in self.triples.groupby('predicate', sort=False)}
+        triples = self.__by_predicate.get(predicate)
+        if triples is None:
+            return self.triples.iloc[0:0]
+        return triples
+
+    def __filter(self, df, query_model):
+        conditions = [(col, condition) for col, col_conditions in query_model.filter_clause.items()
+                      for condition in col_conditions]
+        if len(conditions) == 0:
+            return df
+        if any(col not in df.columns for col, _ in conditions):
+            # an unbound variable never satisfies a filter
+            return df.iloc[0:0]
+        mask = self.__filter_compiler.compile_all(conditions)
+        if mask is None:
+            raise LocalExecutionError("the filters {} can't be evaluated locally".format(conditions))
+        try:
+            return df[mask(df)]
+        except UnsupportedFilterError as error:
+            raise LocalExecutionError(str(error))
+
+    def __aggregate(self, df, query_model):
+        """
+        :return: one row per group with the grouping columns and the aggregated columns
+        """
+        group_cols = list(query_model.groupBy_columns)
+        if len(group_cols) == 0 and len(query_model.aggregate_clause) == 0:
+            return df
+        for col in group_cols:
+            if col not in df.columns:
+                df = df.assign(**{col: np.nan})
+
+        if len(group_cols) == 0:
+            return pd.DataFrame({agg_col: [LocalExecutor.__aggregate_values(df, function, parameter, src_col)]
+                                 for agg_col, (function, parameter, src_col) in LocalExecutor.__aggregations(
+                                     query_model)})
+        result = df[group_cols].drop_duplicates().reset_index(drop=True)
+        for agg_col, (function, parameter, src_col) in LocalExecutor.__aggregations(query_model):
+            values = LocalExecutor.__aggregate_groups(df, group_cols, function, parameter, src_col)
+            values.name = agg_col
+            result = result.merge(values.reset_index(), on=group_cols, how='left')
+        return result
+
+    @staticmethod
+    def __aggregations(query_model):
+        """
+        :return: list of (aggregated column, (function, parameter, source column))
+        """
+        return [(agg_col, tuple(aggregations[0])) for agg_col, aggregations in query_model.aggregate_clause.items()]
+
+    @staticmethod
+    def __aggregate_groups(df, group_cols, function, parameter, src_col):
+        """
+        :return: pandas series of the aggregated value of every group, indexed by the grouping columns
+        """
+        distinct = parameter is not None and parameter.upper() == 'DISTINCT'
+        if src_col == '*':
+            if function != AggregationFunction.COUNT:
+                raise LocalExecutionError("{}(*) is not supported".format(function))
+            rows = df.drop_duplicates() if distinct else df
+            return rows.groupby(group_cols, dropna=False, sort=False).size()
+        if src_col not in df.columns:
+            df = df.assign(**{src_col: np.nan})
+        values = df[group_cols + [src_col]]
+        if distinct:
+            values = values.drop_duplicates()
+        if function == AggregationFunction.COUNT:
+            return values.groupby(group_cols, dropna=False, sort=False)[src_col].count()
+        if function in (AggregationFunction.SUM, AggregationFunction.AVG):
+            values = values.assign(**{src_col: pd.to_numeric(values[src_col], errors='coerce')})
+            grouped = values.groupby(group_cols, dropna=False, sort=False)[src_col]
+            return grouped.sum() if function == AggregationFunction.SUM else grouped.mean()
+        if function in (AggregationFunction.MIN, AggregationFunction.MAX):
+            values = values.assign(**{src_col: LocalExecutor.__comparable(values[src_col])})
+            grouped = values.groupby(group_cols, dropna=False, sort=False)[src_col]
+            return grouped.min() if function == AggregationFunction.MIN else grouped.max()
+        raise LocalExecutionError("aggregation function {} is not supported".format(function))
+
+    @staticmethod
+    def __aggregate_values(df, function, parameter, src_col):
+        """
+        :return: the aggregated value of all the rows, for a query with aggregations and no grouping
+        """
+        distinct = parameter is not None and parameter.upper() == 'DISTINCT'
+        if src_col == '*':
+            if function != AggregationFunction.COUNT:
+                raise LocalExecutionError("{}(*) is not supported".format(function))
+            return len(df.drop_duplicates()) if distinct else len(df)
+        values = df[src_col].dropna() if src_col in df.columns else pd.Series([], dtype=object)
+        if distinct:
+            values = values.drop_duplicates()
+        if function == AggregationFunction.COUNT:
+            return len(values)
+        if function == AggregationFunction.SUM:
+            return pd.to_numeric(values, errors='coerce').sum()
+        if function == AggregationFunction.AVG:
+            return pd.to_numeric(values, errors='coerce').mean() if len(values) > 0 else 0
+        if function in (AggregationFunction.MIN, AggregationFunction.MAX):
+            values = LocalExecutor.__comparable(values).dropna()
+            if len(values) == 0:
+                return np.nan
+            return values.min() if function == AggregationFunction.MIN else values.max()
+        raise LocalExecutionError("aggregation function {} is not supported".format(function))
+
+    def __having(self, df, query_model):
+        conditions = [(agg_col, condition[3]) for agg_col, agg_conditions in query_model.having_clause.items()
+                      for condition in agg_conditions]
+        if len(conditions) == 0:
+            return df
+        mask = self.__filter_compiler.compile_all(conditions)
+        if mask is None:
+            raise LocalExecutionError("the having conditions {} can't be evaluated locally".format(conditions))
+        try:
+            return df[mask(df)]
+        except UnsupportedFilterError as error:
+            raise LocalExecutionError(str(error))
+
+    @staticmethod
+    def __order(df, query_model):
+        order_cols = [col for col in query_model.order_clause if col in df.columns]
+        if len(order_cols) == 0:
+            return df
+        ascending = [query_model.order_clause[col] != SortingOrder.DESC for col in order_cols]
+        keys = pd.DataFrame({i: LocalExecutor.__comparable(df[col]) for i, col in enumerate(order_cols)},
+                            index=df.index)
+        # unbound values come first in ascending order as in SPARQL
+        order = keys.sort_values(list(range(len(order_cols))), ascending=ascending, kind='mergesort',
+                                 na_position='first' if all(ascending) else 'last').index
+        return df.loc[order]
+
+    @staticmethod
+    def __project(df, query_model):
+        """
+        :return: the selected columns without duplicate rows (SELECT DISTINCT), or all the columns (SELECT *)
+        """
+        select_cols = list(query_model.select_columns.union(query_model.auto_generated_select_columns))
+        if query_model.select_all or len(select_cols) == 0:
+            return df
+        return df.reindex(columns=select_cols).drop_duplicates()
+
+    @staticmethod
+    def __join(left, right, how='inner'):
+        """
+        joins two dataframes of solutions on their common variables. Without common variables, every solution of the
+        left one is combined with every solution of the right one
+        """
+        if len(left.columns) == 0:
+            # left is the empty pattern or the bindings of no variable
+            if how == 'left' and len(right) == 0:
+                return left
+            return pd.concat([right] * len(left), ignore_index=True) if len(left) > 0 else right.iloc[0:0]
+        if len(right.columns) == 0:
+            return left if len(right) > 0 or how == 'left' else left.iloc[0:0]
+        join_cols = [col for col in left.columns if col in right.columns]
+        if len(join_cols) == 0:
+            if how == 'left' and len(right) == 0:
+                return left
+            return left.merge(right, how='cross')
+        left, right = align_categories(left, right, join_cols)
+        for col in join_cols:
+            if left[col].dtype != right[col].dtype:
+                left = left.assign(**{col: left[col].astype(object)})
+                right = right.assign(**{col: right[col].astype(object)})
+        return left.merge(right, on=join_cols, how=how)
+
+    @staticmethod
+    def __comparable(column):
+        """
+        :return: the column as numbers if all its bound values are numbers, else as strings
+        """
+        numbers = pd.to_numeric(column, errors='coerce')
+        if numbers.notna().sum() == column.notna().sum():
+            return numbers
+        return column.astype(object).where(column.isna(), column.astype(str))
+
+    @staticmethod
+    def __term(element, prefixes):
+        """
+        :return: (True, variable name) for a variable of a triple pattern or (False, uri) for a constant
+        """
+        if not is_uri(element) and element.find(":") < 0:
+            return True, element
+        if element.startswith('<') and element.endswith('>'):
+            return False, element[1:-1]
+        if is_uri(element):
+            return False, element
+        prefix, local_name = element.split(':', 1)
+        if prefix in prefixes:
+            return False, prefixes[prefix] + local_name
+        raise LocalExecutionError("unknown prefix in {}".format(element))
+
+    @staticmethod
+    def __unit():
+        """
+        :return: the solutions of an empty pattern: one solution binding no variable
+        """
+        return pd.DataFrame(index=range(1))
@@ -46,6 +46,7 @@ class QueryModel(object):
         self.optional_subqueries = []  # list of optional subqueries. each subquery is a query model
         self.unions = []            # list of subqueries to union with the current query model
         self.graph_triples = {}     # dict of graph: list of triples. When there is more than one triple in the graph
+        self.values_clause = None   # (list of columns, list of rows of values) bound with a VALUES clause
 
         self.select_columns = OrderedSet()    # list of columns to be selected ,  set()
         self.auto_generated_select_columns = OrderedSet()
@@ -116,6 +117,17 @@ class QueryModel(object):
             self.add_variable(subject)
             self.add_variable(object)
             self.add_variable(predicate)
+
+    def add_values(self, columns, rows):
+        """
+        binds columns to a list of rows of values with a VALUES clause
+        :param columns: list of column names
+        :param rows: list of rows, each a list of one value per column. A value is a uri, a number, a string or None
+            for an unbound value
+        """
+        for col in columns:
+            self.add_variable(col)
+        self.values_clause = (list(columns), list(rows))
     def add_graph_triple(self, graph, triples):
         self.graph_triples[graph] = triples
 
@@ -1,3 +1,5 @@
+import numbers
+
 from rdfframes.utils.helper_functions import is_uri
 
 __author__ = """
@@ -146,8 +148,40 @@ class SPARQLBuilder(object):
             else:
                 return ""
 
+        def add_values_clause(self):
+            """
+            :return: the VALUES clause binding the columns of the query model to rows of values
+            """
+            columns, rows = self.query_model.values_clause
+            values_string = "VALUES ({}) {{\n".format(' '.join('?' + col for col in columns))
+            for row in rows:
+                values_string += "\t({})\n".format(' '.join(SPARQLBuilder.format_value(value) for value in row))
+            values_string += "}"
+            return values_string
+
+        @staticmethod
+        def format_value(value):
+            """
+            :param value: a uri, a number, a boolean, a string or None
+            :return: the SPARQL term of the value. None is an unbound value (UNDEF)
+            """
+            if value is None or value != value:
+                return "UNDEF"
+            if isinstance(value, bool):
+                return "true" if value else "false"
+            if isinstance(value, numbers.Number):
+                return str(value)
+            value = str(value)
+            if is_uri(value):
+                return "<{}>".format(value)
+            return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                                 .replace('\r', '\\r'))
+
         def __add_patterns(self):
             where_string = ""
+            if self.query_model.values_clause is not None:
+                values_string = self.add_values_clause()
+                where_string += '\t'.join(('\n' + values_string.lstrip()).splitlines(True))
             for triple in self.query_model.triples:
                 triple0 = triple[0]
                 triple1 = triple[1]
@@ -212,7 +246,7 @@ class SPARQLBuilder(object):
                     len(self.query_model.unions) >0 or len(self.query_model.optionals) > 0 or \
                     len(self.query_model.filter_clause) > 0 or len(self.query_model.optional_subqueries) > 0 or \
                     len(self.query_model.graph_triples) > 0 or len(self.query_model.graph_clause) > 0 or \
-                    len(self.query_model.optional_graph_clause) > 0:
+                    len(self.query_model.optional_graph_clause) > 0 or self.query_model.values_clause is not None:
                 where_string = self.__add_patterns()
                 self.query_string += "WHERE {" + where_string + "\n\t}"
             else:
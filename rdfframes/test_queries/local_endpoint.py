@@ -0,0 +1,160 @@
+"""
+Local SPARQL endpoint for the tests of the http clients. The queries are answered with rdflib on a graph in memory by
+a server running in a background thread. The endpoint can truncate the results like Virtuoso's ResultSetMaxRows
+"""
+
+import gzip
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import rdflib
+
+
+class LocalEndpoint:
+    """
+    SPARQL endpoint on 127.0.0.1 answering SELECT queries in CSV, JSON or TSV. Use as a context manager:
+        with LocalEndpoint(graph) as endpoint:
+            client = HttpClient(endpoint.url, port=endpoint.port)
+    """
+    def __init__(self, graph, cap=None, delay=0, fail_once=None):
+        """
+        :param graph: the rdflib Graph the queries run on
+        :param cap: the maximum number of rows returned per request. The other rows are silently dropped
+        :param delay: the number of seconds every request takes at least
+        :param fail_once: if provided, the first request of every query containing this string fails with 503
+        """
+        self.graph = graph
+        self.cap = cap
+        self.delay = delay
+        self.fail_once = fail_once
+        self.__failed = set()
+        self.queries = []
+        # the number of requests being answered when each query arrived, including itself
+        self.in_flight = []
+        self.__in_flight = 0
+        # the number of tcp connections accepted
+        self.connections = 0
+        self.server = None
+        self.port = None
+        self.url = None
+        self.__lock = threading.Lock()
+
+    def start(self):
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                endpoint.connected()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.respond(parse_qs(self.rfile.read(length).decode('utf-8')))
+
+            def do_GET(self):
+                self.respond(parse_qs(urlparse(self.path).query))
+
+            def respond(self, params):
+                status, content_type, body = endpoint.answer(params)
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        self.url = 'http://127.0.0.1:{}/sparql'.format(self.port)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def connected(self):
+        with self.__lock:
+            self.connections += 1
+
+    def answer(self, params):
+        """
+        :param params: the parameters of the http request
+        :return: (http status, content type, response body)
+        """
+        query = params['query'][0]
+        with self.__lock:
+            self.__in_flight += 1
+            self.queries.append(query)
+            self.in_flight.append(self.__in_flight)
+            fail = self.fail_once is not None and self.fail_once in query and query not in self.__failed
+            self.__failed.add(query)
+        try:
+            time.sleep(self.delay)
+            if fail:
+                return 503, 'text/plain', b'busy'
+            return self.__answer(params)
+        finally:
+            with self.__lock:
+                self.__in_flight -= 1
+
+    def __answer(self, params):
+        query = params['query'][0]
+        result_format = params.get('format', ['text/csv'])[0]
+        with self.__lock:
+            try:
+                result = self.graph.query(query)
+                rows = list(result)
+            except Exception as e:
+                return 400, 'text/plain', str(e).encode('utf-8')
+        cap = self.cap
+        if 'maxrows' in params:
+            max_rows = int(params['maxrows'][0])
+            cap = max_rows if cap is None else min(cap, max_rows)
+        if cap is not None:
+            rows = rows[:cap]
+        page = rdflib.query.Result('SELECT')
+        page.vars = result.vars
+        page.bindings = [dict(zip(result.vars, row)) for row in rows]
+        if 'json' in result_format:
+            return 200, 'application/sparql-results+json', page.serialize(format='json')
+        if 'tab' in result_format:
+            lines = ['\t'.join('?' + str(var) for var in page.vars)]
+            lines += ['\t'.join('' if term is None else term.n3() for term in row) for row in rows]
+            return 200, 'text/tab-separated-values', ('\n'.join(lines) + '\n').encode('utf-8')
+        return 200, 'text/csv', page.serialize(format='csv').replace(b'\r\n', b'\n')
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def movies_graph(count, multiline=False):
+    """
+    :param count: the number of movies
+    :param multiline: if True, some movies have a title spanning several lines
+    :return: rdflib Graph of movies with a year, a country and a title
+    """
+    graph = rdflib.Graph()
+    ex = rdflib.Namespace('http://example.org/')
+    for i in range(count):
+        movie = ex['movie{:05d}'.format(i)]
+        graph.add((movie, ex.year, rdflib.Literal(1950 + i % 70)))
+        graph.add((movie, ex.country, ex['country{}'.format(i % 7)]))
+        title = 'Movie {}\nthe "sequel"\npart {}'.format(i, i) if multiline and i % 3 == 0 else 'Movie {}'.format(i)
+        graph.add((movie, ex.title, rdflib.Literal(title)))
+    return graph
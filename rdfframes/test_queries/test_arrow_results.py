@@ -0,0 +1,36 @@
+import json
+
+import pyarrow as pa
+
+from rdfframes.client.arrow_results import read_csv_page, read_json_page, concat_pages, to_pandas
+
+XSD_INTEGER = 'http://www.w3.org/2001/XMLSchema#integer'
+
+
+def json_page(start, end):
+    bindings = [{'movie': {'type': 'uri', 'value': 'http://example.org/movie{}'.format(i)},
+                 'year': {'type': 'literal', 'datatype': XSD_INTEGER, 'value': str(1950 + i)},
+                 'title': {'type': 'literal', 'xml:lang': 'en', 'value': 'Movie {}'.format(i)}}
+                for i in range(start, end)]
+    return json.dumps({'head': {'vars': ['movie', 'year', 'title']}, 'results': {'bindings': bindings}})
+
+
+def test_arrow_results():
+    table = concat_pages([read_json_page([json_page(0, 3)]), read_json_page([json_page(3, 5)])])
+    assert table.num_rows == 5
+    assert pa.types.is_dictionary(table.schema.field('movie').type)
+    assert table.schema.field('year').type == pa.int64()
+    df = to_pandas(table)
+    assert list(df['year']) == [1950, 1951, 1952, 1953, 1954]
+    assert df.attrs['datatypes']['movie'] == 'uri' and df.attrs['languages'] == {'title': 'en'}
+
+    pages = ['movie,year\nhttp://example.org/movie0,1950\nhttp://example.org/movie1,1951\n',
+             'movie,year\nhttp://example.org/movie2,unknown\n']
+    table = concat_pages([read_csv_page([page]) for page in pages])
+    assert pa.types.is_dictionary(table.schema.field('movie').type)
+    assert table.column('year').to_pylist() == ['1950', '1951', 'unknown']
+    assert read_csv_page(['']) is None
+
+
+if __name__ == '__main__':
+    test_arrow_results()
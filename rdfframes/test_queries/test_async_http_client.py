@@ -0,0 +1,111 @@
+import asyncio
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+from rdfframes.client.async_http_client import AsyncHttpClient
+from rdfframes.client.http_client import HttpClientDataFormat
+from rdfframes.client.result_cache import ResultCache
+from rdfframes.knowledge_graph import KnowledgeGraph
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year } ORDER BY ?movie'
+
+
+def run(client, coroutine):
+    async def execute():
+        try:
+            return await coroutine
+        finally:
+            await client.close()
+    return asyncio.run(execute())
+
+
+def new_client(endpoint, max_rows=40):
+    client = AsyncHttpClient(endpoint.url, port=endpoint.port, max_rows=max_rows)
+    client.set_target_latency(None)
+    return client
+
+
+def test_async_pages():
+    with LocalEndpoint(movies_graph(130)) as endpoint:
+        client = new_client(endpoint)
+        df = run(client, client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF))
+        assert len(df) == 130 and list(df['movie']) == sorted(df['movie'])
+        assert len([query for query in endpoint.queries if 'OFFSET' in query]) >= 4
+
+        client = new_client(endpoint)
+        df = run(client, client.execute_query(QUERY, return_format=HttpClientDataFormat.JSON))
+        # the JSON pages are parsed into typed dataframes
+        assert len(df) == 130 and df['year'].dtype.kind == 'i' and 'datatypes' in df.attrs
+
+
+def test_async_retries():
+    with LocalEndpoint(movies_graph(100), fail_once='year') as endpoint:
+        client = new_client(endpoint)
+        client.set_retry_policy(2, base_delay=0.01, max_delay=0.05)
+        df = run(client, client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF))
+        assert len(df) == 100 and len(df.attrs['retried_pages']) >= 3 and client.stats['page_retries'] >= 3
+
+
+class ThreadRecordingCache(ResultCache):
+    def __init__(self, directory):
+        super(ThreadRecordingCache, self).__init__(directory)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super(ThreadRecordingCache, self).get(key)
+
+
+def test_async_cache():
+    with LocalEndpoint(movies_graph(100)) as endpoint:
+        cache = ThreadRecordingCache(tempfile.mkdtemp())
+        client = new_client(endpoint)
+        client.set_cache(cache)
+        first = run(client, client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF))
+        sent = len(endpoint.queries)
+        client = new_client(endpoint)
+        client.set_cache(cache)
+        second = run(client, client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF))
+        # the second query is answered from the cache
+        assert len(endpoint.queries) == sent and list(second['movie']) == list(first['movie'])
+        # the cache is read outside of the event loop's thread
+        assert len(cache.threads) == 2 and threading.main_thread() not in cache.threads
+
+
+def test_async_output_file():
+    directory = tempfile.mkdtemp()
+    with LocalEndpoint(movies_graph(100, multiline=True)) as endpoint:
+        query = 'SELECT ?movie ?title WHERE { ?movie <http://example.org/title> ?title } ORDER BY ?movie'
+        for name, read in (('movies.csv', pd.read_csv), ('movies.parquet', pd.read_parquet)):
+            path = os.path.join(directory, name)
+            client = new_client(endpoint, max_rows=30)
+            assert run(client, client.execute_query(query, output_file=path)) == path
+            df = read(path)
+            assert len(df) == 100 and df['title'][0] == 'Movie 0\nthe "sequel"\npart 0'
+
+
+def test_execute_async():
+    graph = KnowledgeGraph(prefixes={'ex': 'http://example.org/'})
+    years = graph.feature_domain_range('ex:year', domain_col_name='movie', range_col_name='year')
+    countries = graph.feature_domain_range('ex:country', domain_col_name='movie', range_col_name='country')
+    with LocalEndpoint(movies_graph(70), delay=0.05) as endpoint:
+        client = new_client(endpoint, max_rows=100)
+
+        async def execute():
+            # the datasets run concurrently on one event loop
+            return await asyncio.gather(*[dataset.execute_async(client, return_format=HttpClientDataFormat.PANDAS_DF)
+                                          for dataset in (years, countries)])
+        first, second = run(client, execute())
+        assert len(first) == 70 and len(second) == 70 and max(endpoint.in_flight) == 2
+
+
+if __name__ == '__main__':
+    test_async_pages()
+    test_async_retries()
+    test_async_cache()
+    test_async_output_file()
+    test_execute_async()
@@ -0,0 +1,46 @@
+import gzip
+import zlib
+
+from rdfframes.client.client_stats import ClientStats
+from rdfframes.client.compression import decode_chunks, decode_body
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from local_endpoint import LocalEndpoint, movies_graph
+
+TEXT = 'movie,title\nmovie0,Amélie\nmovie1,東京物語\n' * 50
+
+
+def split(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def test_decode_chunks():
+    raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    bodies = {'gzip': gzip.compress(TEXT.encode('utf-8')),
+              'deflate': zlib.compress(TEXT.encode('utf-8')),
+              'identity': TEXT.encode('utf-8')}
+    for encoding, body in bodies.items():
+        # the chunks split the compressed stream and the multi-byte characters anywhere
+        assert ''.join(decode_chunks(split(body, 7), encoding)) == TEXT
+    # deflate data without the zlib header
+    body = raw_deflate.compress(TEXT.encode('utf-8')) + raw_deflate.flush()
+    assert decode_body(body, 'deflate') == TEXT
+
+    stats = ClientStats()
+    body = bodies['gzip']
+    assert ''.join(decode_chunks(split(body, 100), 'GZIP', stats=stats)) == TEXT
+    assert stats['bytes_on_wire'] == len(body) and stats['bytes_decoded'] == len(TEXT.encode('utf-8'))
+
+
+def test_gzip_responses():
+    query = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year }'
+    with LocalEndpoint(movies_graph(300)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=100, target_latency=None)
+        df = client.execute_query(query, return_format=HttpClientDataFormat.PANDAS_DF)
+        assert len(df) == 300
+        # the pages were sent gzipped by the endpoint
+        assert 0 < client.stats['bytes_on_wire'] < client.stats['bytes_decoded']
+
+
+if __name__ == '__main__':
+    test_decode_chunks()
+    test_gzip_responses()
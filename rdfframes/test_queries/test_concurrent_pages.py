@@ -0,0 +1,29 @@
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year } ORDER BY ?movie'
+
+
+def test_concurrent_pages():
+    with LocalEndpoint(movies_graph(300), delay=0.05) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=40, target_latency=None)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF, max_workers=4)
+        # the pages are reassembled in offset order
+        assert len(df) == 300 and list(df['movie']) == sorted(df['movie'])
+        assert max(endpoint.in_flight) > 1
+
+
+def test_concurrent_pages_after_server_cap():
+    # the first page is full, the next ones grow past the cap and are truncated by the endpoint
+    with LocalEndpoint(movies_graph(8000), cap=1100, delay=0.05) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=5000, target_latency=30)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF, max_workers=2)
+        assert len(df) == 8000 and df['movie'].is_unique and client.server_cap == 1100
+        # once the pages fit in the cap, they are fetched ahead again
+        first_capped = [i for i, query in enumerate(endpoint.queries) if query.endswith('LIMIT 1100')][0]
+        assert max(endpoint.in_flight[first_capped:]) > 1
+
+
+if __name__ == '__main__':
+    test_concurrent_pages()
+    test_concurrent_pages_after_server_cap()
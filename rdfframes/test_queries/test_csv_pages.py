@@ -0,0 +1,29 @@
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from local_endpoint import LocalEndpoint, movies_graph
+
+
+def test_parse_page():
+    first = HttpClient._parse_page('movie,year\nmovie0,1950\nmovie1,1951\n')
+    assert list(first.columns) == ['movie', 'year'] and list(first['year']) == [1950, 1951]
+    # the header of the next pages is skipped and the columns of the first page are used
+    page = HttpClient._parse_page('movie,year\nmovie2,1952\n', columns=list(first.columns))
+    assert list(page.columns) == ['movie', 'year'] and list(page['movie']) == ['movie2']
+    df = HttpClient._pages_to_dataframe([first, page])
+    assert list(df['movie']) == ['movie0', 'movie1', 'movie2'] and list(df.index) == [0, 1, 2]
+    assert len(HttpClient._pages_to_dataframe([]).columns) == 0
+
+
+def test_csv_pages():
+    query = 'SELECT ?movie ?title WHERE { ?movie <http://example.org/title> ?title } ORDER BY ?movie'
+    with LocalEndpoint(movies_graph(120, multiline=True)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=25, target_latency=None)
+        df = client.execute_query(query, return_format=HttpClientDataFormat.PANDAS_DF)
+        # every page is parsed on its own, the titles spanning several lines stay in one row
+        assert len(df) == 120 and list(df['movie']) == sorted(df['movie'])
+        assert df['title'][3] == 'Movie 3\nthe "sequel"\npart 3'
+        assert len([query for query in endpoint.queries if 'OFFSET' in query]) >= 5
+
+
+if __name__ == '__main__':
+    test_parse_page()
+    test_csv_pages()
@@ -0,0 +1,72 @@
+import gzip
+import os
+import tempfile
+
+import pandas as pd
+
+from rdfframes.client.file_sinks import CsvSink
+from rdfframes.client.text_stream import CsvRecordCounter
+
+
+def csv_page(start, end):
+    lines = ['movie,note']
+    for i in range(start, end):
+        note = '"line one {}\nline ""two""\nthree"'.format(i) if i % 2 == 0 else 'plain {}'.format(i)
+        lines.append('http://example.org/movie{},{}'.format(i, note))
+    return '\n'.join(lines) + '\n'
+
+
+def chunked(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_csv_record_counter():
+    counter = CsvRecordCounter()
+    for chunk in chunked(csv_page(0, 5)):
+        counter.feed(chunk)
+    # the header and 5 records, 3 of them spanning 3 lines
+    assert counter.close() == 6
+    counter = CsvRecordCounter()
+    counter.feed('a,b\n1,"x\ny"')
+    assert counter.close() == 2
+
+
+def test_csv_sink():
+    path = os.path.join(tempfile.mkdtemp(), 'result.csv')
+    sink = CsvSink(path)
+    # the rows written are the rows of the page, the next page's offset is computed from them
+    assert sink.write_chunks(chunked(csv_page(0, 5))) == 5
+    assert sink.write_chunks(chunked(csv_page(5, 8))) == 3
+    assert sink.write_chunks(['movie,note\n']) == 0
+    assert sink.commit() == path
+    df = pd.read_csv(path)
+    assert len(df) == 8 and df['note'][2] == 'line one 2\nline "two"\nthree'
+    os.remove(path)
+
+
+def failing(chunks, after):
+    for i, chunk in enumerate(chunks):
+        if i == after:
+            raise IOError("connection reset")
+        yield chunk
+
+
+def test_csv_sink_retried_page():
+    for path in (os.path.join(tempfile.mkdtemp(), 'result.csv'), os.path.join(tempfile.mkdtemp(), 'result.csv.gz')):
+        sink = CsvSink(path, compress=path.endswith('.gz'))
+        # the first page fails after its header and some rows, then it is fetched again
+        try:
+            sink.write_chunks(failing(chunked(csv_page(0, 5)), 10))
+            assert False
+        except IOError:
+            pass
+        assert sink.write_chunks(chunked(csv_page(0, 5))) == 5
+        sink.commit()
+        df = pd.read_csv(gzip.open(path, 'rt') if sink.compress else path)
+        assert list(df.columns) == ['movie', 'note'] and len(df) == 5
+
+
+if __name__ == '__main__':
+    test_csv_record_counter()
+    test_csv_sink()
+    test_csv_sink_retried_page()
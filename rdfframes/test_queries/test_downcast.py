@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from rdfframes.client.result_parsers import SparqlJsonParser, downcast_columns
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+
+def literal(value, datatype=None):
+    term = {'type': 'literal', 'value': value}
+    if datatype is not None:
+        term['datatype'] = XSD + datatype
+    return term
+
+
+def test_downcast():
+    bindings = [{'count': literal('5', 'int'), 'score': literal('1.5', 'float'), 'ratio': literal('0.1', 'double'),
+                 'date': literal('2020-01-01T00:00:00Z', 'dateTime'), 'country': literal('Qatar')},
+                {'count': literal('70000', 'int'), 'score': literal('2', 'float'), 'ratio': literal('0.5', 'double'),
+                 'date': literal('2020-01-01T00:00:00+03:00', 'dateTime'), 'country': literal('Qatar')}]
+    document = json.dumps({'head': {'vars': ['count', 'score', 'ratio', 'date', 'country']},
+                           'results': {'bindings': bindings}})
+    df = pd.concat(list(SparqlJsonParser(downcast=True).parse([document])))
+    assert df['count'].dtype == np.int32 and df['score'].dtype == np.float32
+    assert df['ratio'].dtype == np.float64
+    assert pd.api.types.is_datetime64_any_dtype(df['date'])
+
+    df = downcast_columns(pd.DataFrame({'year': [1990, 2020], 'half': [0.5, 1.5], 'country': ['Qatar', 'Qatar']}))
+    assert df['year'].dtype == np.int16 and df['half'].dtype == np.float32
+    assert isinstance(df['country'].dtype, pd.CategoricalDtype)
+
+
+if __name__ == '__main__':
+    test_downcast()
@@ -0,0 +1,64 @@
+import gzip
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet
+
+from rdfframes.client.file_sinks import FileFormat, sink_for, CsvSink, ParquetSink, FeatherSink
+
+PAGES = [pd.DataFrame({'movie': ['movie0', 'movie1'], 'country': [np.nan, np.nan], 'year': [1950, 1951]}),
+         pd.DataFrame({'movie': ['movie2'], 'country': ['Qatar'], 'year': [1952.5]}),
+         pd.DataFrame({'movie': ['movie3'], 'country': [np.nan], 'year': [1953]})]
+
+
+def test_sink_for():
+    assert isinstance(sink_for(os.path.join(tempfile.mkdtemp(), 'result.parquet')), ParquetSink)
+    assert isinstance(sink_for(os.path.join(tempfile.mkdtemp(), 'result.arrow')), FeatherSink)
+    sink = sink_for(os.path.join(tempfile.mkdtemp(), 'result.txt'), FileFormat.CSV_GZIP)
+    assert isinstance(sink, CsvSink) and sink.compress
+    sink.abort()
+
+
+def test_arrow_sinks():
+    directory = tempfile.mkdtemp()
+    for path, read in ((os.path.join(directory, 'result.parquet'), pd.read_parquet),
+                       (os.path.join(directory, 'result.feather'), pd.read_feather)):
+        sink = sink_for(path)
+        # the country column has no value in the first page, the year column has a float in the second one
+        for page in PAGES:
+            sink.write_frame(page)
+        assert sink.commit() == path
+        df = read(path)
+        assert list(df['country'].isna()) == [True, True, False, True] and df['country'][2] == 'Qatar'
+        assert list(df['year']) == [1950, 1951, 1952.5, 1953]
+        os.remove(path)
+    sink = sink_for(os.path.join(directory, 'result.parquet'))
+    for page in PAGES:
+        sink.write_frame(page)
+    sink.commit()
+    # one row group per page
+    assert pyarrow.parquet.ParquetFile(sink.path).num_row_groups == 3
+
+
+def test_csv_gzip_sink():
+    path = os.path.join(tempfile.mkdtemp(), 'result.csv.gz')
+    sink = sink_for(path)
+    assert sink.write_chunks(['movie,year\nmovie0,19', '50\nmovie1,1951\n']) == 2
+    sink.write_frame(PAGES[2][['movie', 'year']])
+    sink.commit()
+    with gzip.open(path, 'rt') as f:
+        assert f.read() == 'movie,year\nmovie0,1950\nmovie1,1951\nmovie3,1953\n'
+
+    # a failed export leaves no file
+    sink = sink_for(path + '.tmp.csv')
+    sink.write_chunks(['movie\nmovie0\n'])
+    sink.abort()
+    assert not os.path.exists(path + '.tmp.csv') and not os.path.exists(sink.temp_path)
+
+
+if __name__ == '__main__':
+    test_sink_for()
+    test_arrow_sinks()
+    test_csv_gzip_sink()
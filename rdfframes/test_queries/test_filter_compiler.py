@@ -0,0 +1,53 @@
+import pandas as pd
+
+from rdfframes.query_builder.filter_compiler import FilterCompiler
+
+
+def movies():
+    df = pd.DataFrame({
+        'movie': ['http://example.org/movie{}'.format(i) for i in range(4)],
+        'year': [2010, 2015, 2020, None],
+        'country': ['http://dbpedia.org/resource/USA', 'http://dbpedia.org/resource/France', None,
+                    'http://dbpedia.org/resource/USA'],
+        'title': ['Alpha', 'beta', 'Gamma', 'delta'],
+        'release_date': ['2014-05-01T00:00:00', '2016-01-01', '2020-01-01', 'unknown']
+    })
+    df.attrs['languages'] = {'title': 'en'}
+    return df
+
+
+def mask(col_name, condition):
+    compiler = FilterCompiler({'dbpr': 'http://dbpedia.org/resource/'})
+    return list(compiler.compile(col_name, condition)(movies()))
+
+
+def test_filter_compiler():
+    assert mask('year', '>= 2015') == [False, True, True, False]
+    assert mask('country', '= dbpr:USA') == [True, False, False, True]
+    assert mask('title', '!= "beta"') == [True, False, True, True]
+    assert mask('country', 'IN (dbpr:France, dbpr:Spain)') == [False, True, False, False]
+    assert mask('country', 'NOT IN (dbpr:USA)') == [False, True, False, False]
+    assert mask('release_date', '>= 2016') == [False, True, True, False]
+    assert mask('country', 'regex(str(?country), "US")') == [True, False, False, True]
+    assert mask('title', 'regex(?title, "^[a-c]", "i")') == [True, True, False, False]
+    assert mask('country', 'isIRI(?country)') == [True, True, False, True]
+    assert mask('title', 'langMatches(lang(?title), "en")') == [True, True, True, True]
+    assert mask('title', '= "Alpha"@de') == [False, False, False, False]
+    assert mask('year', '< 2015 || !bound(?country)') == [True, False, True, False]
+
+    compiler = FilterCompiler()
+    assert compiler.compile('year', 'isURI') is None
+    assert compiler.compile('country', '= dbpr:USA') is None
+
+    # an untyped result only supports the conditions that don't compare the column itself
+    compiler = FilterCompiler({'dbpr': 'http://dbpedia.org/resource/'})
+    assert compiler.compile('year', '>= 2015', typed=False) is None
+    assert compiler.compile('country', 'NOT IN (dbpr:USA)', typed=False) is None
+    assert compiler.compile('year', '< 2015 || !bound(?country)', typed=False) is None
+    assert list(compiler.compile('release_date', '>= 2016', typed=False)(movies())) == [False, True, True, False]
+    assert list(compiler.compile('title', 'regex(?title, "^a", "i")', typed=False)(movies())) == \
+        [True, False, False, False]
+
+
+if __name__ == '__main__':
+    test_filter_compiler()
@@ -0,0 +1,40 @@
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.http_session_pool import HttpSessionPool
+from local_endpoint import LocalEndpoint, movies_graph
+
+
+def test_shared_sessions():
+    session = HttpSessionPool.get_session('http://127.0.0.1:1/sparql', pool_size=2)
+    assert HttpSessionPool.get_session('http://127.0.0.1:1/other') is session
+    assert HttpSessionPool.get_session('http://127.0.0.1:2/sparql') is not session
+    # a bigger pool is mounted on the same session
+    assert HttpSessionPool.get_session('http://127.0.0.1:1/sparql', pool_size=32) is session
+    assert session.get_adapter('http://127.0.0.1:1/sparql')._pool_maxsize == 32
+    HttpSessionPool.close_session('http://127.0.0.1:1/sparql')
+    assert HttpSessionPool.get_session('http://127.0.0.1:1/sparql') is not session
+
+
+def test_pages_reuse_connections():
+    with LocalEndpoint(movies_graph(200)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=20, target_latency=None)
+        df = client.execute_query('SELECT ?movie WHERE { ?movie <http://example.org/year> ?year }',
+                                  return_format=HttpClientDataFormat.PANDAS_DF)
+        assert len(df) == 200 and len(endpoint.queries) > 10
+        # all the pages went through one keep-alive connection
+        assert endpoint.connections == 1
+
+
+def test_health_check():
+    with LocalEndpoint(movies_graph(1)) as endpoint:
+        port = endpoint.port
+        assert HttpSessionPool.is_alive('127.0.0.1', port)
+    # the result of the check is reused until it is invalidated
+    assert HttpSessionPool.is_alive('127.0.0.1', port)
+    HttpSessionPool.invalidate_health('127.0.0.1', port)
+    assert not HttpSessionPool.is_alive('127.0.0.1', port)
+
+
+if __name__ == '__main__':
+    test_shared_sessions()
+    test_pages_reuse_connections()
+    test_health_check()
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.knowledge_graph import KnowledgeGraph
+from local_endpoint import LocalEndpoint, movies_graph
+
+graph = KnowledgeGraph(prefixes={'ex': 'http://example.org/'})
+movies = graph.feature_domain_range('ex:year', domain_col_name='movie', range_col_name='year')\
+    .sort({'movie': 'ASC'})
+
+
+def test_iter_batches():
+    with LocalEndpoint(movies_graph(250)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, target_latency=None)
+        batches = list(movies.iter_batches(client, batch_rows=100, return_format=HttpClientDataFormat.JSON))
+        assert [len(batch) for batch in batches] == [100, 100, 50]
+        df = pd.concat(batches, ignore_index=True)
+        assert list(df['movie']) == sorted(df['movie']) and df['movie'].is_unique
+        # the JSON batches are typed
+        assert df['year'].dtype.kind == 'i'
+
+
+def test_iter_batches_stop():
+    with LocalEndpoint(movies_graph(1000)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, target_latency=None)
+        batches = movies.iter_batches(client, batch_rows=50)
+        first = next(batches)
+        batches.close()
+        assert len(first) == 50
+        # the pages after the one fetched ahead are never requested
+        assert len(endpoint.queries) <= 3
+
+
+if __name__ == '__main__':
+    test_iter_batches()
+    test_iter_batches_stop()
@@ -0,0 +1,70 @@
+import warnings
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.keyset_pagination import KeysetPagination
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?country WHERE { ?movie <http://example.org/country> ?country }'
+
+
+def test_is_applicable():
+    assert KeysetPagination(QUERY, 'movie').is_applicable()
+    assert KeysetPagination('SELECT * WHERE { ?movie ?p ?o }', '?movie').is_applicable()
+    assert not KeysetPagination(QUERY, 'year').is_applicable()
+    assert not KeysetPagination(QUERY + ' ORDER BY ?country', 'movie').is_applicable()
+    assert not KeysetPagination('SELECT ?movie ?year WHERE { ?movie ?p ?o OPTIONAL { ?movie ?q ?year } }',
+                                'year').is_applicable()
+    assert not KeysetPagination('SELECT ?movie WHERE { { ?movie ?p ?o } UNION { ?o ?p ?movie } }',
+                                'movie').is_applicable()
+    assert not KeysetPagination('SELECT (str(?m) AS ?movie) WHERE { ?m ?p ?o }', 'movie').is_applicable()
+
+
+def test_page_query():
+    pagination = KeysetPagination(QUERY + ' LIMIT 50;', 'movie')
+    assert pagination.limit == 50
+    assert pagination.page_query(page_size=10) == QUERY + ' ORDER BY str(?movie) LIMIT 10'
+    query = pagination.page_query('http://example.org/"movie"', inclusive=True, page_size=10)
+    assert 'FILTER ( str(?movie) >= "http://example.org/\\"movie\\"" )' in query and query.endswith('LIMIT 10')
+    assert pagination.key_query('a', 20, 10).endswith('ORDER BY str(?movie) OFFSET 20 LIMIT 10')
+
+
+def test_keyset_pages():
+    with LocalEndpoint(movies_graph(230)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=40, target_latency=None)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF, key_column='movie')
+        assert len(df) == 230 and df['movie'].is_unique
+        # the pages continue after the last key instead of using an offset
+        assert all('OFFSET' not in query for query in endpoint.queries)
+        assert any('FILTER ( str(?movie) >' in query for query in endpoint.queries)
+
+
+def test_keyset_pages_repeated_keys():
+    # every country has more rows than a page, they are fetched by offset inside the key
+    with LocalEndpoint(movies_graph(230)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=20, target_latency=None)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF, key_column='country')
+        assert len(df) == 230 and df['movie'].is_unique
+        assert list(df['country']) == sorted(df['country'])
+
+
+def test_typed_pages_ignore_key_column():
+    query = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year }'
+    with LocalEndpoint(movies_graph(100)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=40, target_latency=None)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            df = client.execute_query(query, return_format=HttpClientDataFormat.JSON, key_column='movie')
+        assert len(caught) == 1 and 'key_column' in str(caught[0].message)
+        # the typed pages keep the xsd datatypes of their columns
+        assert len(df) == 100 and df['year'].dtype.kind == 'i'
+        assert df.attrs['datatypes']['movie'] == 'uri'
+        assert all('FILTER ( str(?movie)' not in query for query in endpoint.queries)
+        assert client.stats.get('keyset_fallbacks') == 1
+
+
+if __name__ == '__main__':
+    test_is_applicable()
+    test_page_query()
+    test_keyset_pages()
+    test_keyset_pages_repeated_keys()
+    test_typed_pages_ignore_key_column()
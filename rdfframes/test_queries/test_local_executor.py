@@ -0,0 +1,52 @@
+import pandas as pd
+
+from rdfframes.knowledge_graph import KnowledgeGraph
+from rdfframes.query_builder.local_executor import LocalExecutor
+from rdfframes.query_builder.queue2querymodel import Queue2QueryModelConverter
+
+
+def movie_triples():
+    rows = []
+    for i in range(100):
+        movie = 'http://example.org/movie{}'.format(i)
+        rows.append((movie, 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type', 'http://example.org/Movie'))
+        rows.append((movie, 'http://example.org/year', 1950 + i % 10))
+        rows.append((movie, 'http://example.org/country', 'http://example.org/country{}'.format(i % 3)))
+        if i % 2 == 0:
+            rows.append((movie, 'http://example.org/director', 'http://example.org/director{}'.format(i % 5)))
+    return pd.DataFrame(rows, columns=['subject', 'predicate', 'object'])
+
+
+def movies():
+    graph = KnowledgeGraph('movies', 'http://example.org/g', prefixes={'ex': 'http://example.org/'})
+    return graph.entities('ex:Movie', entities_col_name='movie')\
+        .expand('movie', [('ex:year', 'year'), ('ex:country', 'country')])
+
+
+def execute(dataset):
+    query_model = Queue2QueryModelConverter(dataset).to_query_model()
+    return LocalExecutor(movie_triples()).execute(query_model)
+
+
+def test_local_executor():
+    df = execute(movies())
+    assert df.shape == (100, 3)
+
+    df = execute(movies().filter({'year': ['>= 1955'], 'country': ['= ex:country1']}))
+    assert len(df) == 16 and (df['year'] >= 1955).all()
+
+    df = execute(movies().expand('movie', [('ex:director', 'director', True)]))
+    assert len(df) == 100 and df['director'].isna().sum() == 50
+
+    df = execute(movies().group_by(['country']).count('movie', 'movie_count').filter({'movie_count': ['> 33']}))
+    assert sorted(df['movie_count']) == [34]
+
+    df = execute(movies().sort({'year': 'DESC'}).limit(5).select_cols(['year']))
+    assert list(df['year']) == [1959, 1958, 1957, 1956, 1955]
+
+    df = execute(movies().count('movie', 'movie_count'))
+    assert df['movie_count'][0] == 100
+
+
+if __name__ == '__main__':
+    test_local_executor()
@@ -0,0 +1,47 @@
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.dataset import materialization
+from rdfframes.knowledge_graph import KnowledgeGraph
+from local_endpoint import LocalEndpoint, movies_graph
+
+graph = KnowledgeGraph(prefixes={'ex': 'http://example.org/'})
+
+
+def expand(client):
+    movies = graph.feature_domain_range('ex:country', domain_col_name='movie', range_col_name='country').cache()
+    movies.execute(client, return_format=HttpClientDataFormat.PANDAS_DF)
+    return movies.expand('movie', [('ex:year', 'year')])\
+        .execute(client, return_format=HttpClientDataFormat.PANDAS_DF)
+
+
+def first_pages(endpoint):
+    return [query for query in endpoint.queries if 'OFFSET 0 ' in query]
+
+
+def test_expand_materialized():
+    with LocalEndpoint(movies_graph(300)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, target_latency=None)
+        df = expand(client)
+        assert len(df) == 300 and sorted(df.columns) == ['country', 'movie', 'year']
+        # the expansion binds the materialized movies in a VALUES clause
+        queries = first_pages(endpoint)
+        assert len(queries) == 2 and 'VALUES' in queries[1]
+
+
+def test_expand_materialized_many_values():
+    batches = materialization._VALUES_MAX_BATCHES
+    # 300 movies need more VALUES batches than allowed, the full query is sent instead
+    materialization._VALUES_MAX_BATCHES = 0
+    try:
+        with LocalEndpoint(movies_graph(300)) as endpoint:
+            client = HttpClient(endpoint.url, port=endpoint.port, target_latency=None)
+            df = expand(client)
+            assert len(df) == 300 and sorted(df.columns) == ['country', 'movie', 'year']
+            queries = first_pages(endpoint)
+            assert len(queries) == 2 and 'VALUES' not in queries[1]
+    finally:
+        materialization._VALUES_MAX_BATCHES = batches
+
+
+if __name__ == '__main__':
+    test_expand_materialized()
+    test_expand_materialized_many_values()
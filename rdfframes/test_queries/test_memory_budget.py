@@ -0,0 +1,49 @@
+import pandas as pd
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.memory_budget import MemoryBudget
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?country WHERE { ?movie <http://example.org/country> ?country }'
+
+
+def test_memory_budget():
+    page = pd.DataFrame({'movie': ['http://example.org/movie{}'.format(i) for i in range(100)]})
+    size = MemoryBudget.size_of(page)
+    budget = MemoryBudget(2 * size)
+
+    assert budget.admit(block=False)
+    budget.hold(page)
+    assert budget.held_bytes == size
+    other = page.copy()
+    assert budget.admit(block=False)
+    budget.hold(other)
+    # two pages are held, a third one doesn't fit
+    assert not budget.admit(block=False)
+    assert budget.release(page) == size
+    assert budget.admit(block=False)
+    budget.hold(None)
+    assert budget.release(other) == size and budget.held_bytes == 0
+    assert budget.peak_bytes == 2 * size
+
+
+def test_keyset_memory_budget():
+    with LocalEndpoint(movies_graph(300)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=50, target_latency=None)
+        # the pages yielded by keyset pagination are built from the fetched ones, they must release their bytes
+        result = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF, key_column='movie',
+                                      memory_budget=3000)
+        assert result.shape == (300, 2)
+        result.close()
+        batches = client.iter_batches(QUERY, key_column='movie', memory_budget=3000,
+                                      return_format=HttpClientDataFormat.PANDAS_DF)
+        assert sum(len(batch) for batch in batches) == 300
+        # every page has the same key, the rows of a key are fetched before they are released
+        batches = client.iter_batches(QUERY, key_column='country', memory_budget=3000,
+                                      return_format=HttpClientDataFormat.PANDAS_DF)
+        assert sum(len(batch) for batch in batches) == 300
+
+
+if __name__ == '__main__':
+    test_memory_budget()
+    test_keyset_memory_budget()
@@ -0,0 +1,45 @@
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.page_sizer import AdaptivePageSizer
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year }'
+
+
+def test_adaptive_page_sizer():
+    sizer = AdaptivePageSizer(1000, 8000, min_size=100, target_latency=2.0)
+    sizer.record_page(1000, 1000, 0.5)
+    assert sizer.next_size() == 2000
+    sizer.record_page(2000, 2000, 4.0)
+    assert sizer.next_size() == 1000
+    assert sizer.next_size(remaining=300) == 300
+    assert sizer.shrink() and sizer.next_size() == 500
+
+    # a short page followed by rows was truncated by the endpoint
+    sizer.record_page(500, 200, 0.1)
+    sizer.record_page(500, 200, 0.1)
+    assert sizer.server_cap == 200 and sizer.next_size() == 200
+
+    sizer = AdaptivePageSizer(500, 500, adaptive=False)
+    sizer.record_page(500, 200, 0.1, detect_cap=False)
+    sizer.record_page(500, 300, 0.1, detect_cap=False)
+    assert sizer.server_cap is None and sizer.next_size() == 500
+
+
+def test_server_cap():
+    with LocalEndpoint(movies_graph(300), cap=40) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=100, target_latency=None)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF)
+        assert len(df) == 300 and df['movie'].is_unique
+        assert client.server_cap == 40
+
+    with LocalEndpoint(movies_graph(300)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=50, target_latency=None)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF, key_column='movie')
+        assert len(df) == 300 and df['movie'].is_unique
+        # the keyset pages fetch the rows of their last key again, their short pages are not a cap
+        assert client.server_cap is None
+
+
+if __name__ == '__main__':
+    test_adaptive_page_sizer()
+    test_server_cap()
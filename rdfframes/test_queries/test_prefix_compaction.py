@@ -0,0 +1,31 @@
+import pandas as pd
+
+from rdfframes.dataset.prefix_compaction import PrefixCompactor, expand_uris, NO_NAMESPACE
+from rdfframes.knowledge_graph import KnowledgeGraph
+
+
+def test_prefix_compaction():
+    graph = KnowledgeGraph(graph_name='dbpedia', graph_uri='http://dbpedia.org',
+                           prefixes={'dbpr': 'http://dbpedia.org/resource/', 'dbp': 'http://dbpedia.org/',
+                                     'dbpo': 'http://dbpedia.org/ontology/'})
+    compactor = PrefixCompactor.of_graph(graph)
+    df = pd.DataFrame({'entity': ['http://dbpedia.org/resource/Paris', 'http://dbpedia.org/ontology/City',
+                                  'http://example.org/x', None, 'http://dbpedia.org/page'],
+                       'population': [2100000, 0, 1, 2, 3]})
+    compacted = compactor.compact(df)
+    assert list(compacted.columns) == ['entity_ns', 'entity', 'population']
+    namespaces = compacted.attrs['namespaces']
+    assert namespaces[compacted['entity_ns'][0]] == 'http://dbpedia.org/resource/'
+    assert namespaces[compacted['entity_ns'][4]] == 'http://dbpedia.org/'
+    assert list(compacted['entity'][:3]) == ['Paris', 'City', 'http://example.org/x']
+    assert compacted['entity_ns'][2] == NO_NAMESPACE and pd.isna(compacted['entity'][3])
+
+    expanded = expand_uris(compacted)
+    assert list(expanded.columns) == ['entity', 'population']
+    assert list(expanded['entity'].astype(object)[:3]) == list(df['entity'][:3])
+    assert pd.isna(expanded['entity'][3]) and expanded['entity'][4] == 'http://dbpedia.org/page'
+    assert 'compacted' not in expanded.attrs
+
+
+if __name__ == '__main__':
+    test_prefix_compaction()
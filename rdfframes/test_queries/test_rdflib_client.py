@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+from rdfframes.client.http_client import HttpClientDataFormat
+from rdfframes.client.rdflib_client import RDFLibClient
+from rdfframes.knowledge_graph import KnowledgeGraph
+
+MOVIES = """
+@prefix ex: <http://example.org/> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+ex:m1 a ex:Movie ; ex:year 1999 ; ex:country ex:USA ; rdfs:label "The Matrix"@en .
+ex:m2 a ex:Movie ; ex:year 2001 ; ex:country ex:France ; rdfs:label "Amelie"@en .
+ex:m3 a ex:Movie ; ex:year 2001 ; rdfs:label "Spirited Away"@en .
+"""
+
+
+def movies():
+    graph = KnowledgeGraph(graph_name='movies', graph_uri='http://example.org/movies',
+                           prefixes={'ex': 'http://example.org/', 'rdfs': 'http://www.w3.org/2000/01/rdf-schema#'})
+    return graph.entities('ex:Movie', entities_col_name='movie')\
+        .expand('movie', [('ex:year', 'year'), ('ex:country', 'country', True), ('rdfs:label', 'label')])
+
+
+def test_rdflib_client():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'movies.ttl')
+    with open(path, 'w') as f:
+        f.write(MOVIES)
+    client = RDFLibClient(path)
+
+    df = movies().execute(client, return_format=HttpClientDataFormat.PANDAS_DF)
+    assert sorted(df.columns) == ['country', 'label', 'movie', 'year']
+    assert len(df) == 3 and df['country'].isna().sum() == 1
+
+    df = movies().filter({'year': ['>= 2000']}).execute(client, return_format=HttpClientDataFormat.JSON)
+    assert sorted(df['label']) == ['Amelie', 'Spirited Away']
+    assert df['year'].dtype == 'int64' and df.attrs['datatypes']['movie'] == 'uri'
+    assert df.attrs['languages']['label'] == 'en'
+
+    counts = movies().group_by(['year']).count('movie', 'movies').execute(client, return_format='JSON')
+    assert dict(zip(counts['year'], counts['movies'])) == {1999: 1, 2001: 2}
+
+    named = RDFLibClient([path], graph_uri='http://example.org/movies')
+    assert len(movies().execute(named)) == 3
+
+
+if __name__ == '__main__':
+    test_rdflib_client()
@@ -0,0 +1,63 @@
+import time
+
+from rdfframes.client.http_client import HttpClientDataFormat
+from rdfframes.client.replica_http_client import ReplicaHttpClient
+from rdfframes.client.replica_pool import ReplicaPool
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year } ORDER BY ?movie'
+
+
+def test_replica_pool():
+    # urls without a port are not health checked
+    pool = ReplicaPool(['http://a/sparql', 'http://b/sparql'], max_failures=2, ejection_time=0.2, slow_factor=3)
+    first, second = pool.acquire(), pool.acquire()
+    # the replica with the fewest requests in flight is chosen
+    assert {first, second} == {'http://a/sparql', 'http://b/sparql'}
+    pool.release(first, 0.1, True)
+    assert pool.acquire() == first
+    pool.release(first, 0.1, True)
+
+    pool.release(second, 0.1, False)
+    assert pool.active_count() == 2
+    pool.acquire()
+    pool.acquire()
+    pool.release(second, 0.1, False)
+    # two failures in a row eject the replica until the ejection time is over
+    assert pool.active_count() == 1 and all(pool.acquire() == first for _ in range(3))
+    time.sleep(0.25)
+    assert pool.active_count() == 2
+
+    pool = ReplicaPool(['http://a/sparql', 'http://b/sparql'], slow_factor=3)
+    pool.release(pool.acquire(), 0.1, True)
+    slow = pool.acquire()
+    pool.release(slow, 1.0, True)
+    # a replica much slower than the others is ejected
+    assert pool.active_count() == 1 and pool.acquire() != slow
+
+
+def test_replica_http_client():
+    with LocalEndpoint(movies_graph(300), delay=0.02) as first, \
+            LocalEndpoint(movies_graph(300), delay=0.02, fail_once='year') as second:
+        client = ReplicaHttpClient([first.url, second.url], max_rows=30, target_latency=None)
+        client.set_retry_policy(2, base_delay=0.01, max_delay=0.05)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF)
+        assert len(df) == 300 and list(df['movie']) == sorted(df['movie'])
+        # the pages were spread over the replicas and the failed ones were fetched again
+        assert len(first.queries) > 0 and len(second.queries) > 0 and client.stats['page_retries'] > 0
+
+
+def test_dead_replica():
+    dead = LocalEndpoint(movies_graph(1)).start()
+    dead.stop()
+    with LocalEndpoint(movies_graph(100)) as endpoint:
+        client = ReplicaHttpClient([dead.url, endpoint.url], max_rows=20, target_latency=None)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF)
+        # the replica refusing connections fails its health check and gets no page
+        assert len(df) == 100 and client.replica_pool.active_count() == 1
+
+
+if __name__ == '__main__':
+    test_replica_pool()
+    test_replica_http_client()
+    test_dead_replica()
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from rdfframes.client.result_cache import ResultCache, ORPHAN_AGE, INDEX_FILE
+
+QUERY = 'SELECT ?movie FROM <http://example.org/movies> WHERE { ?movie ?p ?o }'
+
+
+def result(rows):
+    return pd.DataFrame({'movie': ['http://example.org/movie{}'.format(i) for i in range(rows)]})
+
+
+def test_result_cache():
+    directory = tempfile.mkdtemp()
+    cache = ResultCache(directory, ttl=60)
+    assert ResultCache.key('SELECT  ?movie\n WHERE {?movie ?p "a  b"} ;', 'e') == \
+        ResultCache.key('SELECT ?movie WHERE {?movie ?p "a  b"}', 'e')
+    assert ResultCache.key(QUERY, 'e') != ResultCache.key(QUERY, 'e', '', 'JSON')
+
+    df = result(3)
+    df.attrs['datatypes'] = {'movie': 'uri'}
+    cache.put('a', df, query=QUERY)
+    cached = cache.get('a')
+    assert list(cached['movie']) == list(df['movie']) and cached.attrs['datatypes'] == {'movie': 'uri'}
+    assert cache.get('missing') is None
+
+    cache.put('expired', result(3), ttl=0)
+    assert 'expired' not in cache and cache.get('expired') is None
+    assert cache.invalidate(graph='http://example.org/movies') == 1 and len(cache) == 0
+
+
+def test_result_cache_eviction():
+    directory = tempfile.mkdtemp()
+    cache = ResultCache(directory)
+    cache.put('a', result(100))
+    entry_size = cache.size()
+    cache = ResultCache(directory, max_bytes=int(2.5 * entry_size))
+    cache.put('b', result(100))
+    time.sleep(0.01)
+    # a is used more recently than b, b is evicted first
+    assert cache.get('a') is not None
+    cache.put('c', result(100))
+    assert 'a' in cache and 'b' not in cache and 'c' in cache
+    assert sorted(name for name in os.listdir(directory) if name.endswith('.feather')) == ['a.feather', 'c.feather']
+
+
+def test_result_cache_hits():
+    directory = tempfile.mkdtemp()
+    cache = ResultCache(directory)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, result(10))
+    index = os.stat(os.path.join(directory, INDEX_FILE))
+    # the hits don't write the index, nor look at the files of the other entries
+    os.remove(os.path.join(directory, 'b.feather'))
+    for _ in range(20):
+        assert cache.get('a') is not None
+    assert os.stat(os.path.join(directory, INDEX_FILE)).st_ino == index.st_ino
+    assert 'b' not in cache and cache.get('b') is None
+    assert os.stat(os.path.join(directory, INDEX_FILE)).st_ino != index.st_ino
+
+    # the last use of a is written with the next result, and the missing file's entry is dropped when it is swept
+    os.remove(os.path.join(directory, 'c.feather'))
+    cache.put('d', result(10))
+    shared = ResultCache(directory)
+    assert len(shared) == 2 and 'a' in shared and 'c' not in shared
+    entries = json.load(open(os.path.join(directory, INDEX_FILE)))
+    assert sorted(entries) == ['a', 'd'] and entries['a']['last_access'] > entries['a']['created']
+
+
+def test_shared_result_cache():
+    directory = tempfile.mkdtemp()
+    caches = [ResultCache(directory), ResultCache(directory)]
+    # the caches of two processes don't overwrite each other's entries
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda i: caches[i % 2].put('key{}'.format(i), result(5)), range(20)))
+    assert len(caches[0]) == 20 and len(caches[1]) == 20
+    assert caches[1].get('key0') is not None
+    caches[0].invalidate()
+    assert caches[1].get('key1') is None
+
+    # a result file the index doesn't list and an old temporary file are removed, a recent one is kept
+    for name in ('orphan.feather', '.old.part', '.recent.part'):
+        open(os.path.join(directory, name), 'w').close()
+    old = time.time() - 2 * ORPHAN_AGE
+    os.utime(os.path.join(directory, '.old.part'), (old, old))
+    ResultCache(directory)
+    assert not os.path.exists(os.path.join(directory, 'orphan.feather'))
+    assert not os.path.exists(os.path.join(directory, '.old.part'))
+    assert os.path.exists(os.path.join(directory, '.recent.part'))
+
+
+if __name__ == '__main__':
+    test_result_cache()
+    test_result_cache_eviction()
+    test_result_cache_hits()
+    test_shared_result_cache()
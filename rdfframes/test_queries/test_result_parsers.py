@@ -0,0 +1,70 @@
+import json
+
+import pandas as pd
+
+from rdfframes.client.result_parsers import SparqlJsonParser, SparqlTsvParser, concat_batches
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+
+def json_document(rows):
+    bindings = []
+    for i in range(rows):
+        binding = {'movie': {'type': 'uri', 'value': 'http://example.org/movie{}'.format(i)},
+                   'year': {'type': 'literal', 'value': str(1950 + i), 'datatype': XSD + 'integer'},
+                   'title': {'type': 'literal', 'value': 'Movie "{}"\n'.format(i), 'xml:lang': 'en'}}
+        if i % 2 == 0:
+            binding['rating'] = {'type': 'literal', 'value': '{}.5'.format(i), 'datatype': XSD + 'double'}
+        bindings.append(binding)
+    return json.dumps({'head': {'vars': ['movie', 'year', 'title', 'rating']}, 'results': {'bindings': bindings}})
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def check_movies(df, rows):
+    assert list(df.columns) == ['movie', 'year', 'title', 'rating'] and len(df) == rows
+    assert df['year'].dtype.kind == 'i' and list(df['year'][:2]) == [1950, 1951]
+    assert df['rating'].dtype.kind == 'f' and df['rating'].isna().sum() == rows // 2
+    assert df['title'][1] == 'Movie "1"\n'
+    assert df.attrs['datatypes']['year'] == XSD + 'integer' and df.attrs['languages'] == {'title': 'en'}
+
+
+def test_json_parser():
+    parser = SparqlJsonParser(batch_rows=10)
+    batches = []
+    emitted_before_close = 0
+    for chunk in chunks(json_document(25), 37):
+        batches += parser.feed(chunk)
+        emitted_before_close = len(batches)
+    batches += parser.close()
+    # the batches are emitted as the text arrives, not once the document is complete
+    assert [len(batch) for batch in batches] == [10, 10, 5] and emitted_before_close >= 2
+    check_movies(concat_batches(batches), 25)
+
+
+def test_tsv_parser():
+    lines = ['?movie\t?year\t?title\t?rating']
+    for i in range(25):
+        rating = '"{}.5"^^<{}double>'.format(i, XSD) if i % 2 == 0 else ''
+        lines.append('<http://example.org/movie{}>\t{}\t"Movie \\"{}\\"\\n"@en\t{}'.format(i, 1950 + i, i, rating))
+    parser = SparqlTsvParser(batch_rows=10)
+    batches = list(parser.parse(chunks('\n'.join(lines) + '\n', 29)))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    check_movies(concat_batches(batches), 25)
+
+
+def test_concat_batches():
+    first = pd.DataFrame({'a': [1], 'b': ['x']})
+    first.attrs = {'datatypes': {'a': XSD + 'int', 'b': XSD + 'string'}, 'languages': {}}
+    second = pd.DataFrame({'a': [2], 'b': ['y']})
+    second.attrs = {'datatypes': {'a': XSD + 'int'}, 'languages': {}}
+    # only the datatypes all the batches agree on are kept
+    assert concat_batches([first, second]).attrs['datatypes'] == {'a': XSD + 'int'}
+
+
+if __name__ == '__main__':
+    test_json_parser()
+    test_tsv_parser()
+    test_concat_batches()
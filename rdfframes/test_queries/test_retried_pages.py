@@ -0,0 +1,49 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from rdfframes.client.async_http_client import AsyncHttpClient
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from local_endpoint import LocalEndpoint, movies_graph
+
+# the pages of the first query fail once, the pages of the second one don't
+FAILING_QUERY = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year }'
+QUERY = 'SELECT ?movie ?country WHERE { ?movie <http://example.org/country> ?country }'
+
+
+def check_results(failing, other):
+    assert len(failing) == 300 and len(other) == 300
+    offsets = [page['offset'] for page in failing.attrs['retried_pages']]
+    assert sorted(offsets) == list(range(0, 301, 50))
+    assert 'retried_pages' not in other.attrs
+
+
+def test_retried_pages():
+    with LocalEndpoint(movies_graph(300), delay=0.02, fail_once='year') as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=50, target_latency=None)
+        client.set_retry_policy(3, base_delay=0.01, max_delay=0.05)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(client.execute_query, query, return_format=HttpClientDataFormat.PANDAS_DF)
+                       for query in (FAILING_QUERY, QUERY)]
+            failing, other = [future.result() for future in futures]
+        check_results(failing, other)
+
+
+def test_async_retried_pages():
+    async def execute(client):
+        try:
+            return await asyncio.gather(*[client.execute_query(query, return_format=HttpClientDataFormat.PANDAS_DF)
+                                          for query in (FAILING_QUERY, QUERY)])
+        finally:
+            await client.close()
+
+    with LocalEndpoint(movies_graph(300), delay=0.02, fail_once='year') as endpoint:
+        client = AsyncHttpClient(endpoint.url, port=endpoint.port, max_rows=50)
+        client.set_target_latency(None)
+        client.set_retry_policy(3, base_delay=0.01, max_delay=0.05)
+        failing, other = asyncio.run(execute(client))
+        check_results(failing, other)
+
+
+if __name__ == '__main__':
+    test_retried_pages()
+    test_async_retried_pages()
@@ -0,0 +1,136 @@
+import threading
+import time
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.retry_policy import RetryPolicy, CircuitBreaker, TransientError
+from rdfframes.client.sparql_endpoint_client import SPARQLEndpointClient
+from local_endpoint import LocalEndpoint, movies_graph
+
+QUERY = 'SELECT ?movie ?year WHERE { ?movie <http://example.org/year> ?year }'
+
+
+def raises(function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+    except Exception:
+        return True
+    return False
+
+
+def test_retry_policy():
+    policy = RetryPolicy(3, base_delay=1, max_delay=5)
+    assert all(0 <= policy.delay(1) <= 1 for _ in range(20))
+    assert all(0 <= policy.delay(10) <= 5 for _ in range(20))
+    # the endpoint's Retry-After is honoured up to max_delay
+    assert policy.delay(1, retry_after=3) >= 3 and policy.delay(1, retry_after=60) <= 5
+    assert RetryPolicy.retry_after({'Retry-After': '2'}) == 2
+    assert RetryPolicy.retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) is None
+    assert RetryPolicy.is_retryable_status(503) and not RetryPolicy.is_retryable_status(400)
+    assert RetryPolicy(-1).max_retries == 0
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.wait_time() == 0
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.wait_time() > 0
+    assert raises(breaker.before_request)
+    time.sleep(0.15)
+    # after the cooldown one request is let through, its failure opens the circuit again
+    assert breaker.wait_time() == 0 and breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.15)
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+    assert CircuitBreaker.for_endpoint('http://host:1/sparql') is CircuitBreaker.for_endpoint('http://host:1/other')
+    assert CircuitBreaker.for_endpoint('http://host:1/sparql') is not CircuitBreaker.for_endpoint('http://host:2/')
+
+
+def test_half_open_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    # a single request probes the endpoint, the others wait until it resolves
+    assert breaker.admit() == (0, True)
+    wait, probe = breaker.admit()
+    assert wait > 0 and not probe
+    breaker.record_success()
+    assert breaker.admit() == (0, False)
+
+    breaker.record_failure()
+    time.sleep(0.15)
+    sent = []
+
+    def attempt():
+        sent.append(time.time())
+        time.sleep(0.3)
+        return len(sent)
+    policy = RetryPolicy(0)
+    threads = [threading.Thread(target=policy.call, args=(attempt, breaker, 0)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # the other requests were sent after the probe succeeded
+    assert len(sent) == 4 and all(t - sent[0] >= 0.25 for t in sent[1:])
+
+
+def test_retry_call():
+    failures = [TransientError('busy', overloaded=True), TransientError('busy', retry_after=0.01)]
+    retried = []
+
+    def attempt():
+        if failures:
+            raise failures.pop(0)
+        return 'page'
+    retries = []
+    policy = RetryPolicy(2, base_delay=0.01, max_delay=0.05)
+    assert policy.call(attempt, CircuitBreaker(), 10, retries, on_retry=retried.append) == 'page'
+    assert retries == [{'offset': 10, 'attempts': 3, 'error': 'busy'}] and len(retried) == 2
+
+    def failing():
+        raise TransientError('busy')
+    assert raises(RetryPolicy(1, base_delay=0.01).call, failing, CircuitBreaker(), 0)
+
+
+def test_retried_requests():
+    with LocalEndpoint(movies_graph(100), fail_once='year') as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=100, target_latency=None)
+        client.set_retry_policy(2, base_delay=0.01, max_delay=0.05)
+        df = client.execute_query(QUERY, return_format=HttpClientDataFormat.PANDAS_DF)
+        assert len(df) == 100 and client.stats['page_retries'] >= 1
+        assert client._breaker().state == CircuitBreaker.CLOSED
+
+    with LocalEndpoint(movies_graph(100), fail_once='year') as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=100, target_latency=None)
+        client.set_retry_policy(0)
+        assert raises(client.execute_query, QUERY, return_format=HttpClientDataFormat.PANDAS_DF)
+
+    # an invalid query is not retried
+    with LocalEndpoint(movies_graph(1)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, target_latency=None)
+        client.set_retry_policy(3, base_delay=0.01, max_delay=0.05)
+        assert raises(client.execute_query, 'SELECT ?movie WHERE {', return_format=HttpClientDataFormat.PANDAS_DF)
+        assert len(endpoint.queries) == 1
+
+
+
+def test_sparql_endpoint_client_retries():
+    with LocalEndpoint(movies_graph(30), fail_once='year') as endpoint:
+        client = SPARQLEndpointClient(endpoint.url)
+        client.retry_policy = RetryPolicy(2, base_delay=0.01, max_delay=0.05)
+        df = client.execute_query(QUERY, limit=10)
+        assert len(df) == 30 and [page['offset'] for page in df.attrs['retried_pages']] == [0, 10, 20, 30]
+
+
+if __name__ == '__main__':
+    test_retry_policy()
+    test_circuit_breaker()
+    test_half_open_probe()
+    test_retry_call()
+    test_retried_requests()
+    test_sparql_endpoint_client_retries()
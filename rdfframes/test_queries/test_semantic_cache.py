@@ -0,0 +1,40 @@
+import tempfile
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.result_cache import ResultCache
+from rdfframes.knowledge_graph import KnowledgeGraph
+from local_endpoint import LocalEndpoint, movies_graph
+
+graph = KnowledgeGraph(prefixes={'ex': 'http://example.org/'})
+
+
+def refine(return_format):
+    """
+    :return: (the refined result, the number of queries sent for it)
+    """
+    with LocalEndpoint(movies_graph(140)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, target_latency=None)
+        client.set_cache(ResultCache(tempfile.mkdtemp()))
+        movies = graph.feature_domain_range('ex:year', domain_col_name='movie', range_col_name='year')
+        movies.execute(client, return_format=return_format)
+        sent = len(endpoint.queries)
+        df = movies.filter({'year': ['>= 2015']}).sort({'movie': 'ASC'})\
+            .execute(client, return_format=return_format)
+        return df, len(endpoint.queries) - sent
+
+
+def test_semantic_cache_typed():
+    df, sent = refine(HttpClientDataFormat.JSON)
+    # the filter is evaluated on the cached result
+    assert sent == 0 and len(df) == 10 and list(df['movie']) == sorted(df['movie'])
+
+
+def test_semantic_cache_untyped():
+    # a result parsed from CSV doesn't tell a number from a string, the refined query is sent to the endpoint
+    df, sent = refine(HttpClientDataFormat.PANDAS_DF)
+    assert sent > 0 and len(df) == 10
+
+
+if __name__ == '__main__':
+    test_semantic_cache_typed()
+    test_semantic_cache_untyped()
@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+from rdfframes.client.spill import SpillWriter
+
+
+def test_spill():
+    writer = SpillWriter()
+    writer.write_frame(pd.DataFrame({'movie': ['http://example.org/movie0', 'http://example.org/movie1'],
+                                     'year': [1950, 1951]}))
+    writer.write_frame(pd.DataFrame({'movie': ['http://example.org/movie2'], 'year': ['unknown']}))
+    result = writer.close()
+    assert len(result.paths) == 2 and result.shape == (3, 2)
+    assert list(result['year']) == ['1950', '1951', 'unknown']
+    assert list(result[1:3]['movie']) == ['http://example.org/movie1', 'http://example.org/movie2']
+    assert [len(chunk) for chunk in result.iter_chunks(2)] == [2, 1]
+    directory = os.path.dirname(result.paths[0])
+    result.close()
+    assert not os.path.exists(directory)
+
+
+if __name__ == '__main__':
+    test_spill()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.text_stream import TextChunkReader
+from local_endpoint import LocalEndpoint, movies_graph
+
+
+def test_text_chunk_reader():
+    received = []
+
+    def chunks():
+        for chunk in ['movie,ye', 'ar\nmovie0,1950\nmo', 'vie1,1951\n', 'movie2,1952']:
+            received.append(chunk)
+            yield chunk
+    reader = TextChunkReader(chunks())
+    assert reader.readline() == 'movie,year\n'
+    # only the chunks needed so far were pulled from the stream
+    assert len(received) == 2
+    assert reader.read(4) == 'movi' and reader.read(10) == 'e0,1950\nmo'
+    assert list(reader) == ['vie1,1951\n', 'movie2,1952'] and reader.read() == ''
+
+    df = pd.read_csv(TextChunkReader(['movie,year\nmovie0,', '1950\n"a\nb",1951\n']))
+    assert list(df['year']) == [1950, 1951] and df['movie'][1] == 'a\nb'
+
+
+def test_stream_to_file():
+    query = 'SELECT ?movie ?title WHERE { ?movie <http://example.org/title> ?title } ORDER BY ?movie'
+    path = os.path.join(tempfile.mkdtemp(), 'movies.csv')
+    with LocalEndpoint(movies_graph(90, multiline=True)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=20, target_latency=None)
+        client.execute_query(query, return_format=HttpClientDataFormat.CSV, output_file=path)
+    # the pages are copied to the file as they are received, with one header
+    df = pd.read_csv(path)
+    assert len(df) == 90 and list(df['movie']) == sorted(df['movie'])
+    assert df['title'][0] == 'Movie 0\nthe "sequel"\npart 0'
+
+
+if __name__ == '__main__':
+    test_text_chunk_reader()
+    test_stream_to_file()
@@ -0,0 +1,65 @@
+import pandas as pd
+
+from rdfframes.client.http_client import HttpClient, HttpClientDataFormat
+from rdfframes.client.vocabulary import Vocabulary, align_categories
+from local_endpoint import LocalEndpoint, movies_graph
+
+
+def page(movies, countries):
+    df = pd.DataFrame({'movie': ['http://example.org/movie{}'.format(i) for i in movies],
+                       'country': ['http://dbpedia.org/resource/{}'.format(c) if c else None for c in countries],
+                       'title': ['Movie {}'.format(i) for i in movies]})
+    df.attrs['datatypes'] = {'movie': 'uri'}
+    return df
+
+
+def test_vocabulary():
+    vocabulary = Vocabulary()
+    first = vocabulary.encode_frame(page([0, 1], ['USA', 'France']))
+    second = vocabulary.encode_frame(page([2, 3], ['USA', None]))
+    assert isinstance(first['movie'].dtype, pd.CategoricalDtype)
+    assert isinstance(first['country'].dtype, pd.CategoricalDtype)
+    assert not isinstance(first['title'].dtype, pd.CategoricalDtype)
+    assert first['country'].cat.codes[0] == second['country'].cat.codes[0]
+
+    df = pd.concat([vocabulary.align(first), vocabulary.align(second)], ignore_index=True)
+    assert df['movie'].dtype == vocabulary.dtype('movie')
+    # every column has the categories of its own values
+    assert list(df['country'].cat.categories) == ['http://dbpedia.org/resource/USA',
+                                                  'http://dbpedia.org/resource/France']
+    countries = Vocabulary.decode(df)['country']
+    assert list(countries[1:3]) == ['http://dbpedia.org/resource/France', 'http://dbpedia.org/resource/USA']
+    assert pd.isna(countries[3])
+    assert df.attrs['datatypes'] == {'movie': 'uri'}
+
+    # a result encoded with another vocabulary is given common categories when it is joined
+    titles = Vocabulary().encode_frame(page([3, 1, 7], ['France', 'France', 'Spain']), Vocabulary.TERMS)
+    assert isinstance(titles['title'].dtype, pd.CategoricalDtype)
+    left, right = align_categories(first, titles, ['movie', 'country'])
+    assert left['movie'].dtype == right['movie'].dtype
+    assert left['movie'].cat.categories[:2].equals(first['movie'].cat.categories)
+    assert list(left['movie'].cat.codes) == list(first['movie'].cat.codes)
+    joined = left.merge(right, on=['movie', 'country'])
+    assert len(joined) == 1 and isinstance(joined['movie'].dtype, pd.CategoricalDtype)
+
+
+def test_result_vocabulary():
+    query = 'SELECT ?movie ?country WHERE { ?movie <http://example.org/country> ?country }'
+    with LocalEndpoint(movies_graph(50)) as endpoint:
+        client = HttpClient(endpoint.url, port=endpoint.port, max_rows=20, target_latency=None)
+        df = client.execute_query(query, return_format=HttpClientDataFormat.PANDAS_DF, categorical=Vocabulary.URIS)
+        assert len(df) == 50 and isinstance(df['movie'].dtype, pd.CategoricalDtype)
+        assert sorted(df['movie'].cat.categories) == sorted(df['movie'].astype(str).unique())
+        assert sorted(df['country'].cat.categories) == sorted(df['country'].astype(str).unique())
+        # the categories of a result are not carried into the next one
+        small = client.execute_query(query + ' LIMIT 5', return_format=HttpClientDataFormat.PANDAS_DF,
+                                     categorical=Vocabulary.URIS)
+        assert len(small['movie'].cat.categories) == 5
+        batches = list(client.iter_batches(query, batch_rows=20, return_format=HttpClientDataFormat.PANDAS_DF,
+                                           categorical=Vocabulary.URIS))
+        assert [len(batch['movie'].cat.categories) for batch in batches] == [20, 20, 10]
+
+
+if __name__ == '__main__':
+    test_vocabulary()
+    test_result_vocabulary()
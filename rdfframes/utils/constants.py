@@ -3,6 +3,28 @@ __author__ = "Abdurrahman Ghanem <abghanem@hbku.edu.qa>"
 
 _TIMEOUT = 1000  # timeout in seconds for one query
 _MAX_ROWS = 1000000  # maximum number of rows returned in the result set
+_POOL_SIZE = 10  # maximum number of keep-alive connections kept open per endpoint
+_HEALTH_CHECK_TTL = 60  # seconds an endpoint liveness check result is reused before checking again
+_MAX_CONCURRENCY = 100  # maximum number of http requests in flight for one asynchronous client
+_CHUNK_SIZE = 64 * 1024  # number of bytes read from an http response at a time
+_SPOOL_SIZE = 8 * 1024 * 1024  # bytes of a page kept in memory before it is spooled to a temporary file
+_INITIAL_PAGE_SIZE = 10000  # number of rows requested in the first page of a query
+_SORTED_PAGE_SIZE = 1000  # number of rows requested in the first page of a query with ORDER BY
+_MIN_PAGE_SIZE = 100  # the page size never shrinks below this number of rows
+_TARGET_PAGE_LATENCY = 5  # seconds one page should take. Pages grow while faster and shrink while slower
+_MAX_RETRIES = 5  # number of times a page is fetched again after a transient failure
+_RETRY_BASE_DELAY = 1  # seconds before the first retry of a page. The delay doubles with every retry
+_RETRY_MAX_DELAY = 60  # the longest delay in seconds between two attempts of a page
+_BREAKER_THRESHOLD = 5  # consecutive failures of an endpoint that suspend the requests to it
+_BREAKER_COOLDOWN = 30  # seconds the requests to a failing endpoint are suspended
+_BREAKER_PROBE_WAIT = 0.2  # seconds a request waits before asking again while a half-open circuit is being probed
+_REPLICA_MAX_FAILURES = 3  # consecutive failed requests that eject a replica from the pool
+_REPLICA_EJECTION_TIME = 30  # seconds an ejected replica receives no requests
+_REPLICA_SLOW_FACTOR = 3  # a replica this many times slower than the average of the others is ejected
+_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # maximum total size of the files of a result cache
+_CACHE_TTL = 24 * 60 * 60  # seconds a cached query result is valid by default
+_VALUES_BATCH_SIZE = 500  # number of values bound in the VALUES clause of one query expanding a materialized result
+_VALUES_MAX_BATCHES = 10  # above this number of VALUES queries, an expansion of a materialized result is sent in full
 
 
 class JoinType: